@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import re
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+ADMISSION_TIMEOUT = float(os.environ.get("ADMISSION_TIMEOUT", "10"))
+RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "5"))
+
+
+class OverloadedError(Exception):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.name = name
+
+
+class SingleFlight:
+    def __init__(self):
+        self.flights: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self.flights[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.leaders += 1
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+    
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self.flights.get(key) is task:
+            del self.flights[key]
+        if not task.cancelled():
+            task.exception()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self.flights),
+            "leaders": self.leaders,
+            "coalesced": self.followers,
+        }
+
+
+class AdmissionLimiter:
+    def __init__(self,
+                 name: str,
+                 limit: int,
+                 queue: int,
+                 timeout: float = ADMISSION_TIMEOUT):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiters: "deque[asyncio.Future]" = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+    
+    async def acquire(self):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+        if len(self.waiters) >= self.queue:
+            self.rejected += 1
+            raise OverloadedError(self.name)
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise OverloadedError(self.name)
+            raise
+        self.admitted += 1
+    
+    def release(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "queue": self.queue,
+            "active": self.active,
+            "waiting": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+def _limiter(name: str, prefix: str, limit: int,
+             queue: int) -> AdmissionLimiter:
+    return AdmissionLimiter(
+        name, int(os.environ.get(f"{prefix}_CONCURRENCY", str(limit))),
+        int(os.environ.get(f"{prefix}_QUEUE", str(queue))))
+
+
+limiters: Dict[str, AdmissionLimiter] = {
+    "export_pdf": _limiter("export_pdf", "PDF_EXPORT", 4, 16),
+    "export_csv": _limiter("export_csv", "CSV_EXPORT", 8, 32),
+    "import": _limiter("import", "IMPORT", 2, 8),
+    "batch_settlement": _limiter("batch_settlement", "BATCH", 1, 2),
+    "archive": _limiter("archive", "ARCHIVE", 2, 4),
+}
+
+ADMISSION_RULES: List[Tuple[str, "re.Pattern[str]", AdmissionLimiter]] = [
+    ("GET", re.compile(r"^/session/[^/]+/export/pdf$"), limiters["export_pdf"]),
+    ("GET", re.compile(r"^/session/[^/]+/export/csv$"), limiters["export_csv"]),
+    ("POST", re.compile(r"^/session/[^/]+/expenses/import$"),
+     limiters["import"]),
+    ("POST", re.compile(r"^/settlements/batch$"), limiters["batch_settlement"]),
+    ("POST", re.compile(r"^/sessions/export/archive$"), limiters["archive"]),
+]
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, rules=ADMISSION_RULES):
+        self.app = app
+        self.rules = rules
+    
+    def match(self, method: str, path: str) -> Optional[AdmissionLimiter]:
+        for rule_method, pattern, limiter in self.rules:
+            if rule_method == method and pattern.match(path):
+                return limiter
+        return None
+    
+    async def __call__(self, scope, receive, send):
+        limiter = None
+        if scope["type"] == "http":
+            limiter = self.match(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        
+        try:
+            await limiter.acquire()
+        except OverloadedError:
+            await self.reject(send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+    
+    async def reject(self, send):
+        body = json.dumps(
+            {
+                "detail": "Serwer jest przeciążony, spróbuj za chwilę"
+            },
+            ensure_ascii=False).encode("utf-8")
+        await send({
+            "type":
+            "http.response.start",
+            "status":
+            503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(RETRY_AFTER).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+flights = SingleFlight()
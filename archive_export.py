@@ -0,0 +1,214 @@
+import asyncio
+import csv
+import io
+import os
+import time
+import zipfile
+from collections import deque
+from typing import (Any, AsyncIterator, Awaitable, Callable, Deque, Dict,
+                    Iterable, Iterator, List, Optional, Tuple)
+
+from starlette.concurrency import iterate_in_threadpool
+
+from models import Session
+
+ARCHIVE_PDF_WINDOW = int(os.environ.get("ARCHIVE_PDF_WINDOW", "4"))
+ARCHIVE_COMPRESSLEVEL = int(os.environ.get("ARCHIVE_COMPRESSLEVEL", "6"))
+ARCHIVE_FORMATS = ("csv", "pdf")
+
+
+class ZipSink:
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+    
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+class ArchiveWriter:
+    def __init__(self, compresslevel: int = ARCHIVE_COMPRESSLEVEL):
+        self.sink = ZipSink()
+        self.zip = zipfile.ZipFile(self.sink,
+                                   "w",
+                                   compression=zipfile.ZIP_DEFLATED,
+                                   compresslevel=compresslevel)
+        self.names = set()
+    
+    def _info(self, name: str) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.external_attr = 0o644 << 16
+        return info
+    
+    def _unique(self, name: str) -> str:
+        stem, dot, extension = name.rpartition(".")
+        candidate = name
+        counter = 2
+        while candidate in self.names:
+            candidate = f"{stem}_{counter}{dot}{extension}"
+            counter += 1
+        self.names.add(candidate)
+        return candidate
+    
+    def member(self, name: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        with self.zip.open(self._info(self._unique(name)), "w") as member:
+            for chunk in chunks:
+                member.write(chunk)
+                if self.sink.chunks:
+                    yield self.sink.drain()
+        yield self.sink.drain()
+    
+    def close(self) -> bytes:
+        self.zip.close()
+        return self.sink.drain()
+
+
+def member_name(session: Session, extension: str, suffix: str = "") -> str:
+    name = "".join("_" if c in ' /\\:*?"<>|' else c for c in session.name)
+    return f"rozliczenie_{name}_{session.id[:8]}{suffix}.{extension}"
+
+
+def errors_csv(errors: List[Tuple[str, str]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["session_id", "error"])
+    writer.writerows(errors)
+    return buffer.getvalue().encode("utf-8")
+
+
+class ArchiveExporter:
+    def __init__(self,
+                 pdf_window: int = ARCHIVE_PDF_WINDOW,
+                 compresslevel: int = ARCHIVE_COMPRESSLEVEL):
+        self.pdf_window = max(pdf_window, 1)
+        self.compresslevel = compresslevel
+        self.running = 0
+        self.archives = 0
+        self.sessions = 0
+        self.members = 0
+        self.bytes_sent = 0
+    
+    async def stream(self,
+                     session_ids: Iterable[str],
+                     load: Callable[[str], Awaitable[Optional[Session]]],
+                     csv_content: Optional[Callable[[Session],
+                                                    Awaitable[Iterator[bytes]]]],
+                     render_pdf: Optional[Callable[[Session],
+                                                   Awaitable[bytes]]],
+                     suffix: str = "") -> AsyncIterator[bytes]:
+        writer = ArchiveWriter(self.compresslevel)
+        errors: List[Tuple[str, str]] = []
+        pending: Deque[Tuple[Session, Optional[Iterator[bytes]],
+                             Optional[asyncio.Future]]] = deque()
+        seen = set()
+        self.running += 1
+        self.archives += 1
+        
+        def emit(chunk: bytes) -> bytes:
+            self.bytes_sent += len(chunk)
+            return chunk
+        
+        async def write(name: str,
+                        chunks: Iterable[bytes]) -> AsyncIterator[bytes]:
+            async for chunk in iterate_in_threadpool(writer.member(
+                    name, chunks)):
+                if chunk:
+                    yield emit(chunk)
+        
+        async def members(
+                session: Session, content: Optional[Iterator[bytes]],
+                pdf: Optional[asyncio.Future]) -> AsyncIterator[bytes]:
+            self.sessions += 1
+            if content is not None:
+                self.members += 1
+                try:
+                    async for chunk in write(
+                            member_name(session, "csv", suffix), content):
+                        yield chunk
+                except Exception:
+                    errors.append(
+                        (session.id, "Nie udało się wygenerować CSV "
+                         "(plik w archiwum jest niekompletny)"))
+            if pdf is None:
+                return
+            try:
+                data = await pdf
+            except Exception:
+                errors.append((session.id, "Nie udało się wygenerować PDF"))
+                return
+            self.members += 1
+            async for chunk in write(member_name(session, "pdf", suffix),
+                                     [data]):
+                yield chunk
+        
+        try:
+            for session_id in session_ids:
+                if session_id in seen:
+                    continue
+                seen.add(session_id)
+                try:
+                    session = await load(session_id)
+                except ValueError as e:
+                    errors.append((session_id, str(e)))
+                    continue
+                except Exception:
+                    errors.append(
+                        (session_id, "Nie udało się wczytać sesji"))
+                    continue
+                if session is None:
+                    errors.append(
+                        (session_id, "Sesja nie została znaleziona"))
+                    continue
+                
+                try:
+                    content = (await csv_content(session)
+                               if csv_content is not None else None)
+                except Exception:
+                    content = None
+                    errors.append(
+                        (session_id, "Nie udało się wygenerować CSV"))
+                
+                pdf = (asyncio.ensure_future(render_pdf(session))
+                       if render_pdf is not None else None)
+                pending.append((session, content, pdf))
+                while len(pending) >= self.pdf_window or (
+                        pdf is None and pending):
+                    async for chunk in members(*pending.popleft()):
+                        yield chunk
+            
+            while pending:
+                async for chunk in members(*pending.popleft()):
+                    yield chunk
+            if errors:
+                async for chunk in write("bledy.csv", [errors_csv(errors)]):
+                    yield chunk
+            yield emit(await asyncio.to_thread(writer.close))
+        finally:
+            for _, _, pdf in pending:
+                if pdf is not None:
+                    pdf.cancel()
+            self.running -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pdf_window": self.pdf_window,
+            "running": self.running,
+            "archives": self.archives,
+            "sessions": self.sessions,
+            "members": self.members,
+            "bytes_sent": self.bytes_sent,
+        }
+
+
+archive_exporter = ArchiveExporter()
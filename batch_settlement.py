@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, Iterable,
+                    List, Optional, Tuple, Union)
+
+from codec import SessionColumns, decode_columns, decode_session, encode_session
+from models import Participant, Session, Settlement
+from settlement import (LARGE_GROUP_THRESHOLD, SETTLEMENT_ENGINE,
+                        calculate_settlement, settlement_cache,
+                        settlement_from_balances)
+
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", str(os.cpu_count() or 1)))
+BATCH_CHUNK_SIZE = int(os.environ.get("BATCH_CHUNK_SIZE", "64"))
+
+
+def settlement_line(session: Union[Session, SessionColumns],
+                    settlement: Settlement) -> bytes:
+    record = {
+        "session_id": session.id,
+        "version": session.version,
+        **settlement.model_dump(),
+    }
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def error_line(session_id: str, message: str) -> bytes:
+    record = {"session_id": session_id, "error": message}
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def settle_sessions(sessions: List[Session], engine: Optional[str]) -> bytes:
+    lines = []
+    for session in sessions:
+        try:
+            settlement = calculate_settlement(session, engine=engine)
+        except Exception as e:
+            lines.append(error_line(session.id, str(e)))
+            continue
+        lines.append(settlement_line(session, settlement))
+    return b"".join(lines)
+
+
+def column_balances(columns: SessionColumns) -> Dict[str, int]:
+    balances = [0] * len(columns.participant_ids)
+    beneficiaries = columns.beneficiaries
+    offset = 0
+    for amount, payer, count in zip(columns.amounts, columns.payers,
+                                    columns.beneficiary_counts):
+        amount_per_person, remainder = divmod(amount, count)
+        for beneficiary in beneficiaries[offset:offset + count]:
+            balances[beneficiary] -= amount_per_person
+        for beneficiary in beneficiaries[offset:offset + remainder]:
+            balances[beneficiary] -= 1
+        balances[payer] += amount
+        offset += count
+    return dict(zip(columns.participant_ids, balances))
+
+
+def settle_columns(columns: SessionColumns, data: bytes,
+                   engine: Optional[str]) -> bytes:
+    if (len(columns.participant_ids) >= LARGE_GROUP_THRESHOLD
+            and (engine or SETTLEMENT_ENGINE) == "greedy"):
+        session = decode_session(data)
+        return settlement_line(session,
+                               calculate_settlement(session, engine=engine))
+    
+    participants = [
+        Participant.model_construct(id=pid, name=name) for pid, name in zip(
+            columns.participant_ids, columns.participant_names)
+    ]
+    settlement = settlement_from_balances(column_balances(columns),
+                                          participants, engine)
+    return settlement_line(columns, settlement)
+
+
+def settle_snapshots(snapshots: List[Tuple[str, bytes]],
+                     engine: Optional[str]) -> bytes:
+    lines = []
+    for session_id, data in snapshots:
+        try:
+            columns = decode_columns(data, details=False)
+            lines.append(settle_columns(columns, data, engine))
+        except Exception as e:
+            lines.append(error_line(session_id, str(e)))
+    return b"".join(lines)
+
+
+_worker_storages: Dict[str, Any] = {}
+
+
+def settle_stored(path: str, session_ids: List[str],
+                  engine: Optional[str]) -> bytes:
+    from storage import SQLiteStorage
+    
+    storage = _worker_storages.get(path)
+    if storage is None:
+        storage = _worker_storages[path] = SQLiteStorage(path, cache_size=0)
+    
+    sessions = []
+    missing = []
+    for session_id in session_ids:
+        try:
+            session = storage.get_session(session_id)
+        except Exception as e:
+            missing.append(error_line(session_id, str(e)))
+            continue
+        if session is None:
+            missing.append(error_line(session_id,
+                                      "Sesja nie została znaleziona"))
+        else:
+            sessions.append(session)
+    return b"".join(missing) + settle_sessions(sessions, engine)
+
+
+class BatchSettler:
+    def __init__(self, workers: int = 1, chunk_size: int = 64):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.running = 0
+        self.sessions = 0
+        self.cached = 0
+    
+    def start(self):
+        if self.workers > 0 and self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"))
+    
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+    
+    async def _guard(self,
+                     session_ids: List[str],
+                     work: Awaitable[bytes],
+                     failed: bytes = b"") -> bytes:
+        try:
+            return failed + await work
+        except Exception as e:
+            return failed + b"".join(
+                error_line(session_id, str(e)) for session_id in session_ids)
+    
+    def _submit(self, chunk: List[Session], engine: Optional[str]):
+        ids = [session.id for session in chunk]
+        if self.executor is None:
+            return asyncio.ensure_future(
+                self._guard(ids, asyncio.to_thread(settle_sessions, chunk,
+                                                   engine)))
+        
+        loop = asyncio.get_running_loop()
+        snapshots = []
+        failed = []
+        for session in chunk:
+            try:
+                snapshots.append((session.id, encode_session(session)))
+            except Exception as e:
+                failed.append(error_line(session.id, str(e)))
+        return asyncio.ensure_future(
+            self._guard([session_id for session_id, _ in snapshots],
+                        loop.run_in_executor(self.executor, settle_snapshots,
+                                             snapshots, engine),
+                        b"".join(failed)))
+    
+    async def stream(self,
+                     session_ids: Iterable[str],
+                     load: Callable[[str], Awaitable[Optional[Session]]],
+                     engine: Optional[str] = None,
+                     source: Optional[str] = None) -> AsyncIterator[bytes]:
+        self.start()
+        if source is not None and self.executor is not None:
+            async for lines in self._stream_stored(session_ids, source,
+                                                   engine):
+                yield lines
+            return
+        
+        self.running += 1
+        in_flight = deque()
+        limit = max(self.workers, 1) * 2
+        chunk: List[Session] = []
+        try:
+            for session_id in session_ids:
+                try:
+                    session = await load(session_id)
+                except Exception as e:
+                    yield error_line(session_id, str(e))
+                    continue
+                if session is None:
+                    yield error_line(session_id,
+                                     "Sesja nie została znaleziona")
+                    continue
+                
+                self.sessions += 1
+                settlement = (settlement_cache.get((session.id, session.version))
+                              if engine is None else None)
+                if settlement is not None:
+                    self.cached += 1
+                    yield settlement_line(session, settlement)
+                    continue
+                
+                chunk.append(session)
+                if len(chunk) < self.chunk_size:
+                    continue
+                in_flight.append(self._submit(chunk, engine))
+                chunk = []
+                while len(in_flight) >= limit:
+                    yield await in_flight.popleft()
+                await asyncio.sleep(0)
+            
+            if chunk:
+                in_flight.append(self._submit(chunk, engine))
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for future in in_flight:
+                future.cancel()
+            self.running -= 1
+    
+    async def _stream_stored(self, session_ids: Iterable[str], source: str,
+                             engine: Optional[str]) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        self.running += 1
+        in_flight = deque()
+        limit = self.workers * 2
+        chunk: List[str] = []
+        try:
+            for session_id in session_ids:
+                chunk.append(session_id)
+                if len(chunk) < self.chunk_size:
+                    continue
+                self.sessions += len(chunk)
+                in_flight.append(
+                    asyncio.ensure_future(
+                        self._guard(
+                            chunk,
+                            loop.run_in_executor(self.executor, settle_stored,
+                                                 source, chunk, engine))))
+                chunk = []
+                while len(in_flight) >= limit:
+                    yield await in_flight.popleft()
+            
+            if chunk:
+                self.sessions += len(chunk)
+                in_flight.append(
+                    asyncio.ensure_future(
+                        self._guard(
+                            chunk,
+                            loop.run_in_executor(self.executor, settle_stored,
+                                                 source, chunk, engine))))
+            while in_flight:
+                yield await in_flight.popleft()
+        finally:
+            for future in in_flight:
+                future.cancel()
+            self.running -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "chunk_size": self.chunk_size,
+            "running": self.running,
+            "sessions": self.sessions,
+            "cached": self.cached,
+        }
+
+
+batch_settler = BatchSettler(workers=BATCH_WORKERS,
+                             chunk_size=BATCH_CHUNK_SIZE)
+
+
+def load_snapshot_file(path: str) -> Optional[Session]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if path.endswith(".json"):
+        return Session.model_validate_json(data)
+    return decode_session(data)
+
+
+async def run_cli(args):
+    source = None
+    if args.files:
+        session_ids = args.files
+        
+        def load(path: str):
+            return asyncio.to_thread(load_snapshot_file, path)
+    else:
+        from storage import storage
+        session_ids = storage.session_ids() if args.all else args.ids
+        load = storage.load_session
+        source = storage.worker_source()
+    
+    settler = BatchSettler(workers=args.workers, chunk_size=args.chunk_size)
+    output = (open(args.output, "wb")
+              if args.output else sys.stdout.buffer)
+    try:
+        async for lines in settler.stream(session_ids, load, args.engine,
+                                          source):
+            output.write(lines)
+    finally:
+        settler.shutdown()
+        if args.output:
+            output.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Settle many sessions in parallel and write NDJSON")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--all", action="store_true",
+                        help="every session in the configured storage")
+    source.add_argument("--ids", nargs="+", help="session ids from storage")
+    source.add_argument("--files", nargs="+",
+                        help="session snapshots (.mspl or .json)")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--chunk-size", type=int, default=BATCH_CHUNK_SIZE)
+    parser.add_argument("--engine", choices=["greedy", "heuristic", "exact"])
+    parser.add_argument("--output", help="file to write instead of stdout")
+    asyncio.run(run_cli(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Streaming ZIP archive of many sessions vs building it in memory.
+
+Creates --sessions sessions in the in-memory storage and exports all of
+them through POST /sessions/export/archive (CSV and PDF, PDFs rendered in
+the worker pool). The same archive is also built the buffered way: every
+CSV and PDF generated in full and written into a ZipFile over BytesIO
+before anything is sent.
+
+For both it reports time to first byte, total time, archive size and the
+peak Python heap of the server process (tracemalloc; PDF workers are
+separate processes). The app is driven directly over ASGI so that the
+first body chunk is timed as it is sent. Both archives are checked with
+ZipFile.testzip.
+
+    python benchmarks/archive_export.py --sessions 200 --expenses 500
+    python benchmarks/archive_export.py --formats csv --sessions 2000
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from archive_export import member_name  # noqa: E402
+from csv_export import iter_csv  # noqa: E402
+from models import Expense, Participant, Session  # noqa: E402
+from pdf_export import pdf_cache, pdf_renderer  # noqa: E402
+from settlement import get_settlement  # noqa: E402
+from storage import storage  # noqa: E402
+from main import app, render_session_pdf  # noqa: E402
+
+
+def build_session(n: int, participants: int, expenses: int,
+                  rng: random.Random) -> Session:
+    session = Session(name=f"Sesja {n}")
+    session.participants = [
+        Participant(name=f"Uczestnik {i}") for i in range(participants)
+    ]
+    ids = [p.id for p in session.participants]
+    session.expenses = [
+        Expense(title=f"Wydatek {k}",
+                amount_minor=rng.randint(100, 100000),
+                date=date(2025, 1, 1) + timedelta(days=k % 365),
+                payer_id=rng.choice(ids),
+                beneficiary_ids=rng.sample(ids, rng.randint(1, participants)))
+        for k in range(expenses)
+    ]
+    return session
+
+
+async def streamed(session_ids, formats, output):
+    body = json.dumps({
+        "session_ids": session_ids,
+        "formats": formats
+    }).encode("utf-8")
+    scope = {
+        "type": "http",
+        "asgi": {
+            "version": "3.0"
+        },
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/sessions/export/archive",
+        "raw_path": b"/sessions/export/archive",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1"))],
+        "client": ("127.0.0.1", 50000),
+        "server": ("archive", 80),
+    }
+    received = []
+    first_byte = None
+    
+    async def receive():
+        if received:
+            await asyncio.Event().wait()
+        received.append(True)
+        return {"type": "http.request", "body": body, "more_body": False}
+    
+    async def send(message):
+        nonlocal first_byte
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+        elif message["type"] == "http.response.body" and message.get("body"):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            output.write(message["body"])
+    
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    return first_byte, time.perf_counter() - started
+
+
+async def buffered(session_ids, formats, output):
+    started = time.perf_counter()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for session_id in session_ids:
+            session = storage.get_session(session_id)
+            if "csv" in formats:
+                archive.writestr(
+                    member_name(session, "csv"),
+                    b"".join(iter_csv(session, get_settlement(session))))
+            if "pdf" in formats:
+                archive.writestr(member_name(session, "pdf"), await
+                                 render_session_pdf(session))
+    output.write(buffer.getvalue())
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed
+
+
+async def measure(label, run, session_ids, formats):
+    pdf_cache.clear()
+    with tempfile.TemporaryFile() as output:
+        tracemalloc.start()
+        first_byte, elapsed = await run(session_ids, formats, output)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        
+        size = output.tell()
+        output.seek(0)
+        archive = zipfile.ZipFile(output)
+        assert archive.testzip() is None
+        members = len(archive.namelist())
+    print(f"{label:10} first byte {first_byte * 1000:9.1f} ms   "
+          f"total {elapsed:7.2f} s   size {size / 2**20:7.2f} MiB   "
+          f"members {members:5d}   "
+          f"peak heap {peak / 2**20:7.2f} MiB")
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    session_ids = []
+    for n in range(args.sessions):
+        session = storage.create_session(
+            build_session(n, args.participants, args.expenses, rng))
+        session_ids.append(session.id)
+    
+    pdf_renderer.start()
+    await pdf_renderer.warm_up()
+    try:
+        print(f"{args.sessions} sessions x {args.participants} participants "
+              f"x {args.expenses} expenses, formats {', '.join(args.formats)}, "
+              f"{pdf_renderer.workers} PDF workers")
+        await measure("buffered", buffered, session_ids, args.formats)
+        await measure("streamed", streamed, session_ids, args.formats)
+    finally:
+        pdf_renderer.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--participants", type=int, default=8)
+    parser.add_argument("--expenses", type=int, default=300)
+    parser.add_argument("--formats", nargs="+", choices=["csv", "pdf"],
+                        default=["csv", "pdf"])
+    parser.add_argument("--seed", type=int, default=25)
+    args = parser.parse_args()
+    
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
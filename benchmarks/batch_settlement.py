@@ -0,0 +1,126 @@
+"""Batch settlement throughput for different worker counts.
+
+Generates many small sessions and settles all of them through
+BatchSettler. It runs sequentially in-process first, then over a
+process pool with each --workers count, for two sources:
+
+- memory: the parent encodes every session into a binary snapshot
+- sqlite: the sessions are written to a temporary SQLite database and
+  the workers load them by id
+
+For each run it reports sessions per second and the share of wall time
+the parent process spends on the CPU. Parent CPU bounds how far the
+pool can scale. All runs must produce identical NDJSON.
+
+    python benchmarks/batch_settlement.py --sessions 100000 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from batch_settlement import BatchSettler, settle_sessions  # noqa: E402
+from models import Expense, Participant, Session  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+
+def build_sessions(count: int, participants: int, expenses: int,
+                   rng: random.Random):
+    sessions = {}
+    for n in range(count):
+        session = Session(name=f"Sesja {n}")
+        session.participants = [
+            Participant(name=f"Uczestnik {i}") for i in range(participants)
+        ]
+        ids = [p.id for p in session.participants]
+        session.expenses = [
+            Expense(title=f"Wydatek {k}",
+                    amount_minor=rng.randint(100, 100000),
+                    date=date(2025, 1, 1) + timedelta(days=k),
+                    payer_id=rng.choice(ids),
+                    beneficiary_ids=rng.sample(ids,
+                                               rng.randint(1, participants)))
+            for k in range(expenses)
+        ]
+        sessions[session.id] = session
+    return sessions
+
+
+async def collect(settler: BatchSettler, sessions, source=None) -> bytes:
+    async def load(session_id):
+        return sessions.get(session_id)
+
+    chunks = []
+    async for lines in settler.stream(list(sessions), load, "greedy",
+                                      source):
+        chunks.append(lines)
+    return b"".join(sorted(b"".join(chunks).splitlines()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20000)
+    parser.add_argument("--participants", type=int, default=8)
+    parser.add_argument("--expenses", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, os.cpu_count() or 1}))
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--sources", nargs="+", choices=["memory", "sqlite"],
+                        default=["memory", "sqlite"])
+    parser.add_argument("--seed", type=int, default=23)
+    args = parser.parse_args()
+
+    sessions = build_sessions(args.sessions, args.participants,
+                              args.expenses, random.Random(args.seed))
+    print(f"{args.sessions} sessions x {args.participants} participants x "
+          f"{args.expenses} expenses, {os.cpu_count()} CPUs")
+
+    started = time.perf_counter()
+    expected = b"".join(
+        sorted(settle_sessions(list(sessions.values()), "greedy").splitlines()))
+    sequential = time.perf_counter() - started
+    print(f"{'sequential':18} {args.sessions / sequential:10.0f} sessions/s")
+
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, "batch.db")
+    if "sqlite" in args.sources:
+        store = SQLiteStorage(database)
+        for session in sessions.values():
+            store.create_session(session)
+        store.close()
+
+    for source in args.sources:
+        path = database if source == "sqlite" else None
+        for workers in args.workers:
+            settler = BatchSettler(workers=workers,
+                                   chunk_size=args.chunk_size)
+            settler.start()
+            asyncio.run(
+                collect(settler, dict(list(sessions.items())[:workers]),
+                        path))
+            cpu_started = time.process_time()
+            started = time.perf_counter()
+            output = asyncio.run(collect(settler, sessions, path))
+            elapsed = time.perf_counter() - started
+            parent_cpu = time.process_time() - cpu_started
+            settler.shutdown()
+            assert output == expected, (
+                f"output differs with {source}, {workers} workers")
+            print(f"{source:6} {workers:3d} workers  "
+                  f"{args.sessions / elapsed:10.0f} sessions/s  "
+                  f"speed-up {sequential / elapsed:5.2f}x  "
+                  f"parent CPU {parent_cpu / elapsed:5.0%}")
+
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Bulk expense import: parse time and peak memory for large files.
+
+Writes a CSV (or JSON array) file with the requested number of rows to a
+temporary directory, then measures streaming parse + validation, the
+single storage update and the one settlement computation. Peak memory
+comes from a separate traced pass (tracemalloc slows parsing down several
+times) and includes the resulting expense objects themselves.
+
+    python benchmarks/bulk_import.py --rows 100000 --format csv
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_import import ParticipantIndex, read_expenses  # noqa: E402
+from models import Participant, Session  # noqa: E402
+from settlement import get_settlement  # noqa: E402
+from storage import InMemoryStorage  # noqa: E402
+
+
+def write_file(path: str, fmt: str, rows: int, names: list,
+               rng: random.Random):
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "csv":
+            f.write("title,amount,date,payer,beneficiaries\n")
+        else:
+            f.write("[")
+        for i in range(rows):
+            beneficiaries = rng.sample(names, rng.randint(1, len(names)))
+            amount = f"{rng.randint(1, 5000)}.{rng.randint(0, 99):02d}"
+            day = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+            if fmt == "csv":
+                f.write(f"Wydatek {i},{amount},{day},{rng.choice(names)},"
+                        f"{';'.join(beneficiaries)}\n")
+            else:
+                f.write(("," if i else "") + json.dumps({
+                    "title": f"Wydatek {i}",
+                    "amount": amount,
+                    "date": day,
+                    "payer": rng.choice(names),
+                    "beneficiaries": beneficiaries,
+                }))
+        if fmt == "json":
+            f.write("]")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--participants", type=int, default=8)
+    parser.add_argument("--format", choices=["csv", "json"], default="csv")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    storage = InMemoryStorage()
+    session = Session(name="Import")
+    session.participants = [
+        Participant(name=f"Uczestnik {i}") for i in range(args.participants)
+    ]
+    storage.create_session(session)
+    names = [p.name for p in session.participants]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"import.{args.format}")
+        write_file(path, args.format, args.rows, names, rng)
+        file_size = os.path.getsize(path)
+
+        gc.collect()
+        tracemalloc.start()
+        with open(path, "rb") as f:
+            read_expenses(f, args.format, ParticipantIndex(session))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        gc.collect()
+        started = time.perf_counter()
+        with open(path, "rb") as f:
+            expenses, report = read_expenses(f, args.format,
+                                             ParticipantIndex(session))
+        parsed = time.perf_counter()
+
+    if report.error_count:
+        raise AssertionError(f"unexpected errors: {report.errors[:5]}")
+
+    session.expenses.extend(expenses)
+    storage.update_session(session, expected_version=session.version)
+    stored = time.perf_counter()
+    settlement = get_settlement(session)
+    settled = time.perf_counter()
+
+    print(f"rows: {args.rows}, format: {args.format}, "
+          f"file: {file_size / 2**20:.1f} MiB")
+    print(f"parse + validate:   {(parsed - started) * 1000:9.1f} ms")
+    print(f"storage update:     {(stored - parsed) * 1000:9.1f} ms")
+    print(f"settlement (once):  {(settled - stored) * 1000:9.1f} ms "
+          f"({len(settlement.payments)} payments)")
+    print(f"peak traced memory: {peak / 2**20:9.1f} MiB "
+          f"({peak / args.rows:.0f} B/row, expense objects included)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Currency parsing and formatting speed.
+
+Times the old float-based parser and formatter (inlined below) against
+utils.parse_currency / format_currency / format_currencies, and counts how
+many random int64 grosze amounts the float parser gets wrong. Exactness of
+the integer parser is covered by tests/test_currency.py (run with pytest).
+
+    python benchmarks/currency.py --samples 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import (INT64_MAX, INT64_MIN, format_currencies,  # noqa: E402
+                   format_currency, format_currency_input, parse_currency)
+
+
+def legacy_parse(amount_str: str) -> int:
+    cleaned = amount_str.replace(',', '.').strip()
+    return int(round(float(cleaned) * 100))
+
+
+def legacy_format(amount_minor: int) -> str:
+    zloty = amount_minor // 100
+    grosze = abs(amount_minor) % 100
+    return f"{zloty},{grosze:02d} zł"
+
+
+def random_amounts(rng: random.Random, count: int):
+    edges = [0, 1, -1, 99, -99, 100, -100, INT64_MAX, INT64_MIN, 2**53,
+             2**53 + 1, -(2**53 + 1)]
+    amounts = list(edges)
+    while len(amounts) < count:
+        bits = rng.choice([8, 16, 32, 53, 63])
+        amounts.append(rng.randint(-(2**bits) + 1, 2**bits - 1))
+    return amounts
+
+
+def legacy_mismatches(amounts) -> int:
+    return sum(
+        legacy_parse(format_currency_input(amount)) != amount
+        for amount in amounts)
+
+
+def best_of(repeat: int, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=15)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    amounts = random_amounts(rng, args.samples)
+    print(f"float parser wrong on {legacy_mismatches(amounts)} of "
+          f"{len(amounts)} amounts up to int64")
+
+    typical = [rng.randint(1, 500000) for _ in range(args.samples)]
+    texts = [format_currency_input(a).replace(".", ",") for a in typical]
+    repeated = [rng.choice(typical[:500]) for _ in range(args.samples)]
+
+    rows = [
+        ("parse float", lambda: [legacy_parse(t) for t in texts]),
+        ("parse int", lambda: [parse_currency(t) for t in texts]),
+        ("format legacy", lambda: [legacy_format(a) for a in repeated]),
+        ("format cached", lambda: [format_currency(a) for a in repeated]),
+        ("format batch", lambda: format_currencies(repeated)),
+    ]
+    for label, fn in rows:
+        ms = best_of(args.repeat, fn)
+        print(f"{label:14} {ms:8.1f} ms "
+              f"({ms * 1e6 / args.samples:6.0f} ns/op)")
+
+
+if __name__ == "__main__":
+    main()
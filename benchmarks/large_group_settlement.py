@@ -0,0 +1,91 @@
+"""Scaling benchmark for the large-group settlement path.
+
+Builds sessions with N participants and about N expenses, settles each
+one with the standard path (calculate_balances + optimize_payments) and
+with calculate_settlement_large and prints the timings. Both paths share
+the greedy transfer loop, so the equality check here only guards the
+balance and object-building code; tests/test_settlement.py compares them
+against a frozen copy of the original greedy loop.
+
+    python benchmarks/large_group_settlement.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Expense, Participant, Session, Settlement  # noqa: E402
+from settlement import (calculate_balances, calculate_settlement_large,  # noqa: E402
+                        get_ledger, optimize_payments)
+
+
+def build_session(size: int, rng: random.Random) -> Session:
+    session = Session(name=f"Benchmark {size}")
+    session.participants = [
+        Participant.model_construct(id=f"p{i}", name=f"Uczestnik {i}")
+        for i in range(size)
+    ]
+    ids = [p.id for p in session.participants]
+    session.expenses = [
+        Expense.model_construct(id=f"e{k}",
+                                title=f"Wydatek {k}",
+                                amount_minor=rng.randint(1, 100000),
+                                date=date(2025, 1, 1),
+                                payer_id=rng.choice(ids),
+                                beneficiary_ids=rng.sample(
+                                    ids, rng.randint(1, min(size, 10))))
+        for k in range(size)
+    ]
+    return session
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes",
+                        type=int,
+                        nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'participants':>12}{'payments':>10}{'reference ms':>15}"
+          f"{'large ms':>12}{'speed-up':>10}")
+
+    for size in args.sizes:
+        session = build_session(size, rng)
+        get_ledger(session)
+
+        def reference():
+            balances = calculate_balances(session)
+            return Settlement(balances=balances,
+                              payments=optimize_payments(
+                                  balances, session.participants))
+
+        expected, reference_ms = timed(reference, args.repeat)
+        actual, large_ms = timed(lambda: calculate_settlement_large(session),
+                                 args.repeat)
+
+        if actual.model_dump() != expected.model_dump():
+            raise AssertionError(f"large path differs for {size} participants")
+
+        print(f"{size:>12}{len(actual.payments):>10}{reference_ms:>15.1f}"
+              f"{large_ms:>12.1f}{reference_ms / large_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
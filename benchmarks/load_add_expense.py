@@ -0,0 +1,116 @@
+"""Concurrent load test for POST /session/{id}/expense/add.
+
+Fires many expense posts at one session at the same time and checks that
+every one of them ends up in the CSV export. By default the app runs
+in-process; pass --url to hammer a running server instead, e.g. several
+uvicorn workers sharing STORAGE_BACKEND=sqlite.
+
+    python benchmarks/load_add_expense.py --requests 500 --concurrency 50
+    python benchmarks/load_add_expense.py --url http://127.0.0.1:5000
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import re
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_client(url: str) -> httpx.AsyncClient:
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=60)
+
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                             base_url="http://loadtest",
+                             timeout=60)
+
+
+def exported_expense_titles(csv_text: str):
+    rows = list(csv.reader(io.StringIO(csv_text.lstrip("\ufeff"))))
+    start = rows.index(["WYDATKI"]) + 2
+    titles = []
+    for row in rows[start:]:
+        if not row:
+            break
+        titles.append(row[1])
+    return titles
+
+
+async def run(url: str, requests: int, concurrency: int, participants: int):
+    async with make_client(url) as client:
+        response = await client.post("/session/create",
+                                     data={"session_name": "Load test"})
+        session_id = response.headers["location"].rsplit("/", 1)[1]
+
+        for i in range(participants):
+            response = await client.post(
+                f"/session/{session_id}/participant/add",
+                data={"participant_name": f"P{i}"})
+            response.raise_for_status()
+
+        response = await client.get(f"/session/{session_id}")
+        participant_ids = re.findall(r'id="beneficiary-([^"]+)"',
+                                     response.text)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        statuses = []
+
+        async def post_expense(i: int):
+            async with semaphore:
+                response = await client.post(
+                    f"/session/{session_id}/expense/add",
+                    data={
+                        "title": f"expense-{i}",
+                        "amount": f"{i % 500 + 1},{i % 100:02d}",
+                        "expense_date": "2025-01-01",
+                        "payer_id": participant_ids[i % len(participant_ids)],
+                        "beneficiary_ids": participant_ids,
+                    })
+                statuses.append(response.status_code)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(post_expense(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+
+        response = await client.get(f"/session/{session_id}/export/csv")
+        titles = exported_expense_titles(response.text)
+
+    accepted = statuses.count(200)
+    expected = {f"expense-{i}" for i in range(requests)}
+    lost = expected - set(titles)
+    duplicated = len(titles) - len(set(titles))
+
+    print(f"requests:    {requests} (concurrency {concurrency})")
+    print(f"accepted:    {accepted}, other statuses: "
+          f"{sorted(set(statuses) - {200})}")
+    print(f"throughput:  {requests / elapsed:.1f} req/s")
+    print(f"stored:      {len(titles)}, lost: {len(lost)}, "
+          f"duplicated: {duplicated}")
+
+    return accepted == requests and not lost and not duplicated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--participants", type=int, default=5)
+    args = parser.parse_args()
+
+    ok = asyncio.run(
+        run(args.url, args.requests, args.concurrency, args.participants))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
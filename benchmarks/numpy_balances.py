@@ -0,0 +1,77 @@
+"""Pure-Python versus NumPy balance computation.
+
+Generates sessions with many expenses, checks that compute_balance_map_numpy
+returns the same balances as compute_balance_map_python at each size and
+prints the timings. The exactness guarantee itself (remainder distribution,
+amounts near the int64 limit) is covered by tests/test_numpy_balances.py.
+
+    python benchmarks/numpy_balances.py --expenses 1000 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Expense, Participant, Session  # noqa: E402
+from settlement import (compute_balance_map_numpy,  # noqa: E402
+                        compute_balance_map_python, load_numpy)
+
+
+def build_session(participants: int, expenses: int,
+                  rng: random.Random) -> Session:
+    session = Session(name="Benchmark")
+    session.participants = [
+        Participant.model_construct(id=f"p{i}", name=f"P{i}")
+        for i in range(participants)
+    ]
+    ids = [p.id for p in session.participants]
+    session.expenses = [
+        Expense.model_construct(
+            id=f"e{k}",
+            title="x",
+            amount_minor=rng.randint(1, 10**7),
+            date=date(2025, 1, 1),
+            payer_id=rng.choice(ids),
+            beneficiary_ids=rng.sample(ids, rng.randint(1, min(12, participants))))
+        for k in range(expenses)
+    ]
+    return session
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=50)
+    parser.add_argument("--expenses",
+                        type=int,
+                        nargs="+",
+                        default=[1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    if load_numpy() is None:
+        sys.exit("numpy is not installed")
+
+    rng = random.Random(args.seed)
+    print(f"{'expenses':>10}{'python ms':>12}{'numpy ms':>12}{'speed-up':>10}")
+    for count in args.expenses:
+        session = build_session(args.participants, count, rng)
+        expected, python_ms = timed(lambda: compute_balance_map_python(session))
+        actual, numpy_ms = timed(lambda: compute_balance_map_numpy(session))
+        if actual != expected or list(actual) != list(expected):
+            raise AssertionError(f"numpy balances differ for {count} expenses")
+        print(f"{count:>10}{python_ms:>12.1f}{numpy_ms:>12.1f}"
+              f"{python_ms / numpy_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
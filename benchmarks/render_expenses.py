@@ -0,0 +1,126 @@
+"""Render time of the expense list partial.
+
+Compares the old nested-loop name lookup (inlined below) with the
+current partials that read pre-resolved rows from SessionView, for a
+session of 1k expenses x 50 participants by default. The full-list
+timings render every row; "first page" is what GET /session/{id}
+actually renders now that older rows are loaded on scroll.
+
+    python benchmarks/render_expenses.py --expenses 1000 --participants 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from rendering import templates  # noqa: E402
+from models import Expense, Participant, Session  # noqa: E402
+from session_view import SessionView  # noqa: E402
+from settlement import calculate_settlement  # noqa: E402
+
+LEGACY_TEMPLATE = """
+{% for expense in session.expenses|reverse %}
+<h4>{{ expense.title }}</h4>
+<p>{{ expense.date.strftime('%Y-%m-%d') }}</p>
+<span>{{ expense.amount_minor|format_currency }}</span>
+<p><span class="font-medium">Płatnik:</span>
+    {% for p in session.participants %}
+        {% if p.id == expense.payer_id %}{{ p.name }}{% endif %}
+    {% endfor %}
+</p>
+<p><span class="font-medium">Beneficjenci:</span>
+    {% for bid in expense.beneficiary_ids %}
+        {% for p in session.participants %}
+            {% if p.id == bid %}{{ p.name }}{% if not loop.last %}, {% endif %}{% endif %}
+        {% endfor %}
+    {% endfor %}
+</p>
+{% endfor %}
+{% for participant in session.participants %}
+    {% for balance in settlement.balances %}
+        {% if balance.participant_id == participant.id %}{{ balance.balance_minor|format_currency }}{% endif %}
+    {% endfor %}
+{% endfor %}
+"""
+
+
+def build_session(participants: int, expenses: int) -> Session:
+    rng = random.Random(1)
+    session = Session(name="Render")
+    session.participants = [
+        Participant(name=f"Uczestnik {i}") for i in range(participants)
+    ]
+    ids = [p.id for p in session.participants]
+    session.expenses = [
+        Expense(title=f"Wydatek {k}",
+                amount_minor=rng.randint(100, 100000),
+                date=date(2025, 1, 1),
+                payer_id=rng.choice(ids),
+                beneficiary_ids=rng.sample(ids, rng.randint(1, participants)))
+        for k in range(expenses)
+    ]
+    return session
+
+
+def best_of(repeat: int, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=50)
+    parser.add_argument("--expenses", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    session = build_session(args.participants, args.expenses)
+    settlement = calculate_settlement(session)
+
+    legacy = templates.env.from_string(LEGACY_TEMPLATE)
+    rows = templates.get_template("partials/expense_rows.html")
+    panel = templates.get_template("partials/settlement_panel.html")
+    partial = templates.get_template("partials/expenses_and_settlement.html")
+    participants = templates.get_template("partials/participants_list.html")
+    view = SessionView(session, settlement)
+
+    def render_current(view):
+        page = view.expense_page(session.expenses, limit=len(session.expenses))
+        rows.render(session=session, page=page)
+        panel.render(settlement=settlement)
+        participants.render(session=session, settlement=settlement, view=view)
+
+    def render_first_page(view):
+        partial.render(session=session, settlement=settlement, view=view)
+        participants.render(session=session, settlement=settlement, view=view)
+
+    legacy_ms = best_of(
+        args.repeat,
+        lambda: legacy.render(session=session, settlement=settlement))
+    cold_ms = best_of(
+        args.repeat,
+        lambda: render_current(SessionView(session, settlement)))
+    warm_ms = best_of(args.repeat, lambda: render_current(view))
+    page_ms = best_of(
+        args.repeat,
+        lambda: render_first_page(SessionView(session, settlement)))
+
+    print(f"{args.expenses} expenses x {args.participants} participants")
+    print(f"nested loops:             {legacy_ms:8.1f} ms")
+    print(f"view index (build+render):{cold_ms:8.1f} ms")
+    print(f"view index (cached):      {warm_ms:8.1f} ms")
+    print(f"first page (build+render):{page_ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Export storm against one session while another keeps adding expenses.
+
+Fires many identical PDF and CSV exports at a session that has a few
+hundred expenses, and at the same time posts expenses to a second session.
+Reports how many PDFs were actually rendered (identical requests for the
+same session version should share one render), how many exports were
+turned away with 503, and the latency of the add_expense traffic.
+
+    python benchmarks/request_storm.py --exports 200 --expenses 100
+    python benchmarks/request_storm.py --pdf-concurrency 1000 --pdf-queue 1000
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def create_session(client: httpx.AsyncClient, name: str,
+                         participants: int):
+    response = await client.post("/session/create",
+                                 data={"session_name": name})
+    session_id = response.headers["location"].rsplit("/", 1)[1]
+    for i in range(participants):
+        response = await client.post(f"/session/{session_id}/participant/add",
+                                     data={"participant_name": f"P{i}"})
+        response.raise_for_status()
+    response = await client.get(f"/session/{session_id}")
+    return session_id, re.findall(r'id="beneficiary-([^"]+)"', response.text)
+
+
+async def post_expense(client: httpx.AsyncClient, session_id: str,
+                       participant_ids, i: int) -> int:
+    response = await client.post(f"/session/{session_id}/expense/add",
+                                 data={
+                                     "title": f"expense-{i}",
+                                     "amount": f"{i % 500 + 1},{i % 100:02d}",
+                                     "expense_date": "2025-01-01",
+                                     "payer_id":
+                                     participant_ids[i % len(participant_ids)],
+                                     "beneficiary_ids": participant_ids,
+                                 })
+    return response.status_code
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(args) -> bool:
+    os.environ.setdefault("PDF_EXPORT_CONCURRENCY",
+                          str(args.pdf_concurrency))
+    os.environ.setdefault("PDF_EXPORT_QUEUE", str(args.pdf_queue))
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    from main import app, flights, limiters, pdf_renderer
+    
+    pdf_renderer.start()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                               base_url="http://storm",
+                               timeout=120)
+    try:
+        target, target_ids = await create_session(client, "Storm", 8)
+        for i in range(args.size):
+            await post_expense(client, target, target_ids, i)
+        writer, writer_ids = await create_session(client, "Writer", 4)
+        
+        latencies = []
+        statuses = []
+        
+        async def export(i: int):
+            kind = "pdf" if i % 2 == 0 else "csv"
+            response = await client.get(f"/session/{target}/export/{kind}")
+            statuses.append((kind, response.status_code))
+        
+        async def writes():
+            for i in range(args.expenses):
+                started = time.perf_counter()
+                status = await post_expense(client, writer, writer_ids, i)
+                latencies.append(time.perf_counter() - started)
+                statuses.append(("add", status))
+        
+        baseline = []
+        for i in range(20):
+            started = time.perf_counter()
+            await post_expense(client, writer, writer_ids, -i)
+            baseline.append(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        await asyncio.gather(writes(),
+                             *(export(i) for i in range(args.exports)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await client.aclose()
+        pdf_renderer.shutdown()
+    
+    def count(kind: str, status: int) -> int:
+        return statuses.count((kind, status))
+    
+    coalescing = flights.stats()
+    print(f"exports:     {args.exports} against {args.size} expenses, "
+          f"{elapsed:.2f} s")
+    print(f"pdf:         {count('pdf', 200)} ok, {count('pdf', 503)} x 503, "
+          f"{coalescing['leaders']} rendered, "
+          f"{coalescing['coalesced']} coalesced")
+    print(f"csv:         {count('csv', 200)} ok, {count('csv', 503)} x 503")
+    print("admission:   " + ", ".join(
+        f"{name} rejected {limiter.rejected}"
+        for name, limiter in limiters.items()))
+    print(f"add_expense: {count('add', 200)}/{args.expenses} ok, "
+          f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms "
+          f"(idle p50 {statistics.median(baseline) * 1000:.1f} ms)")
+    return count("add", 200) == args.expenses and coalescing["leaders"] <= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--exports", type=int, default=200)
+    parser.add_argument("--expenses", type=int, default=100)
+    parser.add_argument("--size", type=int, default=300)
+    parser.add_argument("--pdf-concurrency", type=int, default=4)
+    parser.add_argument("--pdf-queue", type=int, default=16)
+    args = parser.parse_args()
+    
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Binary session codec vs pydantic JSON.
+
+Builds a synthetic session, checks that encode_session/decode_session
+round-trip it exactly, and compares payload size and encode/decode time
+against model_dump_json/model_validate_json.
+
+    python benchmarks/session_codec.py --expenses 20000 --participants 30
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import zlib
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from codec import decode_session, encode_session  # noqa: E402
+from models import Expense, Participant, Session  # noqa: E402
+
+
+def build_session(participants: int, expenses: int,
+                  beneficiaries: int) -> Session:
+    rng = random.Random(1)
+    session = Session(name="Codec")
+    session.participants = [
+        Participant(name=f"Uczestnik {i}") for i in range(participants)
+    ]
+    ids = [p.id for p in session.participants]
+    start = date(2024, 1, 1).toordinal()
+    session.expenses = [
+        Expense(title=f"Wydatek {k}",
+                amount_minor=rng.randint(100, 500000),
+                date=date.fromordinal(start + k * 365 // expenses),
+                payer_id=rng.choice(ids),
+                beneficiary_ids=rng.sample(
+                    ids, rng.randint(1, min(beneficiaries, participants))))
+        for k in range(expenses)
+    ]
+    return session
+
+
+def best_of(repeat: int, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=30)
+    parser.add_argument("--expenses", type=int, default=20000)
+    parser.add_argument("--beneficiaries", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    session = build_session(args.participants, args.expenses,
+                            args.beneficiaries)
+    binary = encode_session(session)
+    text = session.model_dump_json().encode("utf-8")
+    assert decode_session(binary).model_dump() == session.model_dump()
+
+    timings = [
+        ("json", len(text), len(zlib.compress(text)),
+         best_of(args.repeat, session.model_dump_json),
+         best_of(args.repeat, lambda: Session.model_validate_json(text))),
+        ("binary", len(binary), len(zlib.compress(binary)),
+         best_of(args.repeat, lambda: encode_session(session)),
+         best_of(args.repeat, lambda: decode_session(binary))),
+    ]
+
+    print(f"{args.expenses} expenses x {args.participants} participants "
+          f"(<= {args.beneficiaries} beneficiaries)")
+    print(f"{'format':8} {'bytes':>10} {'zlib':>10} {'encode ms':>10} "
+          f"{'decode ms':>10}")
+    for name, size, compressed, encode_ms, decode_ms in timings:
+        print(f"{name:8} {size:10d} {compressed:10d} {encode_ms:10.1f} "
+              f"{decode_ms:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Memory footprint of pydantic sessions versus CompactSession.
+
+Builds sessions with random expenses, measures the traced allocations of
+the pydantic models, then converts them to CompactSession, drops the
+models and measures again. Also checks that every expense materialised
+from the compact form equals the original.
+
+    python benchmarks/session_memory.py --sessions 50 --expenses 2000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact import CompactSession  # noqa: E402
+from models import Expense, Participant, Session  # noqa: E402
+
+
+def build_session(participants: int, expenses: int,
+                  rng: random.Random) -> Session:
+    session = Session(name="Wyjazd")
+    session.participants = [
+        Participant(name=f"Uczestnik {i}") for i in range(participants)
+    ]
+    ids = [p.id for p in session.participants]
+    start = date(2025, 1, 1)
+    session.expenses = [
+        Expense(title=rng.choice(["Zakupy", "Paliwo", "Nocleg", "Kolacja"]) +
+                f" {k}",
+                amount_minor=rng.randint(100, 500000),
+                date=start + timedelta(days=rng.randint(0, 365)),
+                payer_id=rng.choice(ids),
+                beneficiary_ids=rng.sample(ids, rng.randint(1, participants)))
+        for k in range(expenses)
+    ]
+    return session
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--participants", type=int, default=8)
+    parser.add_argument("--expenses", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tracemalloc.start()
+
+    sessions = [
+        build_session(args.participants, args.expenses, rng)
+        for _ in range(args.sessions)
+    ]
+    gc.collect()
+    pydantic_bytes = tracemalloc.get_traced_memory()[0]
+
+    compacts = [CompactSession.from_session(s) for s in sessions]
+    for session, compact in zip(sessions, compacts):
+        for i, expense in enumerate(session.expenses):
+            if compact.expense(i) != expense:
+                raise AssertionError("materialised expense differs")
+
+    del sessions, session, expense
+    gc.collect()
+    compact_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    total = args.sessions * args.expenses
+    print(f"sessions: {args.sessions}, expenses per session: "
+          f"{args.expenses}, participants: {args.participants}")
+    print(f"pydantic:  {pydantic_bytes / 2**20:8.2f} MiB "
+          f"({pydantic_bytes / total:6.0f} B/expense)")
+    print(f"compact:   {compact_bytes / 2**20:8.2f} MiB "
+          f"({compact_bytes / total:6.0f} B/expense)")
+    print(f"ratio:     {pydantic_bytes / compact_bytes:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
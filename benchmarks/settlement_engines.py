@@ -0,0 +1,94 @@
+"""Compare settlement engines on random groups.
+
+Balances are generated the way real trips produce them: a group is split
+into small sub-groups that share expenses among themselves, so zero-sum
+subsets exist and the exact engine has something to find. For every
+group size the script reports the average number of transfers and the
+mean latency per engine.
+
+    python benchmarks/settlement_engines.py --sizes 5 10 20 50 100 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Balance, Participant  # noqa: E402
+from settlement import ENGINES  # noqa: E402
+
+
+def random_group(size: int, rng: random.Random):
+    participants = [Participant(name=f"P{i}") for i in range(size)]
+    balances = {p.id: 0 for p in participants}
+
+    ids = [p.id for p in participants]
+    rng.shuffle(ids)
+    start = 0
+    while start < len(ids):
+        cluster = ids[start:start + rng.randint(2, 5)]
+        start += len(cluster)
+        for _ in range(rng.randint(1, 4)):
+            amount = rng.randint(1, 500) * 100
+            payer = rng.choice(cluster)
+            share, remainder = divmod(amount, len(cluster))
+            for i, pid in enumerate(cluster):
+                balances[pid] -= share + (1 if i < remainder else 0)
+            balances[payer] += amount
+
+    return participants, [
+        Balance(participant_id=p.id,
+                participant_name=p.name,
+                balance_minor=balances[p.id]) for p in participants
+    ]
+
+
+def check_settles(balances, payments):
+    remaining = {b.participant_id: b.balance_minor for b in balances}
+    for payment in payments:
+        remaining[payment.from_participant_id] += payment.amount_minor
+        remaining[payment.to_participant_id] -= payment.amount_minor
+    if any(remaining.values()):
+        raise AssertionError("payments do not settle the balances")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes",
+                        type=int,
+                        nargs="+",
+                        default=[5, 10, 20, 50, 100, 200, 500])
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    engines = list(ENGINES)
+
+    header = f"{'size':>6}" + "".join(
+        f"{name + ' transfers':>20}{name + ' ms':>14}" for name in engines)
+    print(header)
+    print("-" * len(header))
+
+    for size in args.sizes:
+        transfers = {name: [] for name in engines}
+        latency = {name: [] for name in engines}
+        for _ in range(args.groups):
+            participants, balances = random_group(size, rng)
+            for name in engines:
+                started = time.perf_counter()
+                payments = ENGINES[name](balances, participants)
+                latency[name].append((time.perf_counter() - started) * 1000)
+                check_settles(balances, payments)
+                transfers[name].append(len(payments))
+
+        print(f"{size:>6}" + "".join(
+            f"{statistics.mean(transfers[name]):>20.1f}"
+            f"{statistics.mean(latency[name]):>14.2f}" for name in engines))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Fan-out of live session updates to many SSE subscribers.
+
+Starts the app under uvicorn (or uses --url), opens --subscribers
+event streams on one session and posts --events expenses from a
+separate client id. Reports how long it takes until every subscriber
+has received each update, and checks that nobody missed an event and
+that the posting client did not receive its own updates.
+
+    python benchmarks/sse_fanout.py --subscribers 300 --events 20
+"""
+import argparse
+import asyncio
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))]
+
+
+async def wait_ready(url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url + "/")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def subscriber(client: httpx.AsyncClient, session_id: str, name: str,
+                     received: dict, ready: asyncio.Event, total: int,
+                     counter: list):
+    url = f"/session/{session_id}/events?client={name}"
+    async with client.stream("GET", url) as response:
+        counter[0] += 1
+        if counter[0] == total:
+            ready.set()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: ") and event == "update":
+                match = re.search(r"Live (\d+)<", line)
+                if match:
+                    received.setdefault(int(match.group(1)),
+                                        []).append(time.perf_counter())
+
+
+async def run(url: str, subscribers: int, events: int):
+    limits = httpx.Limits(max_connections=subscribers + 10)
+    async with httpx.AsyncClient(base_url=url, timeout=None,
+                                 limits=limits) as client:
+        response = await client.post("/session/create",
+                                     data={"session_name": "SSE"})
+        session_id = response.headers["location"].rsplit("/", 1)[1]
+        for name in ("A", "B", "C"):
+            await client.post(f"/session/{session_id}/participant/add",
+                              data={"participant_name": name})
+        page = await client.get(f"/session/{session_id}")
+        ids = re.findall(r'id="beneficiary-([^"]+)"', page.text)
+
+        received = [dict() for _ in range(subscribers)]
+        own = {}
+        ready = asyncio.Event()
+        counter = [0]
+        tasks = [
+            asyncio.create_task(
+                subscriber(client, session_id, f"s{i}", received[i], ready,
+                           subscribers + 1, counter))
+            for i in range(subscribers)
+        ]
+        tasks.append(
+            asyncio.create_task(
+                subscriber(client, session_id, "sender", own, ready,
+                           subscribers + 1, counter)))
+        await asyncio.wait_for(ready.wait(), 60)
+        await asyncio.sleep(0.5)
+
+        sent = {}
+        for k in range(events):
+            sent[k] = time.perf_counter()
+            response = await client.post(
+                f"/session/{session_id}/expense/add?oob=1",
+                data={
+                    "title": f"Live {k}",
+                    "amount": "10,00",
+                    "expense_date": "2025-01-01",
+                    "payer_id": ids[k % len(ids)],
+                    "beneficiary_ids": ids,
+                },
+                headers={"X-Client-Id": "sender"})
+            response.raise_for_status()
+            await asyncio.sleep(0.05)
+
+        deadline = time.perf_counter() + 30
+        while time.perf_counter() < deadline and any(
+                len(r) < events for r in received):
+            await asyncio.sleep(0.1)
+        stats = (await client.get("/stats/cache")).json().get("broadcast")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    missing = sum(events - len(r) for r in received)
+    fan_out = [
+        max(r[k][0] for r in received if k in r) - sent[k]
+        for k in range(events) if all(k in r for r in received)
+    ]
+    print(f"subscribers: {subscribers}, events: {events}")
+    if fan_out:
+        print(f"time until all subscribers got an event: "
+              f"p50 {percentile(fan_out, 0.5) * 1000:.1f} ms, "
+              f"p95 {percentile(fan_out, 0.95) * 1000:.1f} ms")
+    print(f"missed deliveries: {missing}, echoed to sender: {len(own)}")
+    print(f"broadcaster: {stats}")
+    return missing == 0 and not own
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="")
+    parser.add_argument("--subscribers", type=int, default=200)
+    parser.add_argument("--events", type=int, default=20)
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "main:app", "--port",
+            str(port), "--log-level", "warning"
+        ], cwd=ROOT)
+    try:
+        asyncio.run(wait_ready(url))
+        ok = asyncio.run(run(url, args.subscribers, args.events))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
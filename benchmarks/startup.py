@@ -0,0 +1,194 @@
+"""Cold start of the app: import time, startup and first requests.
+
+Every run is a fresh interpreter. It imports main, enters the app
+lifespan, and then serves a first session page and a first PDF export
+over ASGI. Each phase is timed, together with the peak RSS after
+startup and which heavy optional modules (reportlab, numpy, PIL) are
+loaded by then. Two scenarios are measured: "lazy" (default, heavy
+modules load on first use) and "warm-up" (WARM_UP=1, templates, numpy
+and the PDF workers are prepared before the app accepts traffic).
+
+A separate run under python -X importtime lists the packages with the
+largest import cost. Results can be saved as a JSON baseline and later
+runs are compared against it, like benchmarks/suite.py:
+
+    python benchmarks/startup.py --save-baseline
+    python benchmarks/startup.py --repeat 9 --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "startup_baseline.json")
+HEAVY_MODULES = ("reportlab", "numpy", "PIL")
+METRICS = ("import_ms", "startup_ms", "first_page_ms", "first_pdf_ms",
+           "rss_mib")
+SCENARIOS = {"lazy": {"WARM_UP": "0"}, "warm-up": {"WARM_UP": "1"}}
+
+CHILD = """
+import asyncio, json, resource, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def run():
+    result = {"import_ms": (imported - started) * 1000}
+    before = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        result["startup_ms"] = (time.perf_counter() - before) * 1000
+        result["rss_mib"] = (
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+        result["loaded"] = [m for m in HEAVY if m in sys.modules]
+
+        import httpx
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://bench") as client:
+            response = await client.post("/session/create",
+                                         data={"session_name": "Start"})
+            session_id = response.headers["location"].rsplit("/", 1)[1]
+            for name in ("Ala", "Ola"):
+                await client.post(f"/session/{session_id}/participant/add",
+                                  data={"participant_name": name})
+            session = main.storage.get_session(session_id)
+            ids = [p.id for p in session.participants]
+            await client.post(f"/session/{session_id}/expense/add",
+                              data={"title": "Obiad", "amount": "12.50",
+                                    "expense_date": "2025-01-01",
+                                    "payer_id": ids[0],
+                                    "beneficiary_ids": ids})
+
+            before = time.perf_counter()
+            response = await client.get(f"/session/{session_id}")
+            response.raise_for_status()
+            result["first_page_ms"] = (time.perf_counter() - before) * 1000
+
+            before = time.perf_counter()
+            response = await client.get(f"/session/{session_id}/export/pdf")
+            response.raise_for_status()
+            result["first_pdf_ms"] = (time.perf_counter() - before) * 1000
+    print(json.dumps(result))
+
+asyncio.run(run())
+"""
+
+
+def run_child(env_overrides):
+    env = dict(os.environ, **env_overrides)
+    code = f"HEAVY = {HEAVY_MODULES!r}\n{CHILD}"
+    output = subprocess.run([sys.executable, "-c", code],
+                            cwd=ROOT,
+                            env=env,
+                            check=True,
+                            capture_output=True,
+                            text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(env_overrides, repeat: int):
+    runs = [run_child(env_overrides) for _ in range(repeat)]
+    result = {
+        metric: round(statistics.median(run[metric] for run in runs), 2)
+        for metric in METRICS
+    }
+    result["loaded"] = runs[-1]["loaded"]
+    return result
+
+
+def import_profile(top: int):
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True).stderr
+    by_package = defaultdict(int)
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        by_package[name.split(".")[0]] += int(own)
+        if name == "main":
+            total = int(cumulative)
+    ranked = sorted(by_package.items(), key=lambda item: -item[1])
+    return total / 1000, [(name, us / 1000) for name, us in ranked[:top]]
+
+
+def compare(baseline, results, tolerance: float) -> int:
+    regressions = 0
+    print(f"\ncompared with baseline from {baseline.get('created_at')} "
+          f"(tolerance {tolerance:.0%}):")
+    for scenario, result in results.items():
+        previous = baseline["scenarios"].get(scenario)
+        if previous is None:
+            continue
+        changes = []
+        for metric in METRICS:
+            before, now = previous[metric], result[metric]
+            change = (now - before) / before if before else 0.0
+            flag = ""
+            if change > tolerance:
+                flag = " REGRESSION"
+                regressions += 1
+            changes.append(f"{metric} {change:+7.1%}{flag}")
+        print(f"{scenario:8} " + "  ".join(changes))
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    total_ms, packages = import_profile(args.top)
+    print(f"import main: {total_ms:.1f} ms (python -X importtime)")
+    for name, ms in packages:
+        print(f"  {name:24} {ms:8.1f} ms")
+
+    results = {}
+    print(f"\nmedian of {args.repeat} fresh processes:")
+    for scenario, env in SCENARIOS.items():
+        result = results[scenario] = measure(env, args.repeat)
+        print(f"{scenario:8} import {result['import_ms']:7.1f} ms  "
+              f"startup {result['startup_ms']:7.1f} ms  "
+              f"first page {result['first_page_ms']:7.1f} ms  "
+              f"first pdf {result['first_pdf_ms']:7.1f} ms  "
+              f"rss {result['rss_mib']:6.1f} MiB  "
+              f"loaded: {', '.join(result['loaded']) or '-'}")
+
+    regressions = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "import_ms": round(total_ms, 2),
+                "scenarios": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline saved to {args.baseline}")
+
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
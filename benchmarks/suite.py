@@ -0,0 +1,292 @@
+"""Benchmark suite for the FastAPI app, driven in-process over ASGI.
+
+Builds a synthetic session through the app itself (participants via
+POST /participant/add, expenses via the bulk import endpoint) and then
+measures each scenario: session creation, add_participant, add_expense,
+view_session (warm and with caches cleared), CSV export and PDF export
+(both with caches cleared, so settlement and rendering are on the path).
+
+For every scenario it reports p50/p95/p99 latency, throughput and the
+peak traced Python memory of a separate short pass (PDF rendering runs
+in the worker pool, so its memory is not included). Results can be
+saved as a JSON baseline and later runs are compared against it:
+
+    python benchmarks/suite.py --save-baseline
+    python benchmarks/suite.py --fail-on-regression
+    python benchmarks/suite.py --participants 50 --expenses 10000 \\
+        --beneficiaries 10 --iterations 50 --baseline /tmp/large.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import re
+import resource
+import sys
+import time
+import tracemalloc
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import main  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+SCENARIOS = [
+    "create_session", "view_session", "view_session_cold", "export_csv",
+    "export_pdf", "add_expense", "add_participant"
+]
+
+
+def clear_caches():
+    main.settlement_cache.clear()
+    main.view_cache.clear()
+    main.page_cache.clear()
+    main.pdf_cache.clear()
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Suite:
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.session_id = ""
+        self.participant_ids = []
+        self.counter = 0
+
+    async def check(self, response: httpx.Response):
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f"{response.request.method} {response.request.url} -> "
+                f"{response.status_code}: {response.text[:200]}")
+
+    async def create_session(self) -> str:
+        response = await self.client.post("/session/create",
+                                          data={"session_name": "Benchmark"})
+        if response.status_code != 303:
+            raise RuntimeError(f"create_session -> {response.status_code}")
+        return response.headers["location"].rsplit("/", 1)[1]
+
+    async def build_session(self):
+        args = self.args
+        self.session_id = await self.create_session()
+        for i in range(args.participants):
+            await self.check(await self.client.post(
+                f"/session/{self.session_id}/participant/add",
+                data={"participant_name": f"Uczestnik {i}"}))
+
+        response = await self.client.get(f"/session/{self.session_id}")
+        self.participant_ids = re.findall(r'id="beneficiary-([^"]+)"',
+                                          response.text)
+
+        lines = ["title,amount_minor,date,payer,beneficiaries"]
+        for k in range(args.expenses):
+            lines.append(",".join([
+                f"Wydatek {k}",
+                str(self.rng.randint(100, 500000)),
+                f"2025-{self.rng.randint(1, 12):02d}-"
+                f"{self.rng.randint(1, 28):02d}",
+                self.rng.choice(self.participant_ids),
+                ";".join(self.beneficiaries()),
+            ]))
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        await self.check(await self.client.post(
+            f"/session/{self.session_id}/expenses/import",
+            files={"file": ("benchmark.csv", body, "text/csv")}))
+
+    def beneficiaries(self):
+        count = min(self.args.beneficiaries, len(self.participant_ids))
+        return self.rng.sample(self.participant_ids, count)
+
+    async def request(self, scenario: str):
+        sid = self.session_id
+        self.counter += 1
+        if scenario == "create_session":
+            await self.create_session()
+            return
+        if scenario == "view_session":
+            response = await self.client.get(f"/session/{sid}")
+        elif scenario == "view_session_cold":
+            clear_caches()
+            response = await self.client.get(f"/session/{sid}")
+        elif scenario == "export_csv":
+            clear_caches()
+            response = await self.client.get(f"/session/{sid}/export/csv")
+        elif scenario == "export_pdf":
+            clear_caches()
+            response = await self.client.get(f"/session/{sid}/export/pdf")
+        elif scenario == "add_expense":
+            response = await self.client.post(
+                f"/session/{sid}/expense/add?oob=1",
+                data={
+                    "title": f"Nowy wydatek {self.counter}",
+                    "amount": f"{self.rng.randint(1, 999)},"
+                    f"{self.counter % 100:02d}",
+                    "expense_date": "2025-06-01",
+                    "payer_id": self.rng.choice(self.participant_ids),
+                    "beneficiary_ids": self.beneficiaries(),
+                })
+        elif scenario == "add_participant":
+            response = await self.client.post(
+                f"/session/{sid}/participant/add",
+                data={"participant_name": f"Gość {self.counter}"})
+        else:
+            raise ValueError(scenario)
+        await self.check(response)
+
+    async def timed(self, scenario: str, iterations: int):
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        latencies = []
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                await self.request(scenario)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(iterations)))
+        return latencies, time.perf_counter() - started
+
+    async def measure(self, scenario: str):
+        iterations = self.args.iterations
+        if scenario == "export_pdf":
+            iterations = min(iterations, self.args.pdf_iterations)
+
+        await self.timed(scenario, self.args.warmup)
+        latencies, elapsed = await self.timed(scenario, iterations)
+
+        gc.collect()
+        tracemalloc.start()
+        await self.timed(scenario, self.args.memory_iterations)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 1),
+            "peak_kib": round(peak / 1024, 1),
+        }
+
+
+async def run(args):
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport,
+                                     base_url="http://benchmark",
+                                     timeout=120) as client:
+            suite = Suite(client, args)
+            await suite.build_session()
+            results = {}
+            for scenario in args.scenarios:
+                results[scenario] = await suite.measure(scenario)
+                print_row(scenario, results[scenario])
+    return results
+
+
+def print_row(scenario: str, result):
+    print(f"{scenario:18} p50 {result['p50_ms']:9.2f} ms  "
+          f"p95 {result['p95_ms']:9.2f} ms  p99 {result['p99_ms']:9.2f} ms  "
+          f"{result['throughput_rps']:8.1f} req/s  "
+          f"peak {result['peak_kib']:9.1f} KiB")
+
+
+def config_of(args):
+    return {
+        "participants": args.participants,
+        "expenses": args.expenses,
+        "beneficiaries": args.beneficiaries,
+        "iterations": args.iterations,
+        "pdf_iterations": args.pdf_iterations,
+        "concurrency": args.concurrency,
+        "seed": args.seed,
+    }
+
+
+def compare(baseline, results, tolerance: float) -> int:
+    regressions = 0
+    print(f"\ncompared with baseline from {baseline.get('created_at')} "
+          f"(tolerance {tolerance:.0%}):")
+    for scenario, result in results.items():
+        previous = baseline["scenarios"].get(scenario)
+        if previous is None:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms", "peak_kib"):
+            before, now = previous[metric], result[metric]
+            change = (now - before) / before if before else 0.0
+            flag = ""
+            if change > tolerance:
+                flag = " REGRESSION"
+                regressions += 1
+            changes.append(f"{metric} {change:+7.1%}{flag}")
+        print(f"{scenario:18} " + "  ".join(changes))
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=20)
+    parser.add_argument("--expenses", type=int, default=2000)
+    parser.add_argument("--beneficiaries", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--pdf-iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--memory-iterations", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS,
+                        default=SCENARIOS)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    print(f"session: {args.participants} participants, {args.expenses} "
+          f"expenses, {args.beneficiaries} beneficiaries per expense")
+    results = asyncio.run(run(args))
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"peak RSS of the benchmark process: {rss / 1024:.1f} MiB")
+
+    regressions = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config_of(args):
+            print("\nbaseline was recorded with a different configuration, "
+                  "skipping comparison")
+        else:
+            regressions = compare(baseline, results, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "config": config_of(args),
+                "scenarios": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline saved to {args.baseline}")
+
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,104 @@
+"""Balance-as-of-date and range totals: date index vs rescanning expenses.
+
+Builds a session whose expenses are spread over several years, checks
+that DateIndex answers match a full rescan, and times index build,
+single as-of and range queries, and the month-end report.
+
+    python benchmarks/timeline.py --expenses 100000 --participants 20 --days 1095
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models import Expense, Participant, Session  # noqa: E402
+from settlement import compute_balance_map_python  # noqa: E402
+from timeline import DateIndex, session_as_of  # noqa: E402
+
+START = date(2023, 1, 1)
+
+
+def build_session(participants: int, expenses: int, days: int,
+                  rng: random.Random) -> Session:
+    session = Session(name="Timeline")
+    session.participants = [
+        Participant(name=f"Uczestnik {i}") for i in range(participants)
+    ]
+    ids = [p.id for p in session.participants]
+    session.expenses = [
+        Expense(title=f"Wydatek {k}",
+                amount_minor=rng.randint(100, 100000),
+                date=START + timedelta(days=rng.randrange(days)),
+                payer_id=rng.choice(ids),
+                beneficiary_ids=rng.sample(ids, rng.randint(1, participants)))
+        for k in range(expenses)
+    ]
+    return session
+
+
+def per_call_ms(fn, calls):
+    started = time.perf_counter()
+    for args in calls:
+        fn(*args)
+    return (time.perf_counter() - started) * 1000 / len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--participants", type=int, default=20)
+    parser.add_argument("--expenses", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=22)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    session = build_session(args.participants, args.expenses, args.days, rng)
+    days = [START + timedelta(days=rng.randrange(args.days))
+            for _ in range(args.queries)]
+    ranges = [(day, day + timedelta(days=30)) for day in days]
+
+    started = time.perf_counter()
+    index = DateIndex(session)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    def rescan_as_of(day):
+        return compute_balance_map_python(session_as_of(session, day))
+
+    def rescan_range(start, end):
+        return sum(e.amount_minor for e in session.expenses
+                   if start <= e.date <= end)
+
+    for day, (start, end) in list(zip(days, ranges))[:10]:
+        assert index.balances_as_of(day) == rescan_as_of(day)
+        assert index.totals_between(start, end).total_minor == rescan_range(
+            start, end)
+
+    rescan_calls = [(day, ) for day in days[:max(1, args.queries // 20)]]
+    print(f"{args.expenses} expenses x {args.participants} participants over "
+          f"{args.days} days ({len(index.days)} distinct dates, "
+          f"stride {index.stride})")
+    print(f"index build:            {build_ms:10.1f} ms")
+    print(f"as-of (index):          "
+          f"{per_call_ms(index.balances_as_of, [(d, ) for d in days]):10.3f} ms")
+    print(f"as-of (rescan):         "
+          f"{per_call_ms(rescan_as_of, rescan_calls):10.3f} ms")
+    print(f"30-day range (index):   "
+          f"{per_call_ms(index.totals_between, ranges):10.3f} ms")
+    print(f"30-day range (rescan):  "
+          f"{per_call_ms(rescan_range, ranges[:len(rescan_calls)]):10.3f} ms")
+    month_ends = index.month_ends()
+    started = time.perf_counter()
+    for month_end in month_ends:
+        index.balances_as_of(month_end)
+    print(f"{len(month_ends)} month ends (index):"
+          f"{(time.perf_counter() - started) * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import asyncio
+import os
+from typing import Any, Dict, Optional, Set
+
+MAX_PENDING_EVENTS = int(os.environ.get("SSE_MAX_PENDING", "32"))
+HEARTBEAT_INTERVAL = float(os.environ.get("SSE_HEARTBEAT", "15"))
+
+
+def encode_event(event: str, data: str) -> bytes:
+    lines = [f"event: {event}"]
+    lines.extend(f"data: {line}" for line in data.splitlines() or [""])
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class Subscription:
+    def __init__(self, session_id: str, client_id: str, max_pending: int):
+        self.session_id = session_id
+        self.client_id = client_id
+        self.queue: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue(
+            maxsize=max_pending)
+    
+    async def next_message(self, timeout: float) -> Optional[bytes]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return b": ping\n\n"
+
+
+class Broadcaster:
+    def __init__(self, max_pending: int = 32):
+        self.max_pending = max_pending
+        self.channels: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.resynced = 0
+    
+    def subscribe(self, session_id: str, client_id: str = "") -> Subscription:
+        subscription = Subscription(session_id, client_id, self.max_pending)
+        self.channels.setdefault(session_id, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self.channels.get(subscription.session_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.channels[subscription.session_id]
+    
+    def has_subscribers(self, session_id: str,
+                        exclude: Optional[str] = None) -> bool:
+        return any(subscription.client_id != exclude or not exclude
+                   for subscription in self.channels.get(session_id, ()))
+    
+    def publish(self,
+                session_id: str,
+                event: str,
+                data: str,
+                exclude: Optional[str] = None) -> int:
+        subscribers = self.channels.get(session_id)
+        if not subscribers:
+            return 0
+        
+        message = encode_event(event, data)
+        self.published += 1
+        delivered = 0
+        for subscription in subscribers:
+            if exclude and subscription.client_id == exclude:
+                continue
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._resync(subscription)
+            delivered += 1
+        self.delivered += delivered
+        return delivered
+    
+    def close(self):
+        for subscribers in self.channels.values():
+            for subscription in subscribers:
+                self._drain(subscription)
+                subscription.queue.put_nowait(None)
+        self.channels.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.channels),
+            "subscribers": sum(len(s) for s in self.channels.values()),
+            "published": self.published,
+            "delivered": self.delivered,
+            "resynced": self.resynced,
+        }
+    
+    def _resync(self, subscription: Subscription):
+        self._drain(subscription)
+        subscription.queue.put_nowait(encode_event("reload", ""))
+        self.resynced += 1
+    
+    def _drain(self, subscription: Subscription):
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+
+
+broadcaster = Broadcaster(max_pending=MAX_PENDING_EVENTS)
@@ -0,0 +1,287 @@
+import csv
+import io
+import json
+import os
+import re
+from datetime import date
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from models import Session, Expense
+from utils import INT64_MAX, parse_currency
+
+MAX_IMPORT_ROWS = int(os.environ.get("IMPORT_MAX_ROWS", "100000"))
+MAX_REPORTED_ERRORS = int(os.environ.get("IMPORT_MAX_ERRORS", "100"))
+READ_CHUNK = 64 * 1024
+MAX_RECORD_SIZE = 64 * 1024
+
+FIELD_ALIASES = {
+    "title": "title",
+    "tytuł": "title",
+    "amount": "amount",
+    "kwota": "amount",
+    "amount_minor": "amount_minor",
+    "date": "date",
+    "data": "date",
+    "payer": "payer",
+    "payer_id": "payer",
+    "płatnik": "payer",
+    "beneficiaries": "beneficiaries",
+    "beneficiary_ids": "beneficiaries",
+    "beneficjenci": "beneficiaries",
+}
+
+
+class BulkImportError(Exception):
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors: List[Dict[str, Any]] = []
+    
+    def add_error(self, row: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "error_count": self.error_count,
+            "errors": self.errors,
+        }
+
+
+class ParticipantIndex:
+    def __init__(self, session: Session):
+        self.ids = {p.id for p in session.participants}
+        self.names: Dict[str, str] = {}
+        self.ambiguous = set()
+        for participant in session.participants:
+            if participant.name in self.names:
+                self.ambiguous.add(participant.name)
+            self.names[participant.name] = participant.id
+    
+    def resolve(self, reference: Any) -> str:
+        reference = str(reference).strip()
+        if reference in self.ids:
+            return reference
+        if reference in self.ambiguous:
+            raise ValueError(
+                f"Nazwa uczestnika '{reference}' jest niejednoznaczna, użyj id")
+        participant_id = self.names.get(reference)
+        if participant_id is None:
+            raise ValueError(f"Nieznany uczestnik: '{reference}'")
+        return participant_id
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str],
+                  explicit: Optional[str] = None) -> str:
+    if explicit:
+        if explicit not in ("csv", "json"):
+            raise BulkImportError("Obsługiwane formaty importu to csv i json")
+        return explicit
+    
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension in (".json", ".jsonl", ".ndjson"):
+        return "json"
+    if extension == ".csv":
+        return "csv"
+    if content_type and "json" in content_type:
+        return "json"
+    return "csv"
+
+
+def normalize_record(record: Dict[Any, Any]) -> Dict[str, Any]:
+    normalized = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        field = FIELD_ALIASES.get(str(key).strip().lower())
+        if field is not None:
+            normalized[field] = value
+    return normalized
+
+
+def iter_csv_records(stream: BinaryIO) -> Iterator[Dict[str, Any]]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.DictReader(text)
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise BulkImportError(f"Nieprawidłowy plik CSV: {e}")
+    finally:
+        text.detach()
+
+
+def iter_json_records(stream: BinaryIO) -> Iterator[Any]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    try:
+        buffer = text.read(READ_CHUNK).lstrip()
+        if buffer.startswith("["):
+            yield from _iter_json_array(text, buffer[1:])
+        else:
+            yield from _iter_json_lines(text, buffer)
+    except UnicodeDecodeError as e:
+        raise BulkImportError(f"Nieprawidłowy plik JSON: {e}")
+    finally:
+        text.detach()
+
+
+def _iter_json_array(text: io.TextIOWrapper, buffer: str) -> Iterator[Any]:
+    decoder = json.JSONDecoder()
+    eof = False
+    expect_value = True
+    while True:
+        buffer = buffer.lstrip()
+        if not expect_value and buffer.startswith(","):
+            buffer = buffer[1:].lstrip()
+            expect_value = True
+        if buffer.startswith("]"):
+            return
+        
+        if buffer and expect_value:
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise BulkImportError(f"Nieprawidłowy plik JSON: {e}")
+            except RecursionError:
+                raise BulkImportError(
+                    "Nieprawidłowy plik JSON: zbyt głębokie zagnieżdżenie")
+            else:
+                if end < len(buffer) or eof:
+                    yield record
+                    buffer = buffer[end:]
+                    expect_value = False
+                    continue
+        elif buffer:
+            raise BulkImportError(
+                "Nieprawidłowy plik JSON: oczekiwano ',' lub ']'")
+        
+        if eof:
+            raise BulkImportError("Nieprawidłowy plik JSON: brak ']'")
+        if len(buffer) > MAX_RECORD_SIZE:
+            raise BulkImportError("Rekord JSON jest zbyt duży")
+        
+        chunk = text.read(READ_CHUNK)
+        eof = not chunk
+        buffer += chunk
+
+
+def _iter_json_lines(text: io.TextIOWrapper, buffer: str) -> Iterator[Any]:
+    for line in _iter_lines(text, buffer):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise BulkImportError(f"Nieprawidłowy wiersz JSON: {e}")
+        except RecursionError:
+            raise BulkImportError(
+                "Nieprawidłowy wiersz JSON: zbyt głębokie zagnieżdżenie")
+
+
+def _iter_lines(text: io.TextIOWrapper, buffer: str) -> Iterator[str]:
+    while True:
+        lines = buffer.split("\n")
+        buffer = lines.pop()
+        yield from lines
+        if len(buffer) > MAX_RECORD_SIZE:
+            raise BulkImportError("Rekord JSON jest zbyt duży")
+        
+        chunk = text.read(READ_CHUNK)
+        if not chunk:
+            break
+        buffer += chunk
+    yield buffer
+
+
+def _split_references(value: Any) -> List[Any]:
+    if isinstance(value, list):
+        return value
+    if value is None:
+        return []
+    return [part for part in re.split(r"[;,]", str(value)) if part.strip()]
+
+
+def _parse_amount(record: Dict[str, Any]) -> int:
+    if record.get("amount_minor") not in (None, ""):
+        value = record["amount_minor"]
+        if isinstance(value, bool) or not str(value).strip().isdigit():
+            raise ValueError("Nieprawidłowa kwota w groszach")
+        amount_minor = int(str(value).strip())
+        if amount_minor > INT64_MAX:
+            raise ValueError("Kwota jest zbyt duża")
+        return amount_minor
+    
+    amount = record.get("amount")
+    if amount in (None, ""):
+        raise ValueError("Brak kwoty")
+    return parse_currency(str(amount))
+
+
+def parse_record(record: Any, index: ParticipantIndex) -> Expense:
+    if not isinstance(record, dict):
+        raise ValueError("Rekord musi być obiektem")
+    record = normalize_record(record)
+    
+    amount_minor = _parse_amount(record)
+    if amount_minor <= 0:
+        raise ValueError("Kwota musi być większa od 0")
+    
+    try:
+        parsed_date = date.fromisoformat(str(record.get("date") or "").strip())
+    except ValueError:
+        raise ValueError("Nieprawidłowa data")
+    
+    if record.get("payer") in (None, ""):
+        raise ValueError("Brak płatnika")
+    payer_id = index.resolve(record["payer"])
+    
+    beneficiary_ids = [
+        index.resolve(reference)
+        for reference in _split_references(record.get("beneficiaries"))
+    ]
+    
+    try:
+        return Expense(title=str(record.get("title") or ""),
+                       amount_minor=amount_minor,
+                       date=parsed_date,
+                       payer_id=payer_id,
+                       beneficiary_ids=beneficiary_ids)
+    except ValidationError as e:
+        message = e.errors()[0]["msg"]
+        raise ValueError(message.removeprefix("Value error, "))
+
+
+def read_expenses(stream: BinaryIO, fmt: str,
+                  index: ParticipantIndex) -> Tuple[List[Expense], ImportReport]:
+    records = iter_csv_records(stream) if fmt == "csv" else iter_json_records(
+        stream)
+    
+    expenses: List[Expense] = []
+    report = ImportReport()
+    for row, record in enumerate(records, start=1):
+        if row > MAX_IMPORT_ROWS:
+            raise BulkImportError(
+                f"Plik zawiera więcej niż {MAX_IMPORT_ROWS} wierszy")
+        report.rows = row
+        
+        try:
+            expense = parse_record(record, index)
+        except ValueError as e:
+            report.add_error(row, str(e))
+            expenses.clear()
+            continue
+        
+        if not report.error_count:
+            expenses.append(expense)
+    
+    return expenses, report
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.entries: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self.groups: Dict[Hashable, Set[Tuple]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, key: Tuple) -> Optional[Any]:
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def put(self, key: Tuple, value: Any):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        self.entries[key] = value
+        self.groups.setdefault(key[0], set()).add(key)
+        
+        while len(self.entries) > self.maxsize:
+            old_key, _ = self.entries.popitem(last=False)
+            self._forget(old_key)
+            self.evictions += 1
+    
+    def get_or_create(self, key: Tuple, factory: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+    
+    def invalidate(self, group: Hashable):
+        for key in self.groups.pop(group, ()):
+            if self.entries.pop(key, None) is not None:
+                self.invalidations += 1
+    
+    def clear(self):
+        self.entries.clear()
+        self.groups.clear()
+    
+    def _forget(self, key: Tuple):
+        keys = self.groups.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.groups[key[0]]
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,392 @@
+from datetime import date, datetime
+from typing import List, NamedTuple, Sequence
+from uuid import uuid4
+
+from models import Session, Participant, Expense
+from utils import INT64_MAX
+
+MAGIC = b"MSPL"
+FORMAT_VERSION = 1
+MEDIA_TYPE = "application/vnd.moneysplitter.session"
+
+IDS_UUID = 0
+IDS_TEXT = 1
+UINTS_BYTES = 0
+UINTS_VARINT = 1
+EXPENSE_FIELDS = frozenset(Expense.model_fields)
+
+
+class CodecError(ValueError):
+    pass
+
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _write_uints(out: bytearray, values: Sequence[int]):
+    if not values or max(values) < 256:
+        out.append(UINTS_BYTES)
+        _write_varint(out, len(values))
+        out += bytes(values)
+        return
+    out.append(UINTS_VARINT)
+    _write_varint(out, len(values))
+    for value in values:
+        while value > 0x7F:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+
+def _write_text(out: bytearray, value: str):
+    data = value.encode("utf-8")
+    _write_varint(out, len(data))
+    out += data
+
+
+def _write_texts(out: bytearray, values: Sequence[str]):
+    blobs = [value.encode("utf-8") for value in values]
+    _write_uints(out, [len(blob) for blob in blobs])
+    out += b"".join(blobs)
+
+
+def _format_uuids(hexed: str) -> List[str]:
+    return [
+        f"{hexed[i:i + 8]}-{hexed[i + 8:i + 12]}-{hexed[i + 12:i + 16]}-"
+        f"{hexed[i + 16:i + 20]}-{hexed[i + 20:i + 32]}"
+        for i in range(0, len(hexed), 32)
+    ]
+
+
+def _canonical_uuid(value: str) -> bool:
+    return (len(value) == 36 and value[8] == value[13] == value[18] ==
+            value[23] == "-")
+
+
+def _write_ids(out: bytearray, ids: Sequence[str]):
+    packed = "".join(ids).replace("-", "")
+    raw = b""
+    if len(packed) == 32 * len(ids) and all(map(_canonical_uuid, ids)):
+        try:
+            raw = bytes.fromhex(packed)
+        except ValueError:
+            pass
+    if len(raw) == 16 * len(ids) and raw.hex() == packed:
+        out.append(IDS_UUID)
+        _write_varint(out, len(ids))
+        out += raw
+    else:
+        out.append(IDS_TEXT)
+        _write_texts(out, ids)
+
+
+def encode_session(session: Session) -> bytes:
+    out = bytearray(MAGIC)
+    out.append(FORMAT_VERSION)
+    out.append(1 if session.read_only else 0)
+    _write_varint(out, session.version)
+    _write_ids(out, [session.id])
+    _write_text(out, session.name)
+    _write_text(out, session.created_at.isoformat())
+    
+    participant_ids = [p.id for p in session.participants]
+    index = {pid: i for i, pid in enumerate(participant_ids)}
+    _write_ids(out, participant_ids)
+    _write_texts(out, [p.name for p in session.participants])
+    
+    expenses = session.expenses
+    try:
+        payers = [index[e.payer_id] for e in expenses]
+        beneficiaries = [
+            index[bid] for e in expenses for bid in e.beneficiary_ids
+        ]
+    except KeyError as e:
+        raise CodecError(f"Unknown participant id {e.args[0]}")
+    
+    previous_day = 0
+    day_deltas = []
+    for expense in expenses:
+        day = expense.date.toordinal()
+        day_deltas.append(_zigzag(day - previous_day))
+        previous_day = day
+    
+    _write_ids(out, [e.id for e in expenses])
+    _write_texts(out, [e.title for e in expenses])
+    _write_uints(out, [
+        e.amount_minor << 1 if e.amount_minor >= 0 else
+        ((-e.amount_minor) << 1) - 1 for e in expenses
+    ])
+    _write_uints(out, day_deltas)
+    _write_uints(out, payers)
+    _write_uints(out, [len(e.beneficiary_ids) for e in expenses])
+    _write_uints(out, beneficiaries)
+    return bytes(out)
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+    
+    def take(self, size: int) -> bytes:
+        end = self.pos + size
+        if end > len(self.data):
+            raise CodecError("Truncated session data")
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return chunk
+    
+    def byte(self) -> int:
+        return self.take(1)[0]
+    
+    def varint(self) -> int:
+        data = self.data
+        result = 0
+        shift = 0
+        pos = self.pos
+        while True:
+            if pos >= len(data):
+                raise CodecError("Truncated session data")
+            value = data[pos]
+            pos += 1
+            result |= (value & 0x7F) << shift
+            if value < 0x80:
+                break
+            shift += 7
+        self.pos = pos
+        return result
+    
+    def uints(self) -> List[int]:
+        mode = self.byte()
+        count = self.varint()
+        if mode == UINTS_BYTES:
+            return list(self.take(count))
+        if mode != UINTS_VARINT:
+            raise CodecError(f"Unknown integer column mode {mode}")
+        
+        data = self.data
+        pos = self.pos
+        values = []
+        append = values.append
+        for _ in range(count):
+            result = 0
+            shift = 0
+            while True:
+                if pos >= len(data):
+                    raise CodecError("Truncated session data")
+                value = data[pos]
+                pos += 1
+                result |= (value & 0x7F) << shift
+                if value < 0x80:
+                    break
+                shift += 7
+            append(result)
+        self.pos = pos
+        return values
+    
+    def text(self) -> str:
+        return self.take(self.varint()).decode("utf-8")
+    
+    def texts(self) -> List[str]:
+        lengths = self.uints()
+        blob = self.take(sum(lengths))
+        values = []
+        offset = 0
+        for length in lengths:
+            values.append(blob[offset:offset + length].decode("utf-8"))
+            offset += length
+        return values
+    
+    def skip_texts(self):
+        self.take(sum(self.uints()))
+    
+    def skip_ids(self):
+        mode = self.byte()
+        if mode == IDS_TEXT:
+            self.skip_texts()
+        else:
+            self.take(self.varint() * 16)
+    
+    def ids(self) -> List[str]:
+        mode = self.byte()
+        if mode == IDS_TEXT:
+            return self.texts()
+        if mode != IDS_UUID:
+            raise CodecError(f"Unknown id column mode {mode}")
+        
+        count = self.varint()
+        return _format_uuids(self.take(count * 16).hex())
+
+
+def _construct_expense(values: dict) -> Expense:
+    expense = Expense.__new__(Expense)
+    object.__setattr__(expense, "__dict__", values)
+    object.__setattr__(expense, "__pydantic_fields_set__", set(EXPENSE_FIELDS))
+    object.__setattr__(expense, "__pydantic_extra__", None)
+    object.__setattr__(expense, "__pydantic_private__", None)
+    return expense
+
+
+def _check_length(name: str, values: Sequence, expected: int):
+    if len(values) != expected:
+        raise CodecError(f"Column {name} has {len(values)} entries, "
+                         f"expected {expected}")
+
+
+class SessionColumns(NamedTuple):
+    id: str
+    name: str
+    created_at: datetime
+    read_only: bool
+    version: int
+    participant_ids: List[str]
+    participant_names: List[str]
+    expense_ids: List[str]
+    titles: List[str]
+    amounts: List[int]
+    days: List[int]
+    payers: List[int]
+    beneficiary_counts: List[int]
+    beneficiaries: List[int]
+
+
+def decode_columns(data: bytes, details: bool = True) -> SessionColumns:
+    reader = _Reader(data)
+    if reader.take(len(MAGIC)) != MAGIC:
+        raise CodecError("Not a session snapshot")
+    format_version = reader.byte()
+    if format_version != FORMAT_VERSION:
+        raise CodecError(f"Unsupported format version {format_version}")
+    
+    read_only = bool(reader.byte())
+    version = reader.varint()
+    session_ids = reader.ids()
+    if len(session_ids) != 1:
+        raise CodecError("Corrupt session data: expected one session id")
+    session_id = session_ids[0]
+    name = reader.text()
+    created_at = datetime.fromisoformat(reader.text())
+    
+    participant_ids = reader.ids()
+    participant_names = reader.texts()
+    _check_length("participant names", participant_names,
+                  len(participant_ids))
+    
+    if details:
+        expense_ids = reader.ids()
+        titles = reader.texts()
+    else:
+        expense_ids = titles = []
+        reader.skip_ids()
+        reader.skip_texts()
+    amounts = reader.uints()
+    count = len(amounts)
+    day_deltas = reader.uints()
+    payers = reader.uints()
+    beneficiary_counts = reader.uints()
+    beneficiaries = reader.uints()
+    if details:
+        _check_length("expense ids", expense_ids, count)
+        _check_length("titles", titles, count)
+    for column, values in (("dates", day_deltas), ("payers", payers),
+                           ("beneficiary counts", beneficiary_counts)):
+        _check_length(column, values, count)
+    _check_length("beneficiaries", beneficiaries, sum(beneficiary_counts))
+    if reader.pos != len(data):
+        raise CodecError("Trailing bytes after session data")
+    if count and max(max(payers), max(beneficiaries, default=0)) >= len(
+            participant_ids):
+        raise CodecError("Corrupt session data: participant index out of range")
+    
+    days = []
+    day = 0
+    for delta in day_deltas:
+        day += _unzigzag(delta)
+        days.append(day)
+    
+    return SessionColumns(session_id, name, created_at, read_only, version,
+                          participant_ids, participant_names, expense_ids,
+                          titles, [
+                              amount >> 1 if not amount & 1 else
+                              -((amount + 1) >> 1) for amount in amounts
+                          ],
+                          days, payers, beneficiary_counts, beneficiaries)
+
+
+def decode_session(data: bytes) -> Session:
+    columns = decode_columns(data)
+    participant_ids = columns.participant_ids
+    participants = [
+        Participant.model_construct(id=pid, name=pname)
+        for pid, pname in zip(participant_ids, columns.participant_names)
+    ]
+    
+    try:
+        expenses = []
+        offset = 0
+        beneficiaries = columns.beneficiaries
+        for i, count in enumerate(columns.beneficiary_counts):
+            stop = offset + count
+            expenses.append(
+                _construct_expense({
+                    "id": columns.expense_ids[i],
+                    "title": columns.titles[i],
+                    "amount_minor": columns.amounts[i],
+                    "date": date.fromordinal(columns.days[i]),
+                    "payer_id": participant_ids[columns.payers[i]],
+                    "beneficiary_ids":
+                    [participant_ids[b] for b in beneficiaries[offset:stop]]
+                }))
+            offset = stop
+    except (ValueError, OverflowError) as e:
+        raise CodecError(f"Corrupt session data: {e}")
+    
+    return Session.model_construct(id=columns.id,
+                                   name=columns.name,
+                                   created_at=columns.created_at,
+                                   read_only=columns.read_only,
+                                   version=columns.version,
+                                   participants=participants,
+                                   expenses=expenses)
+
+
+def restore_session(data: bytes, binary: bool) -> Session:
+    if binary:
+        session = Session.model_validate(decode_session(data).model_dump())
+    else:
+        session = Session.model_validate_json(data)
+    
+    participant_ids = {p.id: str(uuid4()) for p in session.participants}
+    if len(participant_ids) != len(session.participants):
+        raise CodecError("Powtórzony identyfikator uczestnika")
+    for expense in session.expenses:
+        if (expense.payer_id not in participant_ids
+                or not participant_ids.keys() >= set(expense.beneficiary_ids)):
+            raise CodecError(
+                f"Wydatek '{expense.title}' odwołuje się do nieznanego uczestnika")
+        if not 0 < expense.amount_minor <= INT64_MAX:
+            raise CodecError(f"Kwota wydatku '{expense.title}' jest zbyt duża")
+    
+    for participant in session.participants:
+        participant.id = participant_ids[participant.id]
+    for expense in session.expenses:
+        expense.id = str(uuid4())
+        expense.payer_id = participant_ids[expense.payer_id]
+        expense.beneficiary_ids = [
+            participant_ids[bid] for bid in expense.beneficiary_ids
+        ]
+    session.id = str(uuid4())
+    session.version = 0
+    return session
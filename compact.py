@@ -0,0 +1,164 @@
+import sys
+from array import array
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from models import Session, Participant, Expense
+
+UUID_SIZE = 16
+EMPTY_UUID = bytes(UUID_SIZE)
+
+
+def _uuid_bytes(value: str) -> Optional[bytes]:
+    try:
+        parsed = UUID(value)
+    except ValueError:
+        return None
+    if str(parsed) != value:
+        return None
+    return parsed.bytes
+
+
+class CompactSession:
+    def __init__(self, session_id: str, name: str, created_at: datetime,
+                 read_only: bool, version: int):
+        self.id = session_id
+        self.name = name
+        self.created_at = created_at
+        self.read_only = read_only
+        self.version = version
+        self.ledger: Optional[Any] = None
+        self._reset()
+
+    def _reset(self):
+        self.participant_ids: List[str] = []
+        self.participant_names: List[str] = []
+        self.participant_index: Dict[str, int] = {}
+
+        self.expense_ids = bytearray()
+        self.odd_expense_ids: Dict[int, str] = {}
+        self.titles = bytearray()
+        self.title_offsets = array('q', [0])
+        self.amounts = array('q')
+        self.days = array('i')
+        self.payers = array('i')
+        self.beneficiary_offsets = array('q', [0])
+        self.beneficiaries = array('i')
+
+    @classmethod
+    def from_session(cls, session: Session) -> "CompactSession":
+        compact = cls(session.id, session.name, session.created_at,
+                      session.read_only, session.version)
+        compact.sync(session)
+        return compact
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def add_participant(self, participant: Participant):
+        self.participant_index[participant.id] = len(self.participant_ids)
+        self.participant_ids.append(participant.id)
+        self.participant_names.append(participant.name)
+
+    def add_expense(self, expense: Expense):
+        position = len(self.amounts)
+        raw_id = _uuid_bytes(expense.id)
+        if raw_id is None:
+            self.odd_expense_ids[position] = expense.id
+            raw_id = EMPTY_UUID
+        self.expense_ids += raw_id
+
+        self.titles += expense.title.encode('utf-8')
+        self.title_offsets.append(len(self.titles))
+        self.amounts.append(expense.amount_minor)
+        self.days.append(expense.date.toordinal())
+        self.payers.append(self.participant_index[expense.payer_id])
+        self.beneficiaries.extend(self.participant_index[bid]
+                                  for bid in expense.beneficiary_ids)
+        self.beneficiary_offsets.append(len(self.beneficiaries))
+
+    def expense_id(self, i: int) -> str:
+        odd = self.odd_expense_ids.get(i)
+        if odd is not None:
+            return odd
+        offset = i * UUID_SIZE
+        return str(UUID(bytes=bytes(self.expense_ids[offset:offset +
+                                                     UUID_SIZE])))
+
+    def expense(self, i: int) -> Expense:
+        if i < 0:
+            i += len(self.amounts)
+        ids = self.participant_ids
+        title = self.titles[self.title_offsets[i]:self.title_offsets[i + 1]]
+        start = self.beneficiary_offsets[i]
+        stop = self.beneficiary_offsets[i + 1]
+        return Expense.model_construct(
+            id=self.expense_id(i),
+            title=title.decode('utf-8'),
+            amount_minor=self.amounts[i],
+            date=date.fromordinal(self.days[i]),
+            payer_id=ids[self.payers[i]],
+            beneficiary_ids=[ids[b] for b in self.beneficiaries[start:stop]])
+
+    def iter_expenses(self,
+                      start: int = 0,
+                      stop: Optional[int] = None) -> Iterator[Expense]:
+        if stop is None or stop > len(self.amounts):
+            stop = len(self.amounts)
+        for i in range(start, stop):
+            yield self.expense(i)
+
+    def is_stale(self, session: Session) -> bool:
+        if len(session.participants) < len(self.participant_ids):
+            return True
+        if len(session.expenses) < len(self.amounts):
+            return True
+        if not self.amounts:
+            return False
+        last = len(self.amounts) - 1
+        return session.expenses[last].id != self.expense_id(last)
+
+    def sync(self, session: Session):
+        self.name = session.name
+        self.read_only = session.read_only
+        self.version = session.version
+        self.ledger = session._ledger
+
+        if self.is_stale(session):
+            self._reset()
+
+        for participant in session.participants[len(self.participant_ids):]:
+            self.add_participant(participant)
+
+        for expense in session.expenses[len(self.amounts):]:
+            self.add_expense(expense)
+
+    def to_session(self) -> Session:
+        session = Session.model_construct(
+            id=self.id,
+            name=self.name,
+            created_at=self.created_at,
+            read_only=self.read_only,
+            version=self.version,
+            participants=[
+                Participant.model_construct(id=pid, name=name) for pid, name
+                in zip(self.participant_ids, self.participant_names)
+            ],
+            expenses=list(self.iter_expenses()))
+        session._ledger = self.ledger
+        return session
+
+    def nbytes(self) -> int:
+        size = sys.getsizeof(self)
+        size += sum(
+            sys.getsizeof(value) for value in (
+                self.participant_ids, self.participant_names,
+                self.participant_index, self.expense_ids,
+                self.odd_expense_ids, self.titles, self.title_offsets,
+                self.amounts, self.days, self.payers,
+                self.beneficiary_offsets, self.beneficiaries))
+        size += sum(sys.getsizeof(v) for v in self.participant_ids)
+        size += sum(sys.getsizeof(v) for v in self.participant_names)
+        size += sum(sys.getsizeof(v) for v in self.odd_expense_ids.values())
+        return size
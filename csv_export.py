@@ -0,0 +1,118 @@
+import csv
+import io
+from typing import Iterable, Iterator, List
+
+from models import Session, Settlement
+from utils import format_currency
+
+CHUNK_ROWS = 500
+
+
+class CsvChunker:
+    def __init__(self, encoding: str = "utf-8"):
+        self.encoding = encoding
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+    
+    def writerow(self, row: List):
+        self.writer.writerow(row)
+    
+    def flush(self) -> bytes:
+        data = self.buffer.getvalue().encode(self.encoding)
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+    
+    def rows(self, rows: Iterable[List]) -> Iterator[bytes]:
+        for i, row in enumerate(rows, start=1):
+            self.writer.writerow(row)
+            if i % CHUNK_ROWS == 0:
+                yield self.flush()
+
+
+def iter_csv(session: Session, settlement: Settlement) -> Iterator[bytes]:
+    chunker = CsvChunker()
+    participant_map = {p.id: p.name for p in session.participants}
+    
+    chunker.writerow(["Where is my money? - Eksport sesji"])
+    chunker.writerow([f"Sesja: {session.name}"])
+    chunker.writerow(
+        [f"Data utworzenia: {session.created_at.strftime('%Y-%m-%d %H:%M')}"])
+    chunker.writerow([])
+    yield "\ufeff".encode("utf-8") + chunker.flush()
+    
+    chunker.writerow(["UCZESTNICY"])
+    chunker.writerow(["Imię"])
+    yield from chunker.rows([p.name] for p in session.participants)
+    chunker.writerow([])
+    yield chunker.flush()
+    
+    chunker.writerow(["WYDATKI"])
+    chunker.writerow(["Data", "Tytuł", "Kwota", "Płatnik", "Beneficjenci"])
+    yield from chunker.rows([
+        expense.date.strftime('%Y-%m-%d'), expense.title,
+        format_currency(expense.amount_minor),
+        participant_map[expense.payer_id],
+        ", ".join([participant_map[bid] for bid in expense.beneficiary_ids])
+    ] for expense in session.expenses)
+    chunker.writerow([])
+    yield chunker.flush()
+    
+    chunker.writerow(["ROZLICZENIE - SALDA"])
+    chunker.writerow(["Uczestnik", "Saldo"])
+    yield from chunker.rows(
+        [balance.participant_name,
+         format_currency(balance.balance_minor)]
+        for balance in settlement.balances)
+    chunker.writerow([])
+    yield chunker.flush()
+    
+    chunker.writerow(["ROZLICZENIE - PŁATNOŚCI"])
+    chunker.writerow(["Od", "Do", "Kwota"])
+    yield from chunker.rows([
+        payment.from_participant_name, payment.to_participant_name,
+        format_currency(payment.amount_minor)
+    ] for payment in settlement.payments)
+    yield chunker.flush()
+
+
+def iter_raw_csv(session: Session, settlement: Settlement) -> Iterator[bytes]:
+    chunker = CsvChunker()
+    
+    chunker.writerow(["record", "session_id", "name", "created_at"])
+    chunker.writerow([
+        "session", session.id, session.name,
+        session.created_at.isoformat()
+    ])
+    yield chunker.flush()
+    
+    chunker.writerow(["record", "participant_id", "name"])
+    yield from chunker.rows(["participant", p.id, p.name]
+                            for p in session.participants)
+    yield chunker.flush()
+    
+    chunker.writerow([
+        "record", "expense_id", "date", "title", "amount_minor", "payer_id",
+        "beneficiary_ids"
+    ])
+    yield from chunker.rows([
+        "expense", expense.id,
+        expense.date.isoformat(), expense.title, expense.amount_minor,
+        expense.payer_id, ";".join(expense.beneficiary_ids)
+    ] for expense in session.expenses)
+    yield chunker.flush()
+    
+    chunker.writerow(["record", "participant_id", "balance_minor"])
+    yield from chunker.rows(
+        ["balance", balance.participant_id, balance.balance_minor]
+        for balance in settlement.balances)
+    yield chunker.flush()
+    
+    chunker.writerow([
+        "record", "from_participant_id", "to_participant_id", "amount_minor"
+    ])
+    yield from chunker.rows([
+        "payment", payment.from_participant_id, payment.to_participant_id,
+        payment.amount_minor
+    ] for payment in settlement.payments)
+    yield chunker.flush()
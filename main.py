@@ -1,34 +1,137 @@
-from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
+import asyncio
+import os
+
+from fastapi import FastAPI, Request, Form, HTTPException, File, UploadFile
+from fastapi.responses import HTMLResponse, StreamingResponse, RedirectResponse, Response, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from datetime import date, datetime
-from typing import List
-import csv
-import io
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from typing import Callable, List, Optional
+from contextlib import asynccontextmanager
+
+from models import (Session, Participant, Expense, BatchSettlementRequest,
+                    ArchiveExportRequest)
+from storage import storage, VersionConflictError
+from settlement import (get_settlement_async, settlement_cache, load_numpy,
+                        settlement_from_balances_async, ENGINES)
+from batch_settlement import batch_settler
+from timeline import get_date_index, session_as_of, timeline_cache
+from utils import parse_currency
+from rendering import renderer, page_cache, page_etag, etag_matches
+from session_view import (get_session_view, view_cache, EXPENSE_PAGE_SIZE,
+                          MAX_EXPENSE_PAGE_SIZE)
+from csv_export import iter_csv, iter_raw_csv
+from bulk_import import (BulkImportError, ParticipantIndex, detect_format,
+                         read_expenses)
+from pdf_export import (pdf_cache, pdf_document_data, pdf_renderer,
+                        PdfQueueFullError, PdfTimeoutError)
+from broadcast import broadcaster, HEARTBEAT_INTERVAL
+from archive_export import ARCHIVE_FORMATS, archive_exporter
+from codec import MEDIA_TYPE, encode_session, restore_session
+from admission import AdmissionMiddleware, flights, limiters
+from metrics import (MetricsMiddleware, PROFILE_ENABLED, profiler,
+                     render_metrics, timed, timed_iter)
+
+
+SWEEP_INTERVAL = float(os.environ.get("SWEEP_INTERVAL", "60"))
+WARM_UP = os.environ.get("WARM_UP", "0") == "1"
+
+
+async def sweep_sessions():
+    while True:
+        await asyncio.sleep(SWEEP_INTERVAL)
+        storage.sweep()
+        await storage.snapshot_if_due()
+
+
+async def warm_up():
+    await asyncio.to_thread(renderer.precompile)
+    await asyncio.to_thread(load_numpy)
+    await pdf_renderer.warm_up()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    pdf_renderer.start()
+    if WARM_UP:
+        await warm_up()
+    if PROFILE_ENABLED:
+        profiler.attach(app)
+        profiler.start()
+    sweeper = asyncio.create_task(sweep_sessions())
+    yield
+    broadcaster.close()
+    sweeper.cancel()
+    await storage.flush()
+    profiler.stop()
+    pdf_renderer.shutdown()
+    batch_settler.shutdown()
+
+
+app = FastAPI(title="Where is my money?", lifespan=lifespan)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+def invalidate_caches(session_id: str):
+    settlement_cache.invalidate(session_id)
+    pdf_cache.invalidate(session_id)
+    view_cache.invalidate(session_id)
+    page_cache.invalidate(session_id)
+    timeline_cache.invalidate(session_id)
+
+
+storage.subscribe(lambda session: invalidate_caches(session.id))
+storage.on_evict(invalidate_caches)
+
+MAX_UPDATE_ATTEMPTS = 5
+
+
+async def get_session_or_404(session_id: str) -> Session:
+    with timed("storage_get"):
+        session = await storage.load_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404,
+                            detail="Sesja nie została znaleziona")
+    return session
+
+
+async def mutate_session(session_id: str,
+                         mutate: Callable[[Session], None]) -> Session:
+    async with storage.session_lock(session_id):
+        for _ in range(MAX_UPDATE_ATTEMPTS):
+            session = await get_session_or_404(session_id)
+            expected_version = session.version
+            with timed("validation"):
+                mutate(session)
+            try:
+                with timed("storage_update"):
+                    return storage.update_session(
+                        session, expected_version=expected_version)
+            except VersionConflictError:
+                continue
 
-from models import Session, Participant, Expense
-from storage import storage
-from settlement import calculate_settlement
-from utils import format_currency, parse_currency, format_currency_input
+    raise HTTPException(
+        status_code=409,
+        detail="Sesja została zmieniona w tym samym czasie, spróbuj ponownie")
 
-app = FastAPI(title="Where is my money?")
-templates = Jinja2Templates(directory="templates")
 
-templates.env.filters['format_currency'] = format_currency
-templates.env.filters['format_currency_input'] = format_currency_input
+def client_id(request: Request) -> str:
+    return request.headers.get("x-client-id", "")
+
+
+def publish_update(request: Request, session: Session, template: str,
+                   **context):
+    sender = client_id(request)
+    if not broadcaster.has_subscribers(session.id, exclude=sender):
+        return
+
+    html = renderer.render(template, session=session, oob=True, **context)
+    broadcaster.publish(session.id, "update", html, exclude=sender)
 
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
-    return templates.TemplateResponse("home.html", {"request": request})
+    return HTMLResponse(renderer.render("home.html", request=request))
 
 
 @app.post("/session/create")
@@ -40,60 +143,88 @@ async def create_session(session_name: str = Form(...)):
 
 @app.get("/session/{session_id}", response_class=HTMLResponse)
 async def view_session(request: Request, session_id: str):
-    session = storage.get_session(session_id)
-    if not session:
-        raise HTTPException(status_code=404,
-                            detail="Sesja nie została znaleziona")
+    session = await get_session_or_404(session_id)
 
-    settlement = calculate_settlement(session)
+    etag = page_etag(session.id, session.version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
 
-    return templates.TemplateResponse("session.html", {
-        "request": request,
-        "session": session,
-        "settlement": settlement
-    })
+    settlement = await get_settlement_async(session)
+
+    def render_page() -> str:
+        return renderer.render("session.html",
+                               request=request,
+                               session=session,
+                               settlement=settlement,
+                               view=get_session_view(session, settlement))
+
+    content = page_cache.get_or_create(
+        (session.id, session.version, str(request.url)), render_page)
+
+    return HTMLResponse(content=content, headers=headers)
+
+
+@app.get("/session/{session_id}/expenses", response_class=HTMLResponse)
+async def list_expenses(request: Request,
+                        session_id: str,
+                        before: Optional[int] = None,
+                        limit: int = EXPENSE_PAGE_SIZE):
+    session = await get_session_or_404(session_id)
+
+    settlement = await get_settlement_async(session)
+    view = get_session_view(session, settlement)
+    limit = max(1, min(limit, MAX_EXPENSE_PAGE_SIZE))
+
+    return HTMLResponse(
+        renderer.render("partials/expense_rows.html",
+                        request=request,
+                        session=session,
+                        page=view.expense_page(session.expenses, before,
+                                               limit)))
 
 
 @app.post("/session/{session_id}/participant/add")
 async def add_participant(request: Request,
                           session_id: str,
                           participant_name: str = Form(...)):
-    session = storage.get_session(session_id)
-    if not session:
-        raise HTTPException(status_code=404,
-                            detail="Sesja nie została znaleziona")
-
-    if session.read_only:
-        raise HTTPException(status_code=403,
-                            detail="Sesja jest tylko do odczytu")
+    def append_participant(session: Session):
+        if session.read_only:
+            raise HTTPException(status_code=403,
+                                detail="Sesja jest tylko do odczytu")
 
-    try:
-        participant = Participant(name=participant_name)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        try:
+            participant = Participant(name=participant_name)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    session.participants.append(participant)
-    storage.update_session(session)
+        session.participants.append(participant)
 
-    settlement = calculate_settlement(session)
+    session = await mutate_session(session_id, append_participant)
 
-    participants_html = templates.get_template(
-        "partials/participants_list.html").render(request=request,
-                                                  session=session,
-                                                  settlement=settlement)
+    settlement = await get_settlement_async(session)
+    view = get_session_view(session, settlement)
 
-    expense_form_html = templates.get_template(
-        "partials/expense_form.html").render(request=request,
-                                             session=session,
-                                             settlement=settlement)
+    participants_html = renderer.render("partials/participants_list.html",
+                                        request=request,
+                                        session=session,
+                                        settlement=settlement,
+                                        view=view)
 
-    expense_form_oob = expense_form_html.replace(
-        '<div id="expense-form-section">',
-        '<div id="expense-form-section" hx-swap-oob="true">', 1)
+    expense_form_html = renderer.render("partials/expense_form.html",
+                                        request=request,
+                                        session=session,
+                                        settlement=settlement,
+                                        view=view,
+                                        oob=True)
 
-    combined_html = participants_html + expense_form_oob
+    publish_update(request,
+                   session,
+                   "partials/participant_added.html",
+                   settlement=settlement,
+                   view=view)
 
-    return HTMLResponse(content=combined_html)
+    return HTMLResponse(content=participants_html + expense_form_html)
 
 
 @app.post("/session/{session_id}/expense/add")
@@ -103,316 +234,407 @@ async def add_expense(request: Request,
                       amount: str = Form(...),
                       expense_date: str = Form(...),
                       payer_id: str = Form(...),
-                      beneficiary_ids: List[str] = Form(...)):
-    session = storage.get_session(session_id)
-    if not session:
-        raise HTTPException(status_code=404,
-                            detail="Sesja nie została znaleziona")
+                      beneficiary_ids: List[str] = Form(...),
+                      oob: bool = False):
+    def append_expense(session: Session):
+        if session.read_only:
+            raise HTTPException(status_code=403,
+                                detail="Sesja jest tylko do odczytu")
+
+        try:
+            amount_minor = parse_currency(amount)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        if amount_minor <= 0:
+            raise HTTPException(status_code=400,
+                                detail="Kwota musi być większa od 0")
+
+        participant_ids = {p.id for p in session.participants}
+        if payer_id not in participant_ids:
+            raise HTTPException(status_code=400,
+                                detail="Płatnik musi być uczestnikiem sesji")
+
+        for bid in beneficiary_ids:
+            if bid not in participant_ids:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Wszyscy beneficjenci muszą być uczestnikami sesji")
+
+        try:
+            parsed_date = date.fromisoformat(expense_date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Nieprawidłowa data")
+
+        try:
+            expense = Expense(title=title,
+                              amount_minor=amount_minor,
+                              date=parsed_date,
+                              payer_id=payer_id,
+                              beneficiary_ids=beneficiary_ids)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        session.expenses.append(expense)
+
+    session = await mutate_session(session_id, append_expense)
+
+    settlement = await get_settlement_async(session)
+    view = get_session_view(session, settlement)
+    expense_row = view.expense_row(session.expenses[-1])
+
+    if oob:
+        html = renderer.render("partials/expense_added.html",
+                               session=session,
+                               settlement=settlement,
+                               view=view,
+                               expense=expense_row,
+                               oob=True)
+        broadcaster.publish(session.id,
+                            "update",
+                            html,
+                            exclude=client_id(request))
+        return HTMLResponse(html)
+
+    publish_update(request,
+                   session,
+                   "partials/expense_added.html",
+                   settlement=settlement,
+                   view=view,
+                   expense=expense_row)
+
+    return HTMLResponse(
+        renderer.render("partials/expenses_and_settlement.html",
+                        request=request,
+                        session=session,
+                        settlement=settlement,
+                        view=view))
+
+
+@app.post("/session/{session_id}/expenses/import")
+async def import_expenses(session_id: str,
+                          file: UploadFile = File(...),
+                          format: Optional[str] = Form(None)):
+    session = await get_session_or_404(session_id)
 
     if session.read_only:
         raise HTTPException(status_code=403,
                             detail="Sesja jest tylko do odczytu")
 
     try:
-        amount_minor = parse_currency(amount)
-    except ValueError as e:
+        fmt = detect_format(file.filename, file.content_type, format)
+        expenses, report = await asyncio.to_thread(read_expenses, file.file,
+                                                   fmt,
+                                                   ParticipantIndex(session))
+    except BulkImportError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    if amount_minor <= 0:
-        raise HTTPException(status_code=400,
-                            detail="Kwota musi być większa od 0")
+    if report.error_count:
+        return JSONResponse(status_code=422, content=report.to_dict())
+
+    def append_expenses(session: Session):
+        if session.read_only:
+            raise HTTPException(status_code=403,
+                                detail="Sesja jest tylko do odczytu")
+
+        session.expenses.extend(expenses)
+
+    session = await mutate_session(session_id, append_expenses)
+
+    await get_settlement_async(session)
+    report.imported = len(expenses)
+    broadcaster.publish(session.id, "reload", "")
+
+    return report.to_dict()
+
+
+@app.post("/session/{session_id}/toggle-readonly")
+async def toggle_readonly(request: Request, session_id: str):
+    def toggle(session: Session):
+        session.read_only = not session.read_only
+
+    session = await mutate_session(session_id, toggle)
+    broadcaster.publish(session.id,
+                        "reload",
+                        "",
+                        exclude=client_id(request))
+
+    return {"read_only": session.read_only}
+
+
+@app.get("/session/{session_id}/events")
+async def session_events(session_id: str, client: str = ""):
+    await get_session_or_404(session_id)
+
+    subscription = broadcaster.subscribe(session_id, client)
+
+    async def stream():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                message = await subscription.next_message(HEARTBEAT_INTERVAL)
+                if message is None:
+                    break
+                yield message
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(stream(),
+                             media_type="text/event-stream",
+                             headers={
+                                 "Cache-Control": "no-cache",
+                                 "X-Accel-Buffering": "no"
+                             })
+
+
+@app.get("/stats/cache")
+async def cache_stats():
+    return {
+        "settlement": settlement_cache.stats(),
+        "pdf": pdf_cache.stats(),
+        "view": view_cache.stats(),
+        "page": page_cache.stats(),
+        "pdf_renderer": pdf_renderer.stats(),
+        "storage": storage.stats(),
+        "broadcast": broadcaster.stats(),
+        "timeline": timeline_cache.stats(),
+        "batch_settlement": batch_settler.stats(),
+        "archive": archive_exporter.stats(),
+        "coalescing": flights.stats(),
+        "admission": {
+            name: limiter.stats()
+            for name, limiter in limiters.items()
+        },
+    }
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(),
+                             media_type="text/plain; version=0.0.4")
+
+
+@app.get("/debug/profile")
+async def profile(route: Optional[str] = None):
+    if not PROFILE_ENABLED:
+        raise HTTPException(status_code=404,
+                            detail="Profiler jest wyłączony (PROFILE_SAMPLING=1)")
+
+    return PlainTextResponse(profiler.collapsed(route))
 
-    participant_ids = {p.id for p in session.participants}
-    if payer_id not in participant_ids:
+
+@app.get("/session/{session_id}/snapshot")
+async def session_snapshot(request: Request,
+                           session_id: str,
+                           format: Optional[str] = None):
+    session = await get_session_or_404(session_id)
+
+    if format is None:
+        format = ("binary" if MEDIA_TYPE in request.headers.get(
+            "accept", "") else "json")
+    if format == "json":
+        return Response(session.model_dump_json(),
+                        media_type="application/json")
+    if format != "binary":
         raise HTTPException(status_code=400,
-                            detail="Płatnik musi być uczestnikiem sesji")
+                            detail="Nieznany format (json lub binary)")
 
-    for bid in beneficiary_ids:
-        if bid not in participant_ids:
-            raise HTTPException(
-                status_code=400,
-                detail="Wszyscy beneficjenci muszą być uczestnikami sesji")
+    with timed("encode"):
+        content = encode_session(session)
+    return Response(content,
+                    media_type=MEDIA_TYPE,
+                    headers={"ETag": f'"{session.id}-{session.version}"'})
 
-    try:
-        parsed_date = date.fromisoformat(expense_date)
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Nieprawidłowa data")
+
+@app.post("/session/restore")
+async def restore_snapshot(request: Request):
+    binary = request.headers.get("content-type", "").startswith(MEDIA_TYPE)
+    data = await request.body()
 
     try:
-        expense = Expense(title=title,
-                          amount_minor=amount_minor,
-                          date=parsed_date,
-                          payer_id=payer_id,
-                          beneficiary_ids=beneficiary_ids)
-    except Exception as e:
+        with timed("decode"):
+            session = restore_session(data, binary)
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    session.expenses.append(expense)
-    storage.update_session(session)
+    storage.create_session(session)
+    return {"id": session.id, "url": f"/session/{session.id}"}
+
+
+@app.get("/session/{session_id}/balances")
+async def balances_as_of(session_id: str, as_of: Optional[date] = None):
+    session = await get_session_or_404(session_id)
+
+    index = get_date_index(session)
+    settlement = await settlement_from_balances_async(
+        index.balances_as_of(as_of), session.participants)
+
+    return {
+        "as_of": as_of.isoformat() if as_of else None,
+        "expense_count": index.expense_count_as_of(as_of),
+        **settlement.model_dump(),
+    }
+
+
+@app.get("/session/{session_id}/balances/monthly")
+async def monthly_balances(session_id: str):
+    session = await get_session_or_404(session_id)
+
+    index = get_date_index(session)
+    months = []
+    for month_end in index.month_ends():
+        settlement = await settlement_from_balances_async(
+            index.balances_as_of(month_end), session.participants)
+        months.append({
+            "month": month_end.strftime("%Y-%m"),
+            "as_of": month_end.isoformat(),
+            "expense_count": index.expense_count_as_of(month_end),
+            **settlement.model_dump(),
+        })
 
-    settlement = calculate_settlement(session)
+    return {"months": months}
 
-    return templates.TemplateResponse("partials/expenses_and_settlement.html",
-                                      {
-                                          "request": request,
-                                          "session": session,
-                                          "settlement": settlement
-                                      })
 
+@app.get("/session/{session_id}/totals")
+async def range_totals(session_id: str,
+                       start: Optional[date] = None,
+                       end: Optional[date] = None):
+    session = await get_session_or_404(session_id)
 
-@app.post("/session/{session_id}/toggle-readonly")
-async def toggle_readonly(session_id: str):
-    session = storage.get_session(session_id)
-    if not session:
-        raise HTTPException(status_code=404,
-                            detail="Sesja nie została znaleziona")
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400,
+                            detail="Data początkowa jest późniejsza niż końcowa")
 
-    session.read_only = not session.read_only
-    storage.update_session(session)
+    return get_date_index(session).totals_between(start, end).to_dict()
+
+
+@app.post("/settlements/batch")
+async def batch_settlement(batch: BatchSettlementRequest):
+    if batch.engine is not None and batch.engine not in ENGINES:
+        raise HTTPException(status_code=400,
+                            detail=f"Nieznany algorytm rozliczeń: {batch.engine}")
+
+    def load(session_id: str):
+        return storage.load_session(session_id, admit=False)
+
+    return StreamingResponse(batch_settler.stream(batch.session_ids, load,
+                                                  batch.engine,
+                                                  storage.worker_source()),
+                             media_type="application/x-ndjson")
 
-    return {"read_only": session.read_only}
+
+async def settlement_as_of(session: Session, as_of: Optional[date]):
+    if as_of is None:
+        return session, await get_settlement_async(session)
+
+    balances = get_date_index(session).balances_as_of(as_of)
+    snapshot = session_as_of(session, as_of)
+    return snapshot, await settlement_from_balances_async(
+        balances, session.participants)
+
+
+async def export_snapshot(session: Session, as_of: Optional[date]):
+    frozen = session.model_copy(
+        update={
+            "participants": list(session.participants),
+            "expenses": list(session.expenses),
+        })
+    return await settlement_as_of(frozen, as_of)
 
 
 @app.get("/session/{session_id}/export/csv")
-async def export_csv(session_id: str):
-    session = storage.get_session(session_id)
-    if not session:
-        raise HTTPException(status_code=404,
-                            detail="Sesja nie została znaleziona")
+async def export_csv(session_id: str,
+                     raw: bool = False,
+                     as_of: Optional[date] = None):
+    session = await get_session_or_404(session_id)
+
+    session, settlement = await export_snapshot(session, as_of)
+    suffix = f"_{as_of.isoformat()}" if as_of else ""
 
-    settlement = calculate_settlement(session)
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    writer.writerow(["Where is my money? - Eksport sesji"])
-    writer.writerow([f"Sesja: {session.name}"])
-    writer.writerow(
-        [f"Data utworzenia: {session.created_at.strftime('%Y-%m-%d %H:%M')}"])
-    writer.writerow([])
-
-    writer.writerow(["UCZESTNICY"])
-    writer.writerow(["Imię"])
-    for participant in session.participants:
-        writer.writerow([participant.name])
-    writer.writerow([])
-
-    writer.writerow(["WYDATKI"])
-    writer.writerow(["Data", "Tytuł", "Kwota", "Płatnik", "Beneficjenci"])
-
-    participant_map = {p.id: p.name for p in session.participants}
-
-    for expense in session.expenses:
-        beneficiaries_names = ", ".join(
-            [participant_map[bid] for bid in expense.beneficiary_ids])
-        writer.writerow([
-            expense.date.strftime('%Y-%m-%d'), expense.title,
-            format_currency(expense.amount_minor),
-            participant_map[expense.payer_id], beneficiaries_names
-        ])
-    writer.writerow([])
-
-    writer.writerow(["ROZLICZENIE - SALDA"])
-    writer.writerow(["Uczestnik", "Saldo"])
-    for balance in settlement.balances:
-        writer.writerow(
-            [balance.participant_name,
-             format_currency(balance.balance_minor)])
-    writer.writerow([])
-
-    writer.writerow(["ROZLICZENIE - PŁATNOŚCI"])
-    writer.writerow(["Od", "Do", "Kwota"])
-    for payment in settlement.payments:
-        writer.writerow([
-            payment.from_participant_name, payment.to_participant_name,
-            format_currency(payment.amount_minor)
-        ])
-
-    output.seek(0)
+    if raw:
+        content = iter_raw_csv(session, settlement)
+        filename = f"rozliczenie_{session.name.replace(' ', '_')}{suffix}_raw.csv"
+    else:
+        content = iter_csv(session, settlement)
+        filename = f"rozliczenie_{session.name.replace(' ', '_')}{suffix}.csv"
 
     return StreamingResponse(
-        io.BytesIO(output.getvalue().encode('utf-8-sig')),
+        timed_iter("csv", content),
         media_type="text/csv",
-        headers={
-            "Content-Disposition":
-            f"attachment; filename=rozliczenie_{session.name.replace(' ', '_')}.csv"
-        })
+        headers={"Content-Disposition": f"attachment; filename={filename}"})
 
 
-@app.get("/session/{session_id}/export/pdf")
-async def export_pdf(session_id: str):
-    session = storage.get_session(session_id)
-    if not session:
-        raise HTTPException(status_code=404,
-                            detail="Sesja nie została znaleziona")
+async def render_session_pdf(session: Session,
+                             as_of: Optional[date] = None) -> bytes:
+    key = (session.id, session.version, as_of)
+    pdf = pdf_cache.get(key)
+    if pdf is not None:
+        return pdf
 
-    settlement = calculate_settlement(session)
+    async def render() -> bytes:
+        snapshot, settlement = await export_snapshot(session, as_of)
+        pdf = await pdf_renderer.render(pdf_document_data(snapshot, settlement))
+        pdf_cache.put(key, pdf)
+        return pdf
 
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    elements = []
+    return await flights.do(("pdf", ) + key, render)
 
-    try:
-        pdfmetrics.registerFont(
-            TTFont('DejaVuSans',
-                   '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'))
-        pdfmetrics.registerFont(
-            TTFont('DejaVuSans-Bold',
-                   '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'))
-        font_name = 'DejaVuSans'
-        font_name_bold = 'DejaVuSans-Bold'
-    except:
-        font_name = 'Helvetica'
-        font_name_bold = 'Helvetica-Bold'
-
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        fontName=font_name_bold,
-        textColor=colors.HexColor('#1f2937'),
-        spaceAfter=12,
-    )
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        fontName=font_name_bold,
-        textColor=colors.HexColor('#374151'),
-        spaceAfter=10,
-        spaceBefore=14,
-    )
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontName=font_name,
-    )
-
-    elements.append(Paragraph("Where is my money?", title_style))
-    elements.append(Paragraph(f"Sesja: {session.name}", normal_style))
-    elements.append(
-        Paragraph(
-            f"Data utworzenia: {session.created_at.strftime('%Y-%m-%d %H:%M')}",
-            normal_style))
-    elements.append(Spacer(1, 0.5 * cm))
-
-    elements.append(Paragraph("Uczestnicy", heading_style))
-    participant_data = [["Imię"]]
-    for participant in session.participants:
-        participant_data.append([participant.name])
-
-    participant_table = Table(participant_data, colWidths=[15 * cm])
-    participant_table.setStyle(
-        TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1f2937')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), font_name_bold),
-            ('FONTNAME', (0, 1), (-1, -1), font_name),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('TOPPADDING', (0, 0), (-1, 0), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-        ]))
-    elements.append(participant_table)
-    elements.append(Spacer(1, 0.5 * cm))
-
-    elements.append(Paragraph("Wydatki", heading_style))
-    participant_map = {p.id: p.name for p in session.participants}
-
-    expense_data = [["Data", "Tytuł", "Kwota", "Płatnik", "Beneficjenci"]]
-    for expense in session.expenses:
-        beneficiaries_names = ", ".join(
-            [participant_map[bid] for bid in expense.beneficiary_ids])
-        expense_data.append([
-            expense.date.strftime('%Y-%m-%d'), expense.title,
-            format_currency(expense.amount_minor),
-            participant_map[expense.payer_id], beneficiaries_names
-        ])
-
-    expense_table = Table(
-        expense_data, colWidths=[2.5 * cm, 4 * cm, 2.5 * cm, 3 * cm, 3 * cm])
-    expense_table.setStyle(
-        TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1f2937')),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), font_name_bold),
-            ('FONTNAME', (0, 1), (-1, -1), font_name),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('TOPPADDING', (0, 0), (-1, 0), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-        ]))
-    elements.append(expense_table)
-    elements.append(Spacer(1, 0.5 * cm))
-
-    elements.append(Paragraph("Rozliczenie - Salda", heading_style))
-    balance_data = [["Uczestnik", "Saldo"]]
-    for balance in settlement.balances:
-        balance_data.append(
-            [balance.participant_name,
-             format_currency(balance.balance_minor)])
-
-    balance_table = Table(balance_data, colWidths=[10 * cm, 5 * cm])
-    balance_table.setStyle(
-        TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1f2937')),
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), font_name_bold),
-            ('FONTNAME', (0, 1), (-1, -1), font_name),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('TOPPADDING', (0, 0), (-1, 0), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-        ]))
-    elements.append(balance_table)
-    elements.append(Spacer(1, 0.5 * cm))
-
-    elements.append(Paragraph("Rozliczenie - Płatności", heading_style))
-    payment_data = [["Od", "Do", "Kwota"]]
-    for payment in settlement.payments:
-        payment_data.append([
-            payment.from_participant_name, payment.to_participant_name,
-            format_currency(payment.amount_minor)
-        ])
-
-    if len(payment_data) == 1:
-        payment_data.append(["Brak płatności do wykonania", "", ""])
-
-    payment_table = Table(payment_data, colWidths=[5 * cm, 5 * cm, 5 * cm])
-    payment_table.setStyle(
-        TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1f2937')),
-            ('ALIGN', (0, 0), (1, -1), 'LEFT'),
-            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), font_name_bold),
-            ('FONTNAME', (0, 1), (-1, -1), font_name),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            ('TOPPADDING', (0, 0), (-1, 0), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-        ]))
-    elements.append(payment_table)
-
-    doc.build(elements)
-    buffer.seek(0)
 
-    return StreamingResponse(
-        buffer,
+@app.get("/session/{session_id}/export/pdf")
+async def export_pdf(session_id: str, as_of: Optional[date] = None):
+    session = await get_session_or_404(session_id)
+
+    try:
+        pdf = await render_session_pdf(session, as_of)
+    except PdfQueueFullError:
+        raise HTTPException(status_code=503,
+                            detail="Zbyt wiele eksportów PDF, spróbuj za chwilę",
+                            headers={"Retry-After": "5"})
+    except PdfTimeoutError:
+        raise HTTPException(status_code=504,
+                            detail="Generowanie PDF trwało zbyt długo")
+
+    suffix = f"_{as_of.isoformat()}" if as_of else ""
+    return Response(
+        content=pdf,
         media_type="application/pdf",
         headers={
             "Content-Disposition":
-            f"attachment; filename=rozliczenie_{session.name.replace(' ', '_')}.pdf"
+            f"attachment; filename=rozliczenie_{session.name.replace(' ', '_')}{suffix}.pdf"
         })
 
 
+@app.post("/sessions/export/archive")
+async def export_archive(export: ArchiveExportRequest):
+    unknown = set(export.formats) - set(ARCHIVE_FORMATS)
+    if unknown or not export.formats:
+        raise HTTPException(status_code=400,
+                            detail="Nieznany format eksportu: "
+                            f"{', '.join(sorted(unknown))}")
+
+    as_of = export.as_of
+    iter_content = iter_raw_csv if export.raw else iter_csv
+
+    async def csv_content(session: Session):
+        return iter_content(*await export_snapshot(session, as_of))
+
+    def render_pdf(session: Session):
+        return render_session_pdf(session, as_of)
+
+    def load(session_id: str):
+        return storage.load_session(session_id, admit=False)
+
+    suffix = f"_{as_of.isoformat()}" if as_of else ""
+    filename = f"rozliczenia_{date.today().isoformat()}{suffix}.zip"
+    return StreamingResponse(
+        archive_exporter.stream(
+            export.session_ids, load,
+            csv_content if "csv" in export.formats else None,
+            render_pdf if "pdf" in export.formats else None, suffix),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=5000)
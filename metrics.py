@@ -0,0 +1,251 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILE_ENABLED = os.environ.get("PROFILE_SAMPLING", "0") == "1"
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_timings", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self.series: Dict[Tuple[str, ...], List[Any]] = {}
+        self.lock = threading.Lock()
+    
+    def observe(self, value: float, *label_values: str):
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [
+                    [0] * len(self.buckets), 0.0, 0
+                ]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def expose(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self.lock:
+            snapshot = [(key, list(counts), total, count)
+                        for key, (counts, total, count) in self.series.items()]
+        for label_values, counts, total, count in sorted(snapshot):
+            labels = ",".join(
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.labels, label_values))
+            prefix = labels + "," if labels else ""
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} '
+                             f"{bucket_count}")
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+stage_seconds = Histogram("moneysplitter_stage_seconds",
+                          "Time spent in instrumented hot-path stages.",
+                          ("stage", ))
+request_seconds = Histogram("moneysplitter_request_seconds",
+                            "HTTP request latency by route.",
+                            ("method", "route", "status"))
+
+
+def observe_stage(stage: str, seconds: float):
+    stage_seconds.observe(seconds, stage)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def timed_iter(stage: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    elapsed = 0.0
+    iterator = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            break
+        finally:
+            elapsed += time.perf_counter() - started
+        yield chunk
+    stage_seconds.observe(elapsed, stage)
+
+
+def render_metrics() -> str:
+    lines = stage_seconds.expose() + request_seconds.expose()
+    return "\n".join(lines) + "\n"
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    entries = [
+        f"{stage};dur={seconds * 1000:.2f}"
+        for stage, seconds in timings.items()
+    ]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        timings: Dict[str, float] = {}
+        token = request_timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+        
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing(timings,
+                                       time.perf_counter() - started)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1"))
+                ]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_timings.reset(token)
+            route = scope.get("route")
+            request_seconds.observe(time.perf_counter() - started,
+                                    scope["method"],
+                                    getattr(route, "path", "unmatched"),
+                                    str(status))
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, output_dir: str = "profiles"):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.routes: Dict[Any, str] = {}
+        self.samples: Dict[str, Counter] = {}
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+    
+    def attach(self, app):
+        for route in app.routes:
+            endpoint = getattr(route, "endpoint", None)
+            code = getattr(endpoint, "__code__", None)
+            if code is not None:
+                methods = ",".join(sorted(getattr(route, "methods", None) or []))
+                self.routes[code] = f"{methods} {route.path}".strip()
+    
+    def start(self):
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run,
+                                       name="sampling-profiler",
+                                       daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+        self.dump()
+    
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self._sample(frame)
+    
+    def _sample(self, frame):
+        stack = []
+        route = None
+        in_app = False
+        while frame is not None:
+            code = frame.f_code
+            if route is None:
+                route = self.routes.get(code)
+            if os.path.dirname(code.co_filename) == ROOT:
+                in_app = True
+            stack.append(f"{code.co_name} "
+                         f"({os.path.basename(code.co_filename)}"
+                         f":{code.co_firstlineno})")
+            frame = frame.f_back
+        if not in_app:
+            return
+        stack.reverse()
+        with self.lock:
+            self.samples.setdefault(route or "unattributed",
+                                    Counter())[";".join(stack)] += 1
+    
+    def collapsed(self, route: Optional[str] = None) -> str:
+        with self.lock:
+            snapshot = {
+                name: stacks.most_common()
+                for name, stacks in self.samples.items()
+            }
+        lines = []
+        for name, stacks in sorted(snapshot.items()):
+            if route is not None and name != route:
+                continue
+            for stack, count in stacks:
+                lines.append(f"{name};{stack} {count}")
+        return "\n".join(lines) + "\n" if lines else ""
+    
+    def dump(self):
+        if not self.samples:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        for name in list(self.samples):
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_")
+            path = os.path.join(self.output_dir, f"{slug or 'root'}.folded")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.collapsed(name))
+
+
+profiler = SamplingProfiler(PROFILE_INTERVAL, PROFILE_DIR)
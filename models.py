@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
+from typing import Any, List, Optional
 from datetime import datetime, date
 from uuid import uuid4
 
@@ -51,8 +51,10 @@ class Session(BaseModel):
     name: str
     created_at: datetime = Field(default_factory=datetime.now)
     read_only: bool = False
+    version: int = 0
     participants: List[Participant] = Field(default_factory=list)
     expenses: List[Expense] = Field(default_factory=list)
+    _ledger: Optional[Any] = PrivateAttr(default=None)
     
     @field_validator('name')
     @classmethod
@@ -79,3 +81,15 @@ class Payment(BaseModel):
 class Settlement(BaseModel):
     balances: List[Balance]
     payments: List[Payment]
+
+
+class BatchSettlementRequest(BaseModel):
+    session_ids: List[str] = Field(default_factory=list)
+    engine: Optional[str] = None
+
+
+class ArchiveExportRequest(BaseModel):
+    session_ids: List[str] = Field(default_factory=list)
+    formats: List[str] = Field(default_factory=lambda: ["csv", "pdf"])
+    raw: bool = False
+    as_of: Optional[date] = None
@@ -0,0 +1,293 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from cache import LRUCache
+from metrics import timed
+from models import Session, Settlement
+from utils import format_currencies
+
+FONT_PATH = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+FONT_BOLD_PATH = '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
+
+
+class PdfQueueFullError(Exception):
+    pass
+
+
+class PdfTimeoutError(Exception):
+    pass
+
+
+def register_fonts():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    try:
+        pdfmetrics.registerFont(TTFont('DejaVuSans', FONT_PATH))
+        pdfmetrics.registerFont(TTFont('DejaVuSans-Bold', FONT_BOLD_PATH))
+        return 'DejaVuSans', 'DejaVuSans-Bold'
+    except Exception:
+        return 'Helvetica', 'Helvetica-Bold'
+
+
+def table_style(font_name: str, font_name_bold: str, header_size: int,
+                alignment: List[tuple], body_size: Optional[int] = None):
+    from reportlab.lib import colors
+    from reportlab.platypus import TableStyle
+
+    commands = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#1f2937')),
+        *alignment,
+        ('FONTNAME', (0, 0), (-1, 0), font_name_bold),
+        ('FONTNAME', (0, 1), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, 0), header_size),
+    ]
+    if body_size is not None:
+        commands.append(('FONTSIZE', (0, 1), (-1, -1), body_size))
+    commands += [
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('TOPPADDING', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
+    ]
+    return TableStyle(commands)
+
+
+@lru_cache(maxsize=None)
+def get_pdf_resources() -> Dict[str, Any]:
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+    font_name, font_name_bold = register_fonts()
+
+    styles = getSampleStyleSheet()
+    return {
+        "title":
+        ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=18,
+            fontName=font_name_bold,
+            textColor=colors.HexColor('#1f2937'),
+            spaceAfter=12,
+        ),
+        "heading":
+        ParagraphStyle(
+            'CustomHeading',
+            parent=styles['Heading2'],
+            fontSize=14,
+            fontName=font_name_bold,
+            textColor=colors.HexColor('#374151'),
+            spaceAfter=10,
+            spaceBefore=14,
+        ),
+        "normal":
+        ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontName=font_name,
+        ),
+        "participants":
+        table_style(font_name, font_name_bold, 11,
+                    [('ALIGN', (0, 0), (-1, -1), 'LEFT')]),
+        "expenses":
+        table_style(font_name, font_name_bold, 10, [
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+        ], 9),
+        "balances":
+        table_style(font_name, font_name_bold, 11, [
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ]),
+        "payments":
+        table_style(font_name, font_name_bold, 11, [
+            ('ALIGN', (0, 0), (1, -1), 'LEFT'),
+            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+        ]),
+    }
+
+
+def pdf_document_data(session: Session,
+                      settlement: Settlement) -> Dict[str, Any]:
+    participant_map = {p.id: p.name for p in session.participants}
+
+    expense_rows = []
+    amounts = format_currencies(e.amount_minor for e in session.expenses)
+    for expense, amount in zip(session.expenses, amounts):
+        beneficiaries_names = ", ".join(
+            [participant_map[bid] for bid in expense.beneficiary_ids])
+        expense_rows.append([
+            expense.date.strftime('%Y-%m-%d'), expense.title, amount,
+            participant_map[expense.payer_id], beneficiaries_names
+        ])
+
+    balance_amounts = format_currencies(b.balance_minor
+                                        for b in settlement.balances)
+    payment_amounts = format_currencies(p.amount_minor
+                                        for p in settlement.payments)
+
+    return {
+        "name":
+        session.name,
+        "created_at":
+        session.created_at.strftime('%Y-%m-%d %H:%M'),
+        "participants": [[p.name] for p in session.participants],
+        "expenses":
+        expense_rows,
+        "balances":
+        [[b.participant_name, amount]
+         for b, amount in zip(settlement.balances, balance_amounts)],
+        "payments": [[
+            p.from_participant_name, p.to_participant_name, amount
+        ] for p, amount in zip(settlement.payments, payment_amounts)],
+    }
+
+
+def render_pdf(data: Dict[str, Any]) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
+
+    resources = get_pdf_resources()
+    title_style = resources["title"]
+    heading_style = resources["heading"]
+    normal_style = resources["normal"]
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    elements = []
+
+    elements.append(Paragraph("Where is my money?", title_style))
+    elements.append(Paragraph(f"Sesja: {data['name']}", normal_style))
+    elements.append(
+        Paragraph(f"Data utworzenia: {data['created_at']}", normal_style))
+    elements.append(Spacer(1, 0.5 * cm))
+
+    elements.append(Paragraph("Uczestnicy", heading_style))
+    participant_data = [["Imię"]] + data["participants"]
+
+    participant_table = Table(participant_data, colWidths=[15 * cm])
+    participant_table.setStyle(resources["participants"])
+    elements.append(participant_table)
+    elements.append(Spacer(1, 0.5 * cm))
+
+    elements.append(Paragraph("Wydatki", heading_style))
+    expense_data = [["Data", "Tytuł", "Kwota", "Płatnik", "Beneficjenci"]
+                    ] + data["expenses"]
+
+    expense_table = Table(
+        expense_data, colWidths=[2.5 * cm, 4 * cm, 2.5 * cm, 3 * cm, 3 * cm])
+    expense_table.setStyle(resources["expenses"])
+    elements.append(expense_table)
+    elements.append(Spacer(1, 0.5 * cm))
+
+    elements.append(Paragraph("Rozliczenie - Salda", heading_style))
+    balance_data = [["Uczestnik", "Saldo"]] + data["balances"]
+
+    balance_table = Table(balance_data, colWidths=[10 * cm, 5 * cm])
+    balance_table.setStyle(resources["balances"])
+    elements.append(balance_table)
+    elements.append(Spacer(1, 0.5 * cm))
+
+    elements.append(Paragraph("Rozliczenie - Płatności", heading_style))
+    payment_data = [["Od", "Do", "Kwota"]] + data["payments"]
+
+    if len(payment_data) == 1:
+        payment_data.append(["Brak płatności do wykonania", "", ""])
+
+    payment_table = Table(payment_data, colWidths=[5 * cm, 5 * cm, 5 * cm])
+    payment_table.setStyle(resources["payments"])
+    elements.append(payment_table)
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+def _warm_up_worker():
+    get_pdf_resources()
+
+
+class PdfRenderer:
+    def __init__(self, workers: int = 2, max_pending: int = 16,
+                 timeout: float = 30.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self.workers > 0 and self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_up_worker)
+
+    async def warm_up(self):
+        self.start()
+        if self.executor is None:
+            await asyncio.to_thread(get_pdf_resources)
+            return
+
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self.executor, _warm_up_worker)
+            for _ in range(self.workers)
+        ])
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def _release(self, future: asyncio.Future):
+        self.pending -= 1
+        if not future.cancelled():
+            future.exception()
+
+    async def render(self, data: Dict[str, Any]) -> bytes:
+        if self.pending >= self.max_pending:
+            raise PdfQueueFullError()
+
+        self.start()
+        job = None
+        if self.executor is None:
+            future = asyncio.ensure_future(asyncio.to_thread(render_pdf, data))
+        else:
+            job = self.executor.submit(render_pdf, data)
+            future = asyncio.wrap_future(job)
+        self.pending += 1
+        future.add_done_callback(self._release)
+        try:
+            with timed("pdf"):
+                return await asyncio.wait_for(asyncio.shield(future),
+                                              timeout=self.timeout)
+        except asyncio.TimeoutError:
+            if job is not None:
+                job.cancel()
+            raise PdfTimeoutError()
+        except asyncio.CancelledError:
+            if job is not None:
+                job.cancel()
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+        }
+
+
+pdf_renderer = PdfRenderer(
+    workers=int(os.environ.get("PDF_WORKERS", "2")),
+    max_pending=int(os.environ.get("PDF_MAX_PENDING", "16")),
+    timeout=float(os.environ.get("PDF_TIMEOUT", "30")))
+
+pdf_cache = LRUCache(maxsize=int(os.environ.get("PDF_CACHE_SIZE", "64")))
@@ -0,0 +1,70 @@
+import hashlib
+import os
+from typing import Dict, Optional
+
+from fastapi.templating import Jinja2Templates
+from jinja2 import Template
+
+from cache import LRUCache
+from metrics import timed
+from utils import format_currency, format_currency_input
+
+TEMPLATE_RELOAD = os.environ.get("TEMPLATE_RELOAD", "0") == "1"
+
+templates = Jinja2Templates(directory="templates")
+
+templates.env.filters['format_currency'] = format_currency
+templates.env.filters['format_currency_input'] = format_currency_input
+
+
+class Renderer:
+    def __init__(self, templates: Jinja2Templates, reload: bool = False):
+        self.env = templates.env
+        self.reload = reload
+        self.compiled: Dict[str, Template] = {}
+        self.fingerprint = self.source_fingerprint()
+    
+    def source_fingerprint(self) -> str:
+        digest = hashlib.sha1()
+        for name in sorted(self.env.list_templates(extensions=["html"])):
+            source, _, _ = self.env.loader.get_source(self.env, name)
+            digest.update(name.encode("utf-8"))
+            digest.update(source.encode("utf-8"))
+        return digest.hexdigest()[:12]
+    
+    def precompile(self):
+        for name in self.env.list_templates(extensions=["html"]):
+            self.compiled[name] = self.env.get_template(name)
+        self.fingerprint = self.source_fingerprint()
+    
+    def template(self, name: str) -> Template:
+        if self.reload:
+            return self.env.get_template(name)
+        
+        template = self.compiled.get(name)
+        if template is None:
+            template = self.compiled[name] = self.env.get_template(name)
+        return template
+    
+    def render(self, name: str, **context) -> str:
+        with timed("render"):
+            return self.template(name).render(**context)
+
+
+renderer = Renderer(templates, reload=TEMPLATE_RELOAD)
+
+page_cache = LRUCache(maxsize=int(os.environ.get("PAGE_CACHE_SIZE", "128")))
+
+
+def page_etag(session_id: str, version: int) -> str:
+    return f'"{session_id}-{version}-{renderer.fingerprint}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag
+        for tag in if_none_match.split(","))
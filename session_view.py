@@ -0,0 +1,68 @@
+import os
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from cache import LRUCache
+from models import Session, Settlement, Balance, Expense
+from settlement import get_ledger
+
+EXPENSE_PAGE_SIZE = int(os.environ.get("EXPENSE_PAGE_SIZE", "50"))
+MAX_EXPENSE_PAGE_SIZE = 500
+
+
+class ExpenseRow(NamedTuple):
+    id: str
+    title: str
+    date: date
+    amount_minor: int
+    payer_name: str
+    beneficiary_names: str
+
+
+class ExpensePage(NamedTuple):
+    rows: List[ExpenseRow]
+    next_cursor: Optional[int]
+
+
+class SessionView:
+    def __init__(self, session: Session, settlement: Settlement):
+        self.participant_names: Dict[str, str] = {
+            p.id: p.name for p in session.participants
+        }
+        self.balances: Dict[str, Balance] = {
+            b.participant_id: b for b in settlement.balances
+        }
+        self.expense_count = len(session.expenses)
+        self.total_minor = get_ledger(session).total_minor
+    
+    def expense_row(self, expense: Expense) -> ExpenseRow:
+        names = self.participant_names
+        return ExpenseRow(
+            id=expense.id,
+            title=expense.title,
+            date=expense.date,
+            amount_minor=expense.amount_minor,
+            payer_name=names.get(expense.payer_id, ""),
+            beneficiary_names=", ".join(
+                names.get(bid, "") for bid in expense.beneficiary_ids))
+    
+    def expense_page(self,
+                     expenses: Sequence[Expense],
+                     before: Optional[int] = None,
+                     limit: int = EXPENSE_PAGE_SIZE) -> ExpensePage:
+        if before is None or before > len(expenses):
+            before = len(expenses)
+        before = max(before, 0)
+        start = max(before - limit, 0)
+        
+        rows = [self.expense_row(e) for e in reversed(expenses[start:before])]
+        return ExpensePage(rows=rows, next_cursor=start if start > 0 else None)
+
+
+view_cache = LRUCache(maxsize=int(os.environ.get("VIEW_CACHE_SIZE", "256")))
+
+
+def get_session_view(session: Session, settlement: Settlement) -> SessionView:
+    return view_cache.get_or_create(
+        (session.id, session.version),
+        lambda: SessionView(session, settlement))
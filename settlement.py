@@ -1,10 +1,112 @@
-from typing import List, Dict
-from models import Session, Balance, Payment, Settlement, Participant
+import asyncio
+import importlib.util
+import os
+import time
+from itertools import chain
+from typing import Any, List, Dict, Optional, Tuple
+from models import Session, Balance, Payment, Settlement, Participant, Expense
+from admission import flights
+from cache import LRUCache
+from metrics import timed
 
+np = None
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
 
-def calculate_settlement(session: Session) -> Settlement:
-    balances = calculate_balances(session)
-    payments = optimize_payments(balances, session.participants)
+settlement_cache = LRUCache(
+    maxsize=int(os.environ.get("SETTLEMENT_CACHE_SIZE", "1024")))
+
+SETTLEMENT_ENGINE = os.environ.get("SETTLEMENT_ENGINE", "greedy")
+EXACT_MAX_PARTICIPANTS = int(os.environ.get("EXACT_MAX_PARTICIPANTS", "16"))
+EXACT_TIME_BUDGET = float(os.environ.get("EXACT_TIME_BUDGET", "0.25"))
+LARGE_GROUP_THRESHOLD = int(os.environ.get("LARGE_GROUP_THRESHOLD", "500"))
+NUMPY_MIN_EXPENSES = int(os.environ.get("NUMPY_MIN_EXPENSES", "20000"))
+NUMPY_SAFE_TOTAL = 2 ** 62
+
+
+class BalanceLedger:
+    def __init__(self):
+        self.balances: Dict[str, int] = {}
+        self.total_minor = 0
+        self.participant_count = 0
+        self.expense_count = 0
+        self.last_expense_id: Optional[str] = None
+    
+    def add_participant(self, participant: Participant):
+        self.balances.setdefault(participant.id, 0)
+        self.participant_count += 1
+    
+    def apply_expense(self, expense: Expense):
+        num_beneficiaries = len(expense.beneficiary_ids)
+        
+        amount_per_person = expense.amount_minor // num_beneficiaries
+        remainder = expense.amount_minor % num_beneficiaries
+        
+        for i, beneficiary_id in enumerate(expense.beneficiary_ids):
+            share = amount_per_person
+            if i < remainder:
+                share += 1
+            
+            self.balances[beneficiary_id] -= share
+        
+        self.balances[expense.payer_id] += expense.amount_minor
+        self.total_minor += expense.amount_minor
+        
+        self.expense_count += 1
+        self.last_expense_id = expense.id
+    
+    def is_stale(self, session: Session) -> bool:
+        if len(session.participants) < self.participant_count:
+            return True
+        if len(session.expenses) < self.expense_count:
+            return True
+        if self.expense_count == 0:
+            return False
+        return session.expenses[self.expense_count - 1].id != self.last_expense_id
+    
+    def sync(self, session: Session):
+        if self.is_stale(session):
+            self.rebuild(session)
+            return
+        
+        for participant in session.participants[self.participant_count:]:
+            self.add_participant(participant)
+        
+        for expense in session.expenses[self.expense_count:]:
+            self.apply_expense(expense)
+    
+    def rebuild(self, session: Session):
+        self.balances = compute_balance_map(session)
+        self.total_minor = sum(e.amount_minor for e in session.expenses)
+        self.participant_count = len(session.participants)
+        self.expense_count = len(session.expenses)
+        self.last_expense_id = (session.expenses[-1].id
+                                if session.expenses else None)
+    
+    def verify(self, session: Session) -> bool:
+        self.sync(session)
+        total_minor = sum(e.amount_minor for e in session.expenses)
+        return (self.balances == compute_balance_map(session)
+                and self.total_minor == total_minor)
+
+
+def get_ledger(session: Session) -> BalanceLedger:
+    ledger = session._ledger
+    if ledger is None:
+        ledger = BalanceLedger()
+        session._ledger = ledger
+    ledger.sync(session)
+    return ledger
+
+
+def calculate_settlement(session: Session, verify: bool = False, engine: Optional[str] = None) -> Settlement:
+    engine = engine or SETTLEMENT_ENGINE
+    if engine == "greedy" and len(session.participants) >= LARGE_GROUP_THRESHOLD:
+        return calculate_settlement_large(session, verify=verify)
+    
+    with timed("balances"):
+        balances = calculate_balances(session, verify=verify)
+    with timed("payments"):
+        payments = ENGINES[engine](balances, session.participants)
     
     return Settlement(
         balances=balances,
@@ -12,8 +114,134 @@ def calculate_settlement(session: Session) -> Settlement:
     )
 
 
-def calculate_balances(session: Session) -> List[Balance]:
-    participant_map = {p.id: p.name for p in session.participants}
+def _sorted_balances(balance_map: Dict[str, int],
+                     participants: List[Participant]) -> List[Balance]:
+    balances = [
+        Balance(
+            participant_id=p.id,
+            participant_name=p.name,
+            balance_minor=balance_map[p.id]
+        )
+        for p in participants
+    ]
+    balances.sort(key=lambda b: b.balance_minor, reverse=True)
+    return balances
+
+
+def settlement_from_balances(balance_map: Dict[str, int],
+                             participants: List[Participant],
+                             engine: Optional[str] = None) -> Settlement:
+    balances = _sorted_balances(balance_map, participants)
+    
+    with timed("payments"):
+        payments = ENGINES[engine or SETTLEMENT_ENGINE](balances, participants)
+    
+    return Settlement(balances=balances, payments=payments)
+
+
+async def calculate_payments_async(balances: List[Balance],
+                                   participants: List[Participant],
+                                   engine: Optional[str] = None) -> List[Payment]:
+    engine = engine or SETTLEMENT_ENGINE
+    with timed("payments"):
+        if engine != "exact":
+            return ENGINES[engine](balances, participants)
+        return await asyncio.to_thread(optimize_payments_exact, balances,
+                                       list(participants))
+
+
+async def settlement_from_balances_async(balance_map: Dict[str, int],
+                                         participants: List[Participant],
+                                         engine: Optional[str] = None) -> Settlement:
+    balances = _sorted_balances(balance_map, participants)
+    payments = await calculate_payments_async(balances, participants, engine)
+    return Settlement(balances=balances, payments=payments)
+
+
+def calculate_settlement_large(session: Session, verify: bool = False) -> Settlement:
+    ledger = get_ledger(session)
+    if verify and not ledger.verify(session):
+        ledger.rebuild(session)
+    
+    ids = [p.id for p in session.participants]
+    names = [p.name for p in session.participants]
+    values = [ledger.balances[pid] for pid in ids]
+    
+    order = sorted(range(len(ids)), key=values.__getitem__, reverse=True)
+    
+    transfers = _greedy_transfers([(k, values[k]) for k in order])
+    
+    balances = [
+        Balance(
+            participant_id=ids[k],
+            participant_name=names[k],
+            balance_minor=values[k]
+        )
+        for k in order
+    ]
+    payments = [
+        Payment(
+            from_participant_id=ids[debtor],
+            from_participant_name=names[debtor],
+            to_participant_id=ids[creditor],
+            to_participant_name=names[creditor],
+            amount_minor=amount
+        )
+        for debtor, creditor, amount in transfers
+    ]
+    
+    return Settlement(balances=balances, payments=payments)
+
+
+def get_settlement(session: Session) -> Settlement:
+    def compute() -> Settlement:
+        with timed("settlement"):
+            return calculate_settlement(session)
+    
+    return settlement_cache.get_or_create((session.id, session.version),
+                                          compute)
+
+
+async def get_settlement_async(session: Session) -> Settlement:
+    if SETTLEMENT_ENGINE != "exact":
+        return get_settlement(session)
+    
+    key = (session.id, session.version)
+    settlement = settlement_cache.get(key)
+    if settlement is not None:
+        return settlement
+    
+    async def compute() -> Settlement:
+        with timed("settlement"):
+            with timed("balances"):
+                balances = calculate_balances(session)
+            payments = await calculate_payments_async(balances,
+                                                      session.participants)
+        settlement = Settlement(balances=balances, payments=payments)
+        settlement_cache.put(key, settlement)
+        return settlement
+    
+    return await flights.do(("settlement", ) + key, compute)
+
+
+def load_numpy():
+    global np
+    if np is None and NUMPY_AVAILABLE:
+        import numpy
+        np = numpy
+    return np
+
+
+def compute_balance_map(session: Session) -> Dict[str, int]:
+    if (len(session.expenses) >= NUMPY_MIN_EXPENSES
+            and load_numpy() is not None):
+        balance_map = compute_balance_map_numpy(session)
+        if balance_map is not None:
+            return balance_map
+    return compute_balance_map_python(session)
+
+
+def compute_balance_map_python(session: Session) -> Dict[str, int]:
     balance_map: Dict[str, int] = {p.id: 0 for p in session.participants}
     
     for expense in session.expenses:
@@ -31,13 +259,66 @@ def calculate_balances(session: Session) -> List[Balance]:
         
         balance_map[expense.payer_id] += expense.amount_minor
     
+    return balance_map
+
+
+def expense_columns(session: Session):
+    ids = [p.id for p in session.participants]
+    index = {pid: i for i, pid in enumerate(ids)}
+    expenses = session.expenses
+    
+    amounts = np.fromiter((e.amount_minor for e in expenses), dtype=np.int64, count=len(expenses))
+    payers = np.fromiter((index[e.payer_id] for e in expenses), dtype=np.int64, count=len(expenses))
+    counts = np.fromiter((len(e.beneficiary_ids) for e in expenses), dtype=np.int64, count=len(expenses))
+    offsets = np.zeros(len(expenses) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    beneficiaries = np.fromiter(
+        map(index.__getitem__, chain.from_iterable(e.beneficiary_ids for e in expenses)),
+        dtype=np.int64,
+        count=int(offsets[-1])
+    )
+    
+    return ids, amounts, payers, offsets, beneficiaries
+
+
+def balances_from_columns(participant_count: int, amounts, payers, offsets, beneficiaries):
+    counts = np.diff(offsets)
+    amount_per_person = amounts // counts
+    remainder = amounts % counts
+    
+    position = np.arange(len(beneficiaries), dtype=np.int64) - np.repeat(offsets[:-1], counts)
+    shares = np.repeat(amount_per_person, counts) + (position < np.repeat(remainder, counts))
+    
+    balances = np.zeros(participant_count, dtype=np.int64)
+    np.subtract.at(balances, beneficiaries, shares)
+    np.add.at(balances, payers, amounts)
+    return balances
+
+
+def compute_balance_map_numpy(session: Session) -> Optional[Dict[str, int]]:
+    try:
+        ids, amounts, payers, offsets, beneficiaries = expense_columns(session)
+    except OverflowError:
+        return None
+    if len(amounts) and int(amounts.max()) * len(amounts) >= NUMPY_SAFE_TOTAL:
+        return None
+    
+    balances = balances_from_columns(len(ids), amounts, payers, offsets, beneficiaries)
+    return dict(zip(ids, balances.tolist()))
+
+
+def calculate_balances(session: Session, verify: bool = False) -> List[Balance]:
+    ledger = get_ledger(session)
+    if verify and not ledger.verify(session):
+        ledger.rebuild(session)
+    
     balances = [
         Balance(
-            participant_id=pid,
-            participant_name=participant_map[pid],
-            balance_minor=balance
+            participant_id=p.id,
+            participant_name=p.name,
+            balance_minor=ledger.balances[p.id]
         )
-        for pid, balance in balance_map.items()
+        for p in session.participants
     ]
     
     balances.sort(key=lambda b: b.balance_minor, reverse=True)
@@ -48,36 +329,162 @@ def calculate_balances(session: Session) -> List[Balance]:
 def optimize_payments(balances: List[Balance], participants: List[Participant]) -> List[Payment]:
     participant_map = {p.id: p.name for p in participants}
     
-    debtors = [(b.participant_id, -b.balance_minor) for b in balances if b.balance_minor < 0]
-    creditors = [(b.participant_id, b.balance_minor) for b in balances if b.balance_minor > 0]
+    return [
+        Payment(
+            from_participant_id=debtor_id,
+            from_participant_name=participant_map[debtor_id],
+            to_participant_id=creditor_id,
+            to_participant_name=participant_map[creditor_id],
+            amount_minor=amount
+        )
+        for debtor_id, creditor_id, amount in _greedy_transfers(
+            [(b.participant_id, b.balance_minor) for b in balances])
+    ]
+
+
+class SettlementTimeout(Exception):
+    pass
+
+
+def _greedy_transfers(amounts: List[Tuple[Any, int]]) -> List[Tuple[Any, Any, int]]:
+    debtors = [[pid, -amount] for pid, amount in amounts if amount < 0]
+    creditors = [[pid, amount] for pid, amount in amounts if amount > 0]
     
     debtors.sort(key=lambda x: x[1], reverse=True)
     creditors.sort(key=lambda x: x[1], reverse=True)
     
-    payments = []
+    transfers = []
     
     i, j = 0, 0
     while i < len(debtors) and j < len(creditors):
-        debtor_id, debt = debtors[i]
-        creditor_id, credit = creditors[j]
-        
-        transfer_amount = min(debt, credit)
-        
-        if transfer_amount > 0:
-            payments.append(Payment(
-                from_participant_id=debtor_id,
-                from_participant_name=participant_map[debtor_id],
-                to_participant_id=creditor_id,
-                to_participant_name=participant_map[creditor_id],
-                amount_minor=transfer_amount
-            ))
+        transfer_amount = min(debtors[i][1], creditors[j][1])
+        transfers.append((debtors[i][0], creditors[j][0], transfer_amount))
         
-        debtors[i] = (debtor_id, debt - transfer_amount)
-        creditors[j] = (creditor_id, credit - transfer_amount)
+        debtors[i][1] -= transfer_amount
+        creditors[j][1] -= transfer_amount
         
         if debtors[i][1] == 0:
             i += 1
         if creditors[j][1] == 0:
             j += 1
     
-    return payments
+    return transfers
+
+
+def _cancel_equal_pairs(amounts: List[Tuple[str, int]]):
+    creditors_by_amount: Dict[int, List[str]] = {}
+    for pid, amount in amounts:
+        if amount > 0:
+            creditors_by_amount.setdefault(amount, []).append(pid)
+    
+    transfers = []
+    matched = set()
+    for pid, amount in amounts:
+        if amount < 0 and creditors_by_amount.get(-amount):
+            creditor_id = creditors_by_amount[-amount].pop(0)
+            transfers.append((pid, creditor_id, -amount))
+            matched.add(pid)
+            matched.add(creditor_id)
+    
+    rest = [(pid, amount) for pid, amount in amounts if pid not in matched]
+    return transfers, rest
+
+
+def _zero_sum_groups(amounts: List[Tuple[str, int]], deadline: float) -> List[List[Tuple[str, int]]]:
+    n = len(amounts)
+    values = [amount for _, amount in amounts]
+    full = (1 << n) - 1
+    
+    sums = [0] * (full + 1)
+    best = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        if mask & 1023 == 0 and time.perf_counter() > deadline:
+            raise SettlementTimeout()
+        
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + values[low.bit_length() - 1]
+        
+        groups = 0
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if best[mask ^ bit] > groups:
+                groups = best[mask ^ bit]
+            rest ^= bit
+        best[mask] = groups + (1 if sums[mask] == 0 else 0)
+    
+    result = []
+    current: List[Tuple[str, int]] = []
+    mask = full
+    while mask:
+        target = best[mask] - (1 if sums[mask] == 0 else 0)
+        rest = mask
+        while rest:
+            bit = rest & -rest
+            if best[mask ^ bit] == target:
+                break
+            rest ^= bit
+        
+        current.append(amounts[bit.bit_length() - 1])
+        mask ^= bit
+        if sums[mask] == 0:
+            result.append(current)
+            current = []
+    
+    return result
+
+
+def _to_payments(transfers: List[Tuple[str, str, int]], participants: List[Participant]) -> List[Payment]:
+    participant_map = {p.id: p.name for p in participants}
+    
+    return [
+        Payment(
+            from_participant_id=debtor_id,
+            from_participant_name=participant_map[debtor_id],
+            to_participant_id=creditor_id,
+            to_participant_name=participant_map[creditor_id],
+            amount_minor=amount
+        )
+        for debtor_id, creditor_id, amount in transfers
+    ]
+
+
+def optimize_payments_heuristic(balances: List[Balance], participants: List[Participant]) -> List[Payment]:
+    amounts = [(b.participant_id, b.balance_minor) for b in balances if b.balance_minor != 0]
+    transfers, rest = _cancel_equal_pairs(amounts)
+    transfers += _greedy_transfers(rest)
+    
+    return _to_payments(transfers, participants)
+
+
+def optimize_payments_exact(balances: List[Balance],
+                            participants: List[Participant],
+                            max_participants: Optional[int] = None,
+                            time_budget: Optional[float] = None) -> List[Payment]:
+    if max_participants is None:
+        max_participants = EXACT_MAX_PARTICIPANTS
+    if time_budget is None:
+        time_budget = EXACT_TIME_BUDGET
+    
+    amounts = [(b.participant_id, b.balance_minor) for b in balances if b.balance_minor != 0]
+    transfers, rest = _cancel_equal_pairs(amounts)
+    
+    if len(rest) > max_participants:
+        return optimize_payments_heuristic(balances, participants)
+    
+    try:
+        groups = _zero_sum_groups(rest, time.perf_counter() + time_budget)
+    except SettlementTimeout:
+        return optimize_payments_heuristic(balances, participants)
+    
+    for group in groups:
+        transfers += _greedy_transfers(group)
+    
+    return _to_payments(transfers, participants)
+
+
+ENGINES = {
+    "greedy": optimize_payments,
+    "heuristic": optimize_payments_heuristic,
+    "exact": optimize_payments_exact,
+}
@@ -1,24 +1,674 @@
-from typing import Dict, Optional
-from models import Session
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Union
+from models import Session, Participant, Expense
+from cache import LRUCache
+from compact import CompactSession
+from codec import encode_session, decode_session
 
 
-class InMemoryStorage:
+SESSION_BYTES = 1000
+PARTICIPANT_BYTES = 640
+EXPENSE_BYTES = 1350
+
+
+class VersionConflictError(Exception):
+    pass
+
+
+class StorageBackend:
     def __init__(self):
-        self.sessions: Dict[str, Session] = {}
+        self.listeners: List[Callable[[Session], None]] = []
+        self.evict_listeners: List[Callable[[str], None]] = []
+        self.locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = (
+            weakref.WeakValueDictionary())
+    
+    def session_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self.locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self.locks[session_id] = lock
+        return lock
+    
+    def subscribe(self, listener: Callable[[Session], None]):
+        self.listeners.append(listener)
+    
+    def notify(self, session: Session):
+        for listener in self.listeners:
+            listener(session)
+    
+    def on_evict(self, listener: Callable[[str], None]):
+        self.evict_listeners.append(listener)
+    
+    def notify_evict(self, session_id: str):
+        for listener in self.evict_listeners:
+            listener(session_id)
+    
+    async def load_session(self,
+                           session_id: str,
+                           admit: bool = True) -> Optional[Session]:
+        return self.get_session(session_id)
+    
+    async def flush(self):
+        pass
+    
+    async def snapshot_if_due(self) -> Optional[str]:
+        return None
+    
+    def sweep(self) -> Dict[str, int]:
+        return {}
+    
+    def stats(self) -> Dict[str, Any]:
+        return {}
+    
+    def session_ids(self) -> List[str]:
+        return []
+    
+    def worker_source(self) -> Optional[str]:
+        return None
+
+
+class InMemoryStorage(StorageBackend):
+    def __init__(self,
+                 compact: bool = False,
+                 hot_sessions: int = 128,
+                 ttl: float = 0,
+                 max_sessions: int = 0,
+                 max_bytes: int = 0,
+                 spill_dir: Optional[str] = None):
+        super().__init__()
+        self.compact = compact
+        self.sessions: "OrderedDict[str, Union[Session, CompactSession]]" = (
+            OrderedDict())
+        self.hot = LRUCache(maxsize=hot_sessions)
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.last_access: Dict[str, float] = {}
+        self.sizes: Dict[str, int] = {}
+        self.resident_bytes = 0
+        self.spilled: Dict[str, float] = {}
+        self.spilling: Dict[str, Union[Session, CompactSession]] = {}
+        self.obsolete: List[str] = []
+        self.spill_lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flush_task: Optional[asyncio.Future] = None
+        self.evicted = 0
+        self.expired = 0
+        self.reloaded = 0
+        
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            for filename in os.listdir(spill_dir):
+                if filename.endswith(".mspl"):
+                    path = os.path.join(spill_dir, filename)
+                    self.spilled[filename[:-5]] = os.path.getmtime(path)
+    
+    def create_session(self, session: Session) -> Session:
+        if self.compact:
+            self._store(session.id, CompactSession.from_session(session))
+            self.hot.put((session.id, ), session)
+        else:
+            self._store(session.id, session)
+        self._enforce_budget()
+        return session
+    
+    def get_session(self, session_id: str) -> Optional[Session]:
+        stored = self.sessions.get(session_id)
+        if stored is None:
+            stored = self._readmit(session_id)
+            if stored is None:
+                stored = self._reload(session_id)
+            if stored is None:
+                return None
+        else:
+            self._touch(session_id)
+        
+        if not self.compact:
+            return stored
+        
+        session = self.hot.get((session_id, ))
+        if session is None or session.version != stored.version:
+            session = stored.to_session()
+            self.hot.put((session_id, ), session)
+        return session
+    
+    def update_session(self,
+                       session: Session,
+                       expected_version: Optional[int] = None) -> Session:
+        stored = self.sessions.get(session.id)
+        if stored is None:
+            stored = self._readmit(session.id)
+            if stored is None:
+                stored = self._reload(session.id)
+        if stored is None or (expected_version is not None
+                              and stored.version != expected_version):
+            raise VersionConflictError(session.id)
+        session.version += 1
+        if self.compact:
+            stored.sync(session)
+            self._store(session.id, stored)
+            self.hot.put((session.id, ), session)
+        else:
+            self._store(session.id, session)
+        self.notify(session)
+        self._enforce_budget()
+        return session
+    
+    async def load_session(self,
+                           session_id: str,
+                           admit: bool = True) -> Optional[Session]:
+        if not admit and session_id not in self.sessions:
+            stored = self.spilling.get(session_id)
+            if stored is not None:
+                return stored.to_session() if self.compact else stored
+            if session_id in self.spilled:
+                session = await asyncio.to_thread(self._take_spill,
+                                                  session_id)
+                if session is not None:
+                    return session
+            return self.get_session(session_id)
+        
+        accessed = self.spilled.get(session_id)
+        if (accessed is not None and session_id not in self.sessions
+                and session_id not in self.spilling):
+            session = await asyncio.to_thread(self._take_spill, session_id)
+            if (session is not None and session_id not in self.sessions
+                    and session_id not in self.spilling
+                    and self.spilled.get(session_id) == accessed):
+                self._admit(session_id, session)
+        return self.get_session(session_id)
+    
+    async def flush(self):
+        if self.flush_task is not None:
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+        await asyncio.to_thread(self.flush_spills)
+    
+    def session_exists(self, session_id: str) -> bool:
+        return (session_id in self.sessions or session_id in self.spilling
+                or session_id in self.spilled)
+    
+    def session_ids(self) -> List[str]:
+        with self.spill_lock:
+            pending = list(self.spilling) + list(self.spilled)
+        return list(self.sessions) + [
+            session_id for session_id in dict.fromkeys(pending)
+            if session_id not in self.sessions
+        ]
+    
+    def sweep(self) -> Dict[str, int]:
+        expired = 0
+        if self.ttl > 0:
+            deadline = time.time() - self.ttl
+            for session_id, accessed in list(self.last_access.items()):
+                if accessed < deadline:
+                    self._drop(session_id)
+                    expired += 1
+            for session_id, accessed in list(self.spilled.items()):
+                if accessed < deadline:
+                    self._remove_spill(session_id)
+                    expired += 1
+        self.expired += expired
+        return {"expired": expired, "evicted": self._enforce_budget()}
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "resident": len(self.sessions),
+            "resident_bytes": self.resident_bytes,
+            "spilled": len(self.spilled),
+            "spilling": len(self.spilling),
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "reloaded": self.reloaded,
+        }
+    
+    def _store(self, session_id: str, stored: Union[Session,
+                                                    CompactSession]):
+        self.sessions[session_id] = stored
+        self._touch(session_id)
+        size = self._estimate_bytes(stored)
+        self.resident_bytes += size - self.sizes.get(session_id, 0)
+        self.sizes[session_id] = size
+    
+    def _touch(self, session_id: str):
+        self.sessions.move_to_end(session_id)
+        self.last_access[session_id] = time.time()
+    
+    def _estimate_bytes(self, stored: Union[Session, CompactSession]) -> int:
+        if isinstance(stored, CompactSession):
+            return stored.nbytes()
+        return (SESSION_BYTES + PARTICIPANT_BYTES * len(stored.participants) +
+                EXPENSE_BYTES * len(stored.expenses))
+    
+    def _over_budget(self) -> bool:
+        if self.max_sessions and len(self.sessions) > self.max_sessions:
+            return True
+        return bool(self.max_bytes) and self.resident_bytes > self.max_bytes
+    
+    def _enforce_budget(self) -> int:
+        evicted = 0
+        while len(self.sessions) > 1 and self._over_budget():
+            session_id = next(iter(self.sessions))
+            if self.spill_dir:
+                with self.spill_lock:
+                    self.spilling[session_id] = self.sessions[session_id]
+                    self.spilled[session_id] = self.last_access[session_id]
+            self._drop(session_id)
+            evicted += 1
+        self.evicted += evicted
+        if self.spilling or self.obsolete:
+            self._schedule_flush()
+        return evicted
+    
+    def _drop(self, session_id: str):
+        self.sessions.pop(session_id, None)
+        self.last_access.pop(session_id, None)
+        self.resident_bytes -= self.sizes.pop(session_id, 0)
+        self.hot.invalidate(session_id)
+        self.notify_evict(session_id)
+    
+    def _spill_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{session_id}.mspl")
+    
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_spills()
+            return
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = loop.create_task(
+                asyncio.to_thread(self.flush_spills))
+            self.flush_task.add_done_callback(self._flushed)
+    
+    def _flushed(self, task: asyncio.Future):
+        if task.cancelled() or task.exception() is not None:
+            return
+        if task.result():
+            self._schedule_flush()
+    
+    def flush_spills(self) -> bool:
+        with self.flush_lock:
+            return self._flush_spills()
+    
+    def _flush_spills(self) -> bool:
+        with self.spill_lock:
+            pending = list(self.spilling.items())
+            obsolete, self.obsolete = self.obsolete, []
+        for session_id in obsolete:
+            try:
+                os.remove(self._spill_path(session_id))
+            except FileNotFoundError:
+                pass
+        
+        written = 0
+        for session_id, stored in pending:
+            try:
+                session = (stored.to_session() if isinstance(
+                    stored, CompactSession) else stored)
+                path = self._spill_path(session_id)
+                with open(path + ".tmp", "wb") as f:
+                    f.write(encode_session(session))
+                os.replace(path + ".tmp", path)
+            except Exception:
+                continue
+            with self.spill_lock:
+                if self.spilling.get(session_id) is not stored:
+                    continue
+                del self.spilling[session_id]
+                accessed = self.spilled.get(session_id)
+                if accessed is None:
+                    self.obsolete.append(session_id)
+                    continue
+            os.utime(path, (accessed, accessed))
+            written += 1
+        return written > 0 and bool(self.spilling or self.obsolete)
+    
+    def _remove_spill(self, session_id: str):
+        with self.spill_lock:
+            self.spilled.pop(session_id, None)
+            self.spilling.pop(session_id, None)
+            self.obsolete.append(session_id)
+    
+    def _readmit(self,
+                 session_id: str) -> Optional[Union[Session, CompactSession]]:
+        with self.spill_lock:
+            stored = self.spilling.pop(session_id, None)
+            if stored is None:
+                return None
+            self.spilled.pop(session_id, None)
+            self.obsolete.append(session_id)
+        self._store(session_id, stored)
+        self._enforce_budget()
+        return stored
+    
+    def _take_spill(self, session_id: str) -> Optional[Session]:
+        path = self._spill_path(session_id)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        return decode_session(data)
+    
+    def _admit(self, session_id: str,
+               session: Session) -> Union[Session, CompactSession]:
+        self._remove_spill(session_id)
+        self.reloaded += 1
+        
+        stored = (CompactSession.from_session(session)
+                  if self.compact else session)
+        self._store(session_id, stored)
+        self._enforce_budget()
+        return stored
+    
+    def _reload(self,
+                session_id: str) -> Optional[Union[Session, CompactSession]]:
+        if session_id not in self.spilled:
+            return None
+        session = self._take_spill(session_id)
+        if session is None:
+            return None
+        return self._admit(session_id, session)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    read_only INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    participant_count INTEGER NOT NULL,
+    expense_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS participants (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS expenses (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    amount_minor INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    payer_id TEXT NOT NULL,
+    beneficiary_ids TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteStorage(StorageBackend):
+    def __init__(self,
+                 path: str,
+                 cache_size: int = 1024,
+                 checkpoint_every: int = 1000,
+                 snapshot_dir: Optional[str] = None,
+                 snapshot_interval: float = 3600,
+                 snapshot_keep: int = 3):
+        super().__init__()
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.writes_since_checkpoint = 0
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_keep = max(snapshot_keep, 1)
+        self.last_snapshot = time.time()
+        self.snapshots = 0
+        self.snapshot_errors = 0
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+        self.sessions = LRUCache(maxsize=cache_size)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path,
+                                    check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
     
     def create_session(self, session: Session) -> Session:
-        self.sessions[session.id] = session
+        with self.lock:
+            with self._transaction():
+                self.conn.execute(
+                    "INSERT INTO sessions VALUES (?, ?, ?, ?, ?, 0, 0)",
+                    (session.id, session.name, session.created_at.isoformat(),
+                     int(session.read_only), session.version))
+                self._append_rows(session, 0, 0)
+            self._after_write()
+        self.sessions.put((session.id, ), session)
         return session
     
     def get_session(self, session_id: str) -> Optional[Session]:
-        return self.sessions.get(session_id)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT version FROM sessions WHERE id = ?",
+                (session_id, )).fetchone()
+            if row is None:
+                self.sessions.invalidate(session_id)
+                return None
+            
+            cached = self.sessions.get((session_id, ))
+            if cached is not None and cached.version == row[0]:
+                return cached
+            
+            session = self._load(session_id)
+        self.sessions.put((session_id, ), session)
+        return session
+    
+    async def load_session(self,
+                           session_id: str,
+                           admit: bool = True) -> Optional[Session]:
+        return await asyncio.to_thread(self.get_session, session_id)
     
-    def update_session(self, session: Session) -> Session:
-        self.sessions[session.id] = session
+    def update_session(self,
+                       session: Session,
+                       expected_version: Optional[int] = None) -> Session:
+        new_version = session.version + 1
+        with self.lock:
+            with self._transaction():
+                row = self.conn.execute(
+                    "SELECT version, participant_count, expense_count "
+                    "FROM sessions WHERE id = ?", (session.id, )).fetchone()
+                if row is None:
+                    self.sessions.invalidate(session.id)
+                    raise VersionConflictError(session.id)
+                
+                stored_version, participant_count, expense_count = row
+                if (expected_version is not None
+                        and stored_version != expected_version):
+                    self.sessions.invalidate(session.id)
+                    raise VersionConflictError(session.id)
+                if (participant_count > len(session.participants)
+                        or expense_count > len(session.expenses)):
+                    self.conn.execute(
+                        "DELETE FROM participants WHERE session_id = ?",
+                        (session.id, ))
+                    self.conn.execute(
+                        "DELETE FROM expenses WHERE session_id = ?",
+                        (session.id, ))
+                    participant_count, expense_count = 0, 0
+                
+                self._append_rows(session, participant_count, expense_count)
+                self.conn.execute(
+                    "UPDATE sessions SET name = ?, read_only = ?, version = ? "
+                    "WHERE id = ?", (session.name, int(session.read_only),
+                                     new_version, session.id))
+            self._after_write()
+        session.version = new_version
+        self.sessions.put((session.id, ), session)
+        self.notify(session)
         return session
     
     def session_exists(self, session_id: str) -> bool:
-        return session_id in self.sessions
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM sessions WHERE id = ?",
+                                    (session_id, )).fetchone()
+        return row is not None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self.sessions.stats(),
+            "snapshots": self.snapshots,
+            "snapshot_errors": self.snapshot_errors,
+            "last_snapshot": self.last_snapshot if self.snapshots else None,
+        }
+    
+    def worker_source(self) -> Optional[str]:
+        return self.path
+    
+    def session_ids(self) -> List[str]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id FROM sessions ORDER BY rowid").fetchall()
+        return [row[0] for row in rows]
+    
+    def checkpoint(self):
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.writes_since_checkpoint = 0
+    
+    def snapshot(self, path: str):
+        with self.lock:
+            self.conn.execute("VACUUM INTO ?", (path, ))
+    
+    async def snapshot_if_due(self) -> Optional[str]:
+        if (not self.snapshot_dir or self.snapshot_interval <= 0
+                or time.time() - self.last_snapshot < self.snapshot_interval):
+            return None
+        self.last_snapshot = time.time()
+        try:
+            path = await asyncio.to_thread(self._write_snapshot)
+        except (OSError, sqlite3.Error):
+            self.snapshot_errors += 1
+            return None
+        self.snapshots += 1
+        return path
+    
+    def _write_snapshot(self) -> str:
+        seconds, nanoseconds = divmod(time.time_ns(), 10**9)
+        name = (time.strftime("sessions-%Y%m%d-%H%M%S", time.localtime(seconds))
+                + f"-{nanoseconds:09d}.db")
+        path = os.path.join(self.snapshot_dir, name)
+        if os.path.exists(path + ".tmp"):
+            os.remove(path + ".tmp")
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute("VACUUM INTO ?", (path + ".tmp", ))
+        finally:
+            conn.close()
+        os.replace(path + ".tmp", path)
+        
+        snapshots = sorted(
+            filename for filename in os.listdir(self.snapshot_dir)
+            if filename.startswith("sessions-") and filename.endswith(".db"))
+        for filename in snapshots[:-self.snapshot_keep]:
+            os.remove(os.path.join(self.snapshot_dir, filename))
+        return path
+    
+    def close(self):
+        with self.lock:
+            self.checkpoint()
+            self.conn.close()
+    
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+    
+    def _after_write(self):
+        self.writes_since_checkpoint += 1
+        if self.writes_since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+    
+    def _append_rows(self, session: Session, participant_count: int,
+                     expense_count: int):
+        self.conn.executemany(
+            "INSERT INTO participants VALUES (?, ?, ?, ?)",
+            [(session.id, seq, p.id, p.name)
+             for seq, p in enumerate(session.participants[participant_count:],
+                                     start=participant_count)])
+        self.conn.executemany(
+            "INSERT INTO expenses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(session.id, seq, e.id, e.title, e.amount_minor,
+              e.date.isoformat(), e.payer_id, ",".join(e.beneficiary_ids))
+             for seq, e in enumerate(session.expenses[expense_count:],
+                                     start=expense_count)])
+        self.conn.execute(
+            "UPDATE sessions SET participant_count = ?, expense_count = ? "
+            "WHERE id = ?",
+            (len(session.participants), len(session.expenses), session.id))
+    
+    def _load(self, session_id: str) -> Session:
+        name, created_at, read_only, version = self.conn.execute(
+            "SELECT name, created_at, read_only, version FROM sessions "
+            "WHERE id = ?", (session_id, )).fetchone()
+        participants = [
+            Participant.model_construct(id=pid, name=pname)
+            for pid, pname in self.conn.execute(
+                "SELECT id, name FROM participants WHERE session_id = ? "
+                "ORDER BY seq", (session_id, ))
+        ]
+        expenses = [
+            Expense.model_construct(id=eid,
+                                    title=title,
+                                    amount_minor=amount_minor,
+                                    date=date.fromisoformat(expense_date),
+                                    payer_id=payer_id,
+                                    beneficiary_ids=beneficiary_ids.split(","))
+            for eid, title, amount_minor, expense_date, payer_id,
+            beneficiary_ids in self.conn.execute(
+                "SELECT id, title, amount_minor, date, payer_id, "
+                "beneficiary_ids FROM expenses WHERE session_id = ? "
+                "ORDER BY seq", (session_id, ))
+        ]
+        return Session.model_construct(
+            id=session_id,
+            name=name,
+            created_at=datetime.fromisoformat(created_at),
+            read_only=bool(read_only),
+            version=version,
+            participants=participants,
+            expenses=expenses)
+
+
+def create_storage() -> StorageBackend:
+    backend = os.environ.get("STORAGE_BACKEND", "memory")
+    if backend == "sqlite":
+        return SQLiteStorage(
+            os.environ.get("STORAGE_PATH", "sessions.db"),
+            snapshot_dir=os.environ.get("SNAPSHOT_DIR") or None,
+            snapshot_interval=float(os.environ.get("SNAPSHOT_INTERVAL",
+                                                   "3600")),
+            snapshot_keep=int(os.environ.get("SNAPSHOT_KEEP", "3")))
+    if backend != "memory":
+        raise ValueError(f"Unknown storage backend: {backend}")
+    return InMemoryStorage(
+        compact=os.environ.get("COMPACT_SESSIONS", "0") == "1",
+        hot_sessions=int(os.environ.get("HOT_SESSIONS", "128")),
+        ttl=float(os.environ.get("SESSION_TTL", "0")),
+        max_sessions=int(os.environ.get("MAX_SESSIONS", "0")),
+        max_bytes=int(float(os.environ.get("MEMORY_BUDGET_MB", "0")) * 2**20),
+        spill_dir=os.environ.get("SESSION_SPILL_DIR") or None)
 
 
-storage = InMemoryStorage()
+storage = create_storage()
@@ -0,0 +1,22 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def client():
+    import main
+    
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture
+def session_id(client):
+    response = client.post("/session/create",
+                           data={"session_name": "Test"},
+                           follow_redirects=False)
+    session_id = response.headers["location"].rsplit("/", 1)[1]
+    for name in ["Ala", "Bob"]:
+        client.post(f"/session/{session_id}/participant/add",
+                    data={"participant_name": name})
+    return session_id
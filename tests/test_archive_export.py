@@ -0,0 +1,76 @@
+import asyncio
+import csv
+import io
+import zipfile
+
+import pytest
+
+from archive_export import ArchiveExporter
+from models import Participant, Session
+from storage import InMemoryStorage
+
+
+def make_session(name):
+    return Session(name=name, participants=[Participant(name="Ala")])
+
+
+def archive(exporter, session_ids, load, csv_content=None):
+    async def run():
+        return b"".join([
+            chunk async for chunk in exporter.stream(
+                session_ids, load, csv_content, None)
+        ])
+    
+    return zipfile.ZipFile(io.BytesIO(asyncio.run(run())))
+
+
+def errors(archive):
+    rows = csv.reader(io.StringIO(archive.read("bledy.csv").decode()))
+    return dict(list(rows)[1:])
+
+
+def test_missing_session_is_reported_before_csv():
+    session = make_session("Wyjazd")
+    sessions = {session.id: session}
+    
+    async def load(session_id):
+        return sessions.get(session_id)
+    
+    async def csv_content(session):
+        return iter([session.name.encode()])
+    
+    result = archive(ArchiveExporter(), [session.id, "missing"], load,
+                     csv_content)
+    assert errors(result) == {"missing": "Sesja nie została znaleziona"}
+    assert len(result.namelist()) == 2
+
+
+def test_load_failure_is_reported():
+    async def load(session_id):
+        raise RuntimeError("disk")
+    
+    result = archive(ArchiveExporter(), ["broken"], load)
+    assert errors(result) == {"broken": "Nie udało się wczytać sesji"}
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_load_without_admit_keeps_residency(tmp_path, compact):
+    storage = InMemoryStorage(compact=compact,
+                              max_sessions=2,
+                              spill_dir=str(tmp_path))
+    sessions = [storage.create_session(make_session(f"S{i}"))
+                for i in range(5)]
+    storage.flush_spills()
+    resident = list(storage.sessions)
+    evicted, reloaded = storage.evicted, storage.reloaded
+    
+    async def run():
+        return [
+            await storage.load_session(session.id, admit=False)
+            for session in sessions
+        ]
+    
+    loaded = asyncio.run(run())
+    assert [s.name for s in loaded] == [s.name for s in sessions]
+    assert list(storage.sessions) == resident
+    assert (storage.evicted, storage.reloaded) == (evicted, reloaded)
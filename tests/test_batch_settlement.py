@@ -0,0 +1,48 @@
+import asyncio
+import json
+from datetime import date
+
+from batch_settlement import BatchSettler
+from models import Expense, Participant, Session
+
+
+def make_session():
+    participants = [Participant(name="Ala"), Participant(name="Bob")]
+    ids = [p.id for p in participants]
+    expense = Expense(title="Kolacja",
+                      amount_minor=1001,
+                      date=date(2025, 1, 1),
+                      payer_id=ids[0],
+                      beneficiary_ids=ids)
+    return Session(name="Test", participants=participants, expenses=[expense])
+
+
+def settle(session_ids, load):
+    settler = BatchSettler(workers=0, chunk_size=2)
+    
+    async def run():
+        return b"".join([
+            lines async for lines in settler.stream(session_ids, load,
+                                                    "greedy")
+        ])
+    
+    return {
+        record["session_id"]: record
+        for record in map(json.loads, asyncio.run(run()).splitlines())
+    }
+
+
+def test_async_loader_and_errors():
+    session = make_session()
+    
+    async def load(session_id):
+        if session_id == "broken":
+            raise OSError("disk")
+        await asyncio.sleep(0)
+        return session if session_id == session.id else None
+    
+    records = settle([session.id, "missing", "broken"], load)
+    assert records["missing"]["error"] == "Sesja nie została znaleziona"
+    assert records["broken"]["error"] == "disk"
+    payments = records[session.id]["payments"]
+    assert [p["amount_minor"] for p in payments] == [500]
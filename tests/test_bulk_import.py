@@ -0,0 +1,27 @@
+import pytest
+
+NESTED = "[" * 5000 + "]" * 5000
+
+
+def upload(client, session_id, name, body):
+    return client.post(f"/session/{session_id}/expenses/import",
+                       files={"file": (name, body.encode(), "application/json")})
+
+
+@pytest.mark.parametrize("name,body", [
+    ("array.json", "[" + NESTED + "]"),
+    ("array_open.json", "[" + "[" * 5000),
+    ("lines.jsonl", '{"title": "a"}\n' + NESTED + "\n"),
+], ids=["array", "unterminated", "lines"])
+def test_deeply_nested_json_is_rejected(client, session_id, name, body):
+    response = upload(client, session_id, name, body)
+    assert response.status_code == 400
+    assert "zagnieżdżenie" in response.json()["detail"]
+
+
+def test_oversized_amount_is_a_row_error(client, session_id):
+    body = ('[{"title": "Kolacja", "amount_minor": 9223372036854775808, '
+            '"date": "2025-01-01", "payer": "Ala"}]')
+    response = upload(client, session_id, "big.json", body)
+    assert response.status_code == 422
+    assert response.json()["error_count"] == 1
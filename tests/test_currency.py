@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from utils import (INT64_MAX, INT64_MIN, format_currencies, format_currency,
+                   format_currency_input, parse_currencies, parse_currency)
+
+EDGES = [0, 1, -1, 99, -99, 100, -100, INT64_MAX, INT64_MIN, 2**53,
+         2**53 + 1, -(2**53 + 1)]
+
+REJECTED = [
+    "", ".", ",", "-", "12.345", "0,001", "1e3", "inf", "nan", "12,3,4",
+    "1 23,45", "1  234", "12 zł", "--5", "0x10", "١٢",
+    str(INT64_MAX + 1)[:-2] + "." + str(INT64_MAX + 1)[-2:],
+    str(INT64_MIN - 1)[:-2] + "." + str(INT64_MIN - 1)[-2:],
+]
+
+
+def grouped(amount_minor: int, separator: str = " ") -> str:
+    sign = "-" if amount_minor < 0 else ""
+    zloty, grosze = divmod(abs(amount_minor), 100)
+    return f"{sign}{zloty:,}".replace(",", separator) + f",{grosze:02d}"
+
+
+def random_amounts(count: int, seed: int = 15):
+    rng = random.Random(seed)
+    amounts = []
+    while len(amounts) < count:
+        bits = rng.choice([8, 16, 32, 53, 63])
+        amounts.append(rng.randint(-(2**bits) + 1, 2**bits - 1))
+    return amounts
+
+
+AMOUNTS = EDGES + random_amounts(2000)
+
+
+@pytest.mark.parametrize("amount", AMOUNTS)
+def test_round_trip(amount):
+    text = format_currency_input(amount)
+    assert parse_currency(text) == amount
+    assert parse_currency(text.replace(".", ",")) == amount
+    assert parse_currency(grouped(amount)) == amount
+    assert parse_currency(grouped(amount, "\u00a0")) == amount
+    assert parse_currency(grouped(amount, "\u202f")) == amount
+
+
+@pytest.mark.parametrize("amount", AMOUNTS)
+def test_format_matches_input_format(amount):
+    expected = format_currency_input(amount).replace(".", ",") + " zł"
+    assert format_currency(amount) == expected
+
+
+@pytest.mark.parametrize("text,amount", [
+    ("12,34", 1234),
+    ("12.34", 1234),
+    ("12", 1200),
+    (".5", 50),
+    ("0,1", 10),
+    ("  7,05 ", 705),
+    ("-1,50", -150),
+    ("+3", 300),
+    ("1 234,56", 123456),
+])
+def test_accepted_styles(text, amount):
+    assert parse_currency(text) == amount
+
+
+@pytest.mark.parametrize("text", REJECTED)
+def test_rejected(text):
+    with pytest.raises(ValueError):
+        parse_currency(text)
+
+
+def test_negative_format():
+    assert format_currency(-150) == "-1,50 zł"
+    assert format_currency(-5) == "-0,05 zł"
+
+
+def test_batch_helpers():
+    amounts = AMOUNTS[:200]
+    assert format_currencies(amounts) == [format_currency(a) for a in amounts]
+    texts = [format_currency_input(a) for a in amounts]
+    assert parse_currencies(texts) == amounts
@@ -0,0 +1,78 @@
+import random
+from datetime import date
+
+import pytest
+
+import settlement
+from models import Expense, Participant, Session
+from utils import INT64_MAX
+
+pytest.importorskip("numpy")
+
+
+@pytest.fixture(autouse=True)
+def numpy_loaded():
+    assert settlement.load_numpy() is not None
+
+
+def random_session(rng, participants, expenses, max_amount=10**7):
+    people = [Participant(name=f"P{i}") for i in range(participants)]
+    ids = [p.id for p in people]
+    return Session(name="Losowa",
+                   participants=people,
+                   expenses=[
+                       Expense(title=f"E{k}",
+                               amount_minor=rng.randint(1, max_amount),
+                               date=date(2025, 1, 1),
+                               payer_id=rng.choice(ids),
+                               beneficiary_ids=rng.sample(
+                                   ids, rng.randint(1, participants)))
+                       for k in range(expenses)
+                   ])
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_numpy_matches_python(seed):
+    rng = random.Random(seed)
+    session = random_session(rng, rng.randint(1, 30), rng.randint(0, 500))
+    assert (settlement.compute_balance_map_numpy(session) ==
+            settlement.compute_balance_map_python(session))
+
+
+def test_remainder_goes_to_first_beneficiaries():
+    rng = random.Random(3)
+    session = random_session(rng, 7, 0)
+    ids = [p.id for p in session.participants]
+    for amount in range(1, 50):
+        session.expenses.append(
+            Expense(title=f"R{amount}",
+                    amount_minor=amount,
+                    date=date(2025, 1, 1),
+                    payer_id=ids[amount % 7],
+                    beneficiary_ids=rng.sample(ids, 7)))
+    numpy_map = settlement.compute_balance_map_numpy(session)
+    assert numpy_map == settlement.compute_balance_map_python(session)
+    assert sum(numpy_map.values()) == 0
+
+
+def test_large_amounts_below_safe_total():
+    rng = random.Random(11)
+    count = 16
+    session = random_session(rng, 5, count,
+                             max_amount=(settlement.NUMPY_SAFE_TOTAL - 1) //
+                             count)
+    numpy_map = settlement.compute_balance_map_numpy(session)
+    assert numpy_map is not None
+    assert numpy_map == settlement.compute_balance_map_python(session)
+
+
+@pytest.mark.parametrize("amount", [INT64_MAX, INT64_MAX - 1, 2**62])
+def test_amounts_near_int64_fall_back_to_python(monkeypatch, amount):
+    rng = random.Random(amount % 97)
+    session = random_session(rng, 4, 3)
+    session.expenses[0].amount_minor = amount
+    assert settlement.compute_balance_map_numpy(session) is None
+    
+    monkeypatch.setattr(settlement, "NUMPY_MIN_EXPENSES", 0)
+    assert (settlement.compute_balance_map(session) ==
+            settlement.compute_balance_map_python(session))
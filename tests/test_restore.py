@@ -0,0 +1,52 @@
+import json
+
+from utils import INT64_MAX
+
+
+def snapshot(client, session_id):
+    response = client.get(f"/session/{session_id}/snapshot?format=json")
+    assert response.status_code == 200
+    return response.json()
+
+
+def with_expense(data, amount_minor):
+    payer = data["participants"][0]["id"]
+    data["expenses"].append({
+        "id": "e1",
+        "title": "Kolacja",
+        "amount_minor": amount_minor,
+        "date": "2025-01-01",
+        "payer_id": payer,
+        "beneficiary_ids": [p["id"] for p in data["participants"]],
+    })
+    return json.dumps(data)
+
+
+def restore(client, body):
+    return client.post("/session/restore",
+                       content=body,
+                       headers={"content-type": "application/json"})
+
+
+def test_restore_assigns_fresh_ids(client, session_id):
+    data = snapshot(client, session_id)
+    response = restore(client, with_expense(data, 1234))
+    assert response.status_code == 200
+    restored = snapshot(client, response.json()["id"])
+    assert restored["id"] != session_id
+    assert restored["expenses"][0]["amount_minor"] == 1234
+    assert {p["id"] for p in restored["participants"]}.isdisjoint(
+        p["id"] for p in data["participants"])
+
+
+def test_restore_rejects_oversized_amount(client, session_id):
+    data = snapshot(client, session_id)
+    response = restore(client, with_expense(data, 2**70))
+    assert response.status_code == 400
+    assert "zbyt duża" in response.json()["detail"]
+
+
+def test_restore_accepts_int64_max(client, session_id):
+    data = snapshot(client, session_id)
+    response = restore(client, with_expense(data, INT64_MAX))
+    assert response.status_code == 200
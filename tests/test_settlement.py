@@ -0,0 +1,157 @@
+import asyncio
+import random
+from datetime import date, timedelta
+from typing import Dict, List
+
+import pytest
+
+import settlement
+from models import Balance, Expense, Participant, Payment, Session, Settlement
+
+
+def make_session(amounts):
+    participants = [Participant(name=f"P{i}") for i in range(len(amounts))]
+    ids = [p.id for p in participants]
+    expenses = [
+        Expense(title=f"E{i}",
+                amount_minor=amount,
+                date=date(2025, 1, 1),
+                payer_id=ids[i],
+                beneficiary_ids=ids) for i, amount in enumerate(amounts)
+    ]
+    return Session(name="Test", participants=participants, expenses=expenses)
+
+
+def test_exact_settlement_is_coalesced(monkeypatch):
+    session = make_session([505, 1713, 2299, 4101, 77, 9000])
+    calls = []
+    
+    def counted(*args):
+        calls.append(args)
+        return settlement.optimize_payments(*args)
+    
+    monkeypatch.setattr(settlement, "SETTLEMENT_ENGINE", "exact")
+    monkeypatch.setattr(settlement, "optimize_payments_exact", counted)
+    settlement.settlement_cache.invalidate(session.id)
+    
+    async def run():
+        return await asyncio.gather(
+            *[settlement.get_settlement_async(session) for _ in range(20)])
+    
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert settlement.settlement_cache.get(
+        (session.id, session.version)) is results[0]
+
+
+def random_session(rng, participants, expenses, amounts=None):
+    people = [Participant(name=f"P{i}") for i in range(participants)]
+    ids = [p.id for p in people]
+    return Session(name="Losowa",
+                   participants=people,
+                   expenses=[
+                       Expense(title=f"E{k}",
+                               amount_minor=(rng.choice(amounts) if amounts
+                                             else rng.randint(1, 10**7)),
+                               date=date(2025, 1, 1) + timedelta(days=k % 60),
+                               payer_id=rng.choice(ids),
+                               beneficiary_ids=rng.sample(
+                                   ids, rng.randint(1, participants)))
+                       for k in range(expenses)
+                   ])
+
+
+def baseline_settlement(session: Session) -> Settlement:
+    participant_map = {p.id: p.name for p in session.participants}
+    balance_map: Dict[str, int] = {p.id: 0 for p in session.participants}
+    for expense in session.expenses:
+        num_beneficiaries = len(expense.beneficiary_ids)
+        amount_per_person = expense.amount_minor // num_beneficiaries
+        remainder = expense.amount_minor % num_beneficiaries
+        for i, beneficiary_id in enumerate(expense.beneficiary_ids):
+            share = amount_per_person
+            if i < remainder:
+                share += 1
+            balance_map[beneficiary_id] -= share
+        balance_map[expense.payer_id] += expense.amount_minor
+    
+    balances = [
+        Balance(participant_id=pid,
+                participant_name=participant_map[pid],
+                balance_minor=balance)
+        for pid, balance in balance_map.items()
+    ]
+    balances.sort(key=lambda b: b.balance_minor, reverse=True)
+    
+    debtors = [(b.participant_id, -b.balance_minor) for b in balances
+               if b.balance_minor < 0]
+    creditors = [(b.participant_id, b.balance_minor) for b in balances
+                 if b.balance_minor > 0]
+    debtors.sort(key=lambda x: x[1], reverse=True)
+    creditors.sort(key=lambda x: x[1], reverse=True)
+    
+    payments: List[Payment] = []
+    i, j = 0, 0
+    while i < len(debtors) and j < len(creditors):
+        debtor_id, debt = debtors[i]
+        creditor_id, credit = creditors[j]
+        transfer_amount = min(debt, credit)
+        if transfer_amount > 0:
+            payments.append(
+                Payment(from_participant_id=debtor_id,
+                        from_participant_name=participant_map[debtor_id],
+                        to_participant_id=creditor_id,
+                        to_participant_name=participant_map[creditor_id],
+                        amount_minor=transfer_amount))
+        debtors[i] = (debtor_id, debt - transfer_amount)
+        creditors[j] = (creditor_id, credit - transfer_amount)
+        if debtors[i][1] == 0:
+            i += 1
+        if creditors[j][1] == 0:
+            j += 1
+    
+    return Settlement(balances=balances, payments=payments)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_large_path_matches_baseline_greedy(seed):
+    rng = random.Random(seed)
+    session = random_session(rng, rng.randint(1, 60), rng.randint(0, 200))
+    expected = baseline_settlement(session)
+    assert settlement.calculate_settlement_large(session) == expected
+    assert settlement.calculate_settlement(session,
+                                           engine="greedy") == expected
+
+
+def tied_session(rng, participants, expenses):
+    people = [Participant(name=f"P{i}") for i in range(participants)]
+    ids = [p.id for p in people]
+    return Session(name="Remis",
+                   participants=people,
+                   expenses=[
+                       Expense(title=f"E{k}",
+                               amount_minor=participants * rng.choice(
+                                   [100, 200, 300]),
+                               date=date(2025, 1, 1),
+                               payer_id=rng.choice(ids[:participants // 2]),
+                               beneficiary_ids=ids)
+                       for k in range(expenses)
+                   ])
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_large_path_matches_baseline_greedy_with_ties(seed):
+    rng = random.Random(1000 + seed)
+    session = tied_session(rng, rng.randint(4, 40), rng.randint(1, 30))
+    expected = baseline_settlement(session)
+    assert settlement.calculate_settlement_large(session) == expected
+    assert settlement.calculate_settlement(session,
+                                           engine="greedy") == expected
+
+
+def test_large_group_threshold_matches_baseline_greedy():
+    rng = random.Random(7)
+    session = tied_session(rng, settlement.LARGE_GROUP_THRESHOLD + 50, 400)
+    assert settlement.calculate_settlement(
+        session, engine="greedy") == baseline_settlement(session)
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sqlite3
+
+import pytest
+
+from models import Participant, Session
+from storage import SQLiteStorage, VersionConflictError
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "sessions.db"),
+                            snapshot_dir=str(tmp_path / "snapshots"),
+                            snapshot_interval=0.001,
+                            snapshot_keep=2)
+    yield storage
+    storage.close()
+
+
+def make_session(name="Test"):
+    return Session(name=name, participants=[Participant(name="Ala")])
+
+
+def test_update_of_deleted_session_is_a_conflict(sqlite_storage):
+    session = sqlite_storage.create_session(make_session())
+    sqlite_storage.conn.execute("DELETE FROM sessions WHERE id = ?",
+                                (session.id, ))
+    
+    session.participants.append(Participant(name="Bob"))
+    with pytest.raises(VersionConflictError):
+        sqlite_storage.update_session(session, expected_version=0)
+    assert sqlite_storage.get_session(session.id) is None
+
+
+def test_periodic_snapshots_are_rotated(sqlite_storage, tmp_path):
+    sessions = [sqlite_storage.create_session(make_session(f"S{i}"))
+                for i in range(3)]
+    sqlite_storage.last_snapshot = 0
+    
+    async def run():
+        paths = []
+        for _ in range(3):
+            paths.append(await sqlite_storage.snapshot_if_due())
+            await asyncio.sleep(0.01)
+        return paths
+    
+    paths = asyncio.run(run())
+    assert all(paths)
+    assert sorted(os.listdir(tmp_path / "snapshots")) == sorted(
+        os.path.basename(path) for path in paths[1:])
+    assert sqlite_storage.stats()["snapshots"] == 3
+    
+    conn = sqlite3.connect(paths[-1])
+    try:
+        ids = {row[0] for row in conn.execute("SELECT id FROM sessions")}
+    finally:
+        conn.close()
+    assert ids == {session.id for session in sessions}
+
+
+def test_snapshots_are_off_by_default(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "sessions.db"))
+    try:
+        assert asyncio.run(storage.snapshot_if_due()) is None
+    finally:
+        storage.close()
@@ -0,0 +1,194 @@
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import MAXYEAR, date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from cache import LRUCache
+from metrics import timed
+from models import Session
+
+MAX_TIMELINE_CELLS = int(os.environ.get("TIMELINE_MAX_CELLS", "2000000"))
+
+timeline_cache = LRUCache(
+    maxsize=int(os.environ.get("TIMELINE_CACHE_SIZE", "128")))
+
+
+class ParticipantTotals(NamedTuple):
+    participant_id: str
+    participant_name: str
+    paid_minor: int
+    share_minor: int
+    
+    @property
+    def balance_minor(self) -> int:
+        return self.paid_minor - self.share_minor
+
+
+class RangeTotals(NamedTuple):
+    start: Optional[date]
+    end: Optional[date]
+    expense_count: int
+    total_minor: int
+    participants: List[ParticipantTotals]
+    
+    def to_dict(self) -> Dict:
+        return {
+            "start": self.start.isoformat() if self.start else None,
+            "end": self.end.isoformat() if self.end else None,
+            "expense_count": self.expense_count,
+            "total_minor": self.total_minor,
+            "participants": [{
+                "participant_id": p.participant_id,
+                "participant_name": p.participant_name,
+                "paid_minor": p.paid_minor,
+                "share_minor": p.share_minor,
+                "balance_minor": p.balance_minor,
+            } for p in self.participants],
+        }
+
+
+def _vector(values: List[int]):
+    try:
+        return array("q", values)
+    except OverflowError:
+        return list(values)
+
+
+class DateIndex:
+    def __init__(self, session: Session, max_cells: int = MAX_TIMELINE_CELLS):
+        self.participant_ids = [p.id for p in session.participants]
+        self.participant_names = [p.name for p in session.participants]
+        index = {pid: i for i, pid in enumerate(self.participant_ids)}
+        
+        expenses = sorted(session.expenses, key=lambda e: e.date)
+        self.entries: List[Tuple[int, int, Tuple[int, ...]]] = [
+            (index[e.payer_id], e.amount_minor,
+             tuple(index[bid] for bid in e.beneficiary_ids))
+            for e in expenses
+        ]
+        
+        self.days: List[int] = []
+        self.day_offsets: List[int] = []
+        for position, expense in enumerate(expenses):
+            day = expense.date.toordinal()
+            if not self.days or self.days[-1] != day:
+                self.days.append(day)
+                self.day_offsets.append(position)
+        self.day_offsets.append(len(expenses))
+        
+        width = max(len(self.participant_ids), 1)
+        self.stride = max(1, -(-len(self.days) * width // max_cells))
+        
+        self.cumulative_totals = [0]
+        self.paid_checkpoints = []
+        self.share_checkpoints = []
+        paid = [0] * len(self.participant_ids)
+        share = [0] * len(self.participant_ids)
+        total = 0
+        entries = self.entries
+        offsets = self.day_offsets
+        for k in range(len(self.days)):
+            if k % self.stride == 0:
+                self.paid_checkpoints.append(_vector(paid))
+                self.share_checkpoints.append(_vector(share))
+            for payer, amount, beneficiaries in entries[offsets[k]:offsets[k + 1]]:
+                total += amount
+                paid[payer] += amount
+                amount_per_person, remainder = divmod(amount, len(beneficiaries))
+                for beneficiary in beneficiaries:
+                    share[beneficiary] += amount_per_person
+                for beneficiary in beneficiaries[:remainder]:
+                    share[beneficiary] += 1
+            self.cumulative_totals.append(total)
+        if len(self.days) % self.stride == 0:
+            self.paid_checkpoints.append(_vector(paid))
+            self.share_checkpoints.append(_vector(share))
+    
+    @staticmethod
+    def _apply(entry: Tuple[int, int, Tuple[int, ...]], paid: List[int],
+               share: List[int]):
+        payer, amount, beneficiaries = entry
+        amount_per_person, remainder = divmod(amount, len(beneficiaries))
+        for beneficiary in beneficiaries:
+            share[beneficiary] += amount_per_person
+        for beneficiary in beneficiaries[:remainder]:
+            share[beneficiary] += 1
+        paid[payer] += amount
+    
+    def position(self, day: Optional[date]) -> int:
+        if day is None:
+            return len(self.days)
+        return bisect_right(self.days, day.toordinal())
+    
+    def _state(self, k: int) -> Tuple[List[int], List[int]]:
+        checkpoint = k // self.stride
+        paid = list(self.paid_checkpoints[checkpoint])
+        share = list(self.share_checkpoints[checkpoint])
+        start = self.day_offsets[checkpoint * self.stride]
+        for entry in self.entries[start:self.day_offsets[k]]:
+            self._apply(entry, paid, share)
+        return paid, share
+    
+    def balances_as_of(self, day: Optional[date]) -> Dict[str, int]:
+        paid, share = self._state(self.position(day))
+        return {
+            pid: paid[i] - share[i]
+            for i, pid in enumerate(self.participant_ids)
+        }
+    
+    def expense_count_as_of(self, day: Optional[date]) -> int:
+        return self.day_offsets[self.position(day)]
+    
+    def totals_between(self, start: Optional[date],
+                       end: Optional[date]) -> RangeTotals:
+        low = 0 if start is None else bisect_left(self.days, start.toordinal())
+        high = max(self.position(end), low)
+        paid_low, share_low = self._state(low)
+        paid_high, share_high = self._state(high)
+        
+        participants = [
+            ParticipantTotals(pid, self.participant_names[i],
+                              paid_high[i] - paid_low[i],
+                              share_high[i] - share_low[i])
+            for i, pid in enumerate(self.participant_ids)
+        ]
+        return RangeTotals(
+            start, end, self.day_offsets[high] - self.day_offsets[low],
+            self.cumulative_totals[high] - self.cumulative_totals[low],
+            participants)
+    
+    def month_ends(self) -> List[date]:
+        if not self.days:
+            return []
+        
+        first = date.fromordinal(self.days[0])
+        last = date.fromordinal(self.days[-1])
+        ends = []
+        year, month = first.year, first.month
+        while (year, month) <= (last.year, last.month):
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+            if year > MAXYEAR:
+                ends.append(date.max)
+                break
+            ends.append(date(year, month, 1) - timedelta(days=1))
+        return ends
+
+
+def get_date_index(session: Session) -> DateIndex:
+    def build() -> DateIndex:
+        with timed("timeline"):
+            return DateIndex(session)
+    
+    return timeline_cache.get_or_create((session.id, session.version), build)
+
+
+def session_as_of(session: Session, day: date) -> Session:
+    return Session.model_construct(
+        id=session.id,
+        name=session.name,
+        created_at=session.created_at,
+        read_only=session.read_only,
+        version=session.version,
+        participants=session.participants,
+        expenses=[e for e in session.expenses if e.date <= day])
@@ -1,21 +1,60 @@
+import re
+from functools import lru_cache
+from typing import Iterable, List
+
+INT64_MIN = -2 ** 63
+INT64_MAX = 2 ** 63 - 1
+
+CURRENCY_PATTERN = re.compile(
+    r"([+-]?)([0-9]{1,3}(?:[ \u00a0\u202f][0-9]{3})+|[0-9]*)"
+    r"(?:[.,]([0-9]{0,2}))?")
+OVER_PRECISION_PATTERN = re.compile(r"[+-]?[0-9 \u00a0\u202f]*[.,][0-9]{3,}")
+THOUSANDS_SEPARATORS = str.maketrans("", "", " \u00a0\u202f")
+
+
+@lru_cache(maxsize=65536)
 def format_currency(amount_minor: int) -> str:
-    zloty = amount_minor // 100
-    grosze = abs(amount_minor) % 100
-    return f"{zloty},{grosze:02d} zł"
+    sign = "-" if amount_minor < 0 else ""
+    zloty, grosze = divmod(abs(amount_minor), 100)
+    return f"{sign}{zloty},{grosze:02d} zł"
 
 
 def format_currency_input(amount_minor: int) -> str:
-    zloty = amount_minor // 100
-    grosze = abs(amount_minor) % 100
-    return f"{zloty}.{grosze:02d}"
+    sign = "-" if amount_minor < 0 else ""
+    zloty, grosze = divmod(abs(amount_minor), 100)
+    return f"{sign}{zloty}.{grosze:02d}"
+
+
+def format_currencies(amounts: Iterable[int]) -> List[str]:
+    return [format_currency(amount) for amount in amounts]
 
 
 def parse_currency(amount_str: str) -> int:
-    cleaned = amount_str.replace(',', '.').strip()
+    cleaned = amount_str.strip()
     
-    try:
-        amount_float = float(cleaned)
-        amount_minor = int(round(amount_float * 100))
-        return amount_minor
-    except ValueError:
+    zloty, _, grosze = cleaned.replace(",", ".").partition(".")
+    digits = zloty + grosze + "00"[len(grosze):]
+    if (len(grosze) <= 2 and len(digits) < 19 and digits.isascii()
+            and digits.isdigit() and (zloty or grosze)):
+        return int(digits)
+    
+    match = CURRENCY_PATTERN.fullmatch(cleaned)
+    if match is None or not (match.group(2) or match.group(3)):
+        if OVER_PRECISION_PATTERN.fullmatch(cleaned):
+            raise ValueError(
+                "Kwota może mieć najwyżej dwie cyfry po przecinku")
         raise ValueError("Nieprawidłowy format kwoty")
+    
+    sign, zloty, grosze = match.groups()
+    amount_minor = (int(zloty.translate(THOUSANDS_SEPARATORS) or "0") * 100 +
+                    int((grosze or "").ljust(2, "0")))
+    if sign == "-":
+        amount_minor = -amount_minor
+    
+    if not INT64_MIN <= amount_minor <= INT64_MAX:
+        raise ValueError("Kwota jest zbyt duża")
+    return amount_minor
+
+
+def parse_currencies(values: Iterable[str]) -> List[int]:
+    return [parse_currency(value) for value in values]